@@ -7,30 +7,61 @@ import yaml
 
 from .inventory import Inventory  # noqa: F401
 from .playbook import Playbook  # noqa: F401
+from ..utils.yamlcache import (
+    SafeLoader, YamlCache, check_and_skip_events, is_truthy_node, skip_node)
 
+known_playbook_attributes = ('hosts', 'include', 'import_playbook')
 
-def is_test_playbook_file(path):
+
+def is_test_playbook_file(path, yaml_cache=None):
     has_test_prefix = path.basename.startswith('test_')
 
-    return has_test_prefix and is_playbook_file(path)
+    return has_test_prefix and is_playbook_file(path, yaml_cache)
 
 
-def is_playbook_file(path):
+def is_playbook_file(path, yaml_cache=None):
     is_yaml_file = path.ext == '.yml'
 
     if is_yaml_file:
-        yaml_file_content = yaml.safe_load(path.read())
-        yaml_file_is_ansible_playbook = is_playbook_content(yaml_file_content)
+        yaml_cache = yaml_cache or YamlCache()
 
-        return yaml_file_is_ansible_playbook
+        return yaml_cache.lookup(path, 'is_playbook', is_playbook_path)
 
     return False
 
 
-def is_playbook_content(content):
-    known_playbook_attributes = ('hosts', 'include', 'import_playbook')
+def is_playbook_path(path):
+    with path.open('rb') as stream:
+        return is_playbook_stream(stream)
+
+
+def is_playbook_stream(stream):
+    # only the first play's top-level keys are inspected, thus large files
+    # are classified without loading them completely
+    loader = SafeLoader(stream)
+
+    try:
+        is_first_play_found = check_and_skip_events(
+            loader, yaml.StreamStartEvent, yaml.DocumentStartEvent,
+            yaml.SequenceStartEvent, yaml.MappingStartEvent)
+
+        return is_first_play_found and first_play_has_playbook_attribute(loader)
+    finally:
+        loader.dispose()
+
+
+def first_play_has_playbook_attribute(loader):
+    while not loader.check_event(yaml.MappingEndEvent):
+        is_known_attribute = is_playbook_attribute_event(loader.peek_event())
+        skip_node(loader)
+
+        if is_known_attribute and is_truthy_node(loader):
+            return True
+        elif not is_known_attribute:
+            skip_node(loader)
+
+    return False
+
 
-    return isinstance(content, list) \
-        and len(content) \
-        and isinstance(content[0], dict) \
-        and any(content[0].get(x) for x in known_playbook_attributes)
+def is_playbook_attribute_event(event):
+    return isinstance(event, yaml.ScalarEvent) and event.value in known_playbook_attributes
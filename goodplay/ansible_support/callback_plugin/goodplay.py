@@ -4,12 +4,16 @@
 from __future__ import (absolute_import, division, print_function)
 
 import json
+import os
 import re
+import socket
+import struct
 
 try:
     from ansible.plugins.loader import module_loader
 except ImportError:
     from ansible.plugins import module_loader
+from ansible.module_utils.six import string_types
 from ansible.plugins.callback import CallbackBase
 
 
@@ -73,12 +77,95 @@ def monkeypatch_play_context():
 monkeypatch_play_context()
 
 
+# record files used by a playbook run for test impact analysis
+
+class FootprintRecorder(object):
+    src_actions = ('assemble', 'copy', 'include_vars', 'script', 'template', 'unarchive')
+    src_dir_names = ('templates', 'files', 'vars', '')
+
+    def __init__(self, footprint_path):
+        self.footprint_path = footprint_path
+        self.basedir = None
+        self.recorded_paths = set()
+
+    def record(self, path):
+        # paths are resolved as roles under test are symlinked into a
+        # temporary roles path
+        path = os.path.realpath(path)
+
+        if path not in self.recorded_paths:
+            self.recorded_paths.add(path)
+
+            with open(self.footprint_path, 'a') as footprint_file:
+                footprint_file.write(path + '\n')
+
+    def record_existing(self, *candidate_paths):
+        for candidate_path in candidate_paths:
+            if os.path.exists(candidate_path):
+                self.record(candidate_path)
+
+    def record_playbook(self, playbook):
+        self.basedir = playbook._basedir
+        self.record(os.path.join(self.basedir, playbook._file_name))
+
+    def record_play(self, play):
+        for vars_file in play.vars_files or []:
+            vars_file_names = vars_file if isinstance(vars_file, list) else [vars_file]
+            self.record_existing(*(
+                os.path.join(self.basedir, vars_file_name) for vars_file_name in vars_file_names))
+
+    def record_task(self, task):
+        if task._role:
+            self.record(task._role._role_path)
+
+        task_path = task.get_path()
+        if task_path:
+            self.record(task_path.rsplit(':', 1)[0])
+
+        if task.action in self.src_actions:
+            self.record_task_src(task)
+
+    def record_task_src(self, task):
+        src = self.task_src(task)
+
+        # sources within roles are covered by recording the role itself
+        if src:
+            self.record_existing(*(
+                os.path.join(self.basedir, src_dir_name, src)
+                for src_dir_name in self.src_dir_names))
+
+    def task_src(self, task):
+        for arg_name in ('src', 'file', '_raw_params'):
+            if isinstance(task.args.get(arg_name), string_types):
+                return task.args[arg_name]
+
+    def record_include(self, included_file):
+        self.record(included_file._filename)
+
+
+# send events to goodplay through the unix domain socket it listens on
+
+class EventSender(object):
+    # each event is sent as utf-8 encoded json prefixed by its length as 4
+    # byte unsigned integer in network byte order
+    event_header = struct.Struct('!I')
+
+    def __init__(self, socket_path):
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.connect(socket_path)
+
+    def send(self, event):
+        payload = json.dumps(event).encode('utf-8')
+        self.socket.sendall(self.event_header.pack(len(payload)) + payload)
+
+
 # goodplay callback
 
 class CallbackModule(CallbackBase):
     CALLBACK_VERSION = 2.0
     CALLBACK_TYPE = 'notification'
     CALLBACK_NAME = 'goodplay'
+    CALLBACK_NEEDS_WHITELIST = True
 
     def __init__(self, *args, **kwargs):
         super(CallbackModule, self).__init__(*args, **kwargs)
@@ -87,14 +174,35 @@ class CallbackModule(CallbackBase):
         self.previously_ended_task = None
         self.task = None
 
+        footprint_path = os.environ.get('GOODPLAY_FOOTPRINT_PATH')
+        self.footprint_recorder = footprint_path and FootprintRecorder(footprint_path)
+
+        event_socket_path = os.environ.get('GOODPLAY_EVENT_SOCKET')
+        self.event_sender = event_socket_path and EventSender(event_socket_path)
+
         self.reset_per_host_outcomes()
 
     # Ansible playbook-specific callback methods
 
+    def v2_playbook_on_start(self, playbook):
+        if self.footprint_recorder:
+            self.footprint_recorder.record_playbook(playbook)
+
+    def v2_playbook_on_include(self, included_file):
+        if self.footprint_recorder:
+            self.footprint_recorder.record_include(included_file)
+
+    def v2_playbook_on_handler_task_start(self, task):
+        if self.footprint_recorder:
+            self.footprint_recorder.record_task(task)
+
     def v2_playbook_on_task_start(self, task, is_conditional):
         # ensure task is available as attribute on instance
         self.task = task
 
+        if self.footprint_recorder:
+            self.footprint_recorder.record_task(task)
+
         self.check_and_handle_playbook_on_task_end()
 
         if self.is_test_task(self.task):
@@ -115,10 +223,13 @@ class CallbackModule(CallbackBase):
         self.send_event('test-task-start', name=task.name)
 
     def send_event(self, event_name, **kwargs):
-        event_line_prefix = 'GOODPLAY => '
-        event_json = json.dumps(dict(event_name=event_name, data=kwargs))
-        msg = event_line_prefix + event_json
-        self._display.display(msg)
+        event = dict(event_name=event_name, data=kwargs)
+
+        if self.event_sender:
+            self.event_sender.send(event)
+        else:
+            # fall back to stdout when not run by goodplay
+            self._display.display('GOODPLAY => ' + json.dumps(event))
 
     def playbook_on_task_end(self, task):
         if self.is_test_task(task):
@@ -133,6 +244,9 @@ class CallbackModule(CallbackBase):
     def v2_playbook_on_play_start(self, play):
         self.check_and_handle_playbook_on_task_end()
 
+        if self.footprint_recorder:
+            self.footprint_recorder.record_play(play)
+
     def v2_playbook_on_stats(self, stats):
         self.check_and_handle_playbook_on_task_end()
 
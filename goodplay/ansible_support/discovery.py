@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+
+import contextlib
+import logging
+
+import ansible.constants
+from ansible.errors import AnsibleError
+from ansible.module_utils._text import to_text
+from ansible.playbook import Playbook as AnsiblePlaybook
+from ansible.playbook.block import Block
+
+log = logging.getLogger(__name__)
+
+
+class Task(object):
+    def __init__(self, name, tags):
+        self.name = name
+        self.tags = tags
+
+
+# lists tasks the same way `ansible-playbook --list-tasks` does, but loads
+# the plays within the already running process
+class TaskDiscovery(object):
+    def __init__(self, inventory, roles_path):
+        self.inventory = inventory
+        self.roles_path = roles_path
+
+    def tasks(self, playbook_path):
+        log.info('discover tasks: %s', playbook_path)
+
+        try:
+            with overridden_roles_path(self.roles_path):
+                return list(self.playbook_tasks(playbook_path))
+        except AnsibleError as err:
+            raise Exception(u'ERROR! {0}'.format(to_text(err)))
+
+    def playbook_tasks(self, playbook_path):
+        loader = self.inventory.loader
+        playbook = AnsiblePlaybook.load(
+            playbook_path.strpath,
+            variable_manager=self.inventory.variable_manager, loader=loader)
+
+        for play in playbook.get_plays():
+            loader.set_basedir(play._included_path or playbook._basedir)
+
+            for task in self.play_tasks(play):
+                yield task
+
+    def play_tasks(self, play):
+        all_vars = self.inventory.variable_manager.get_vars(play=play)
+        play_tags = set(play.tags)
+
+        for block in play.compile():
+            for task in block_tasks(block):
+                if task.evaluate_tags(['all'], [], all_vars):
+                    yield Task(task_name(task), sorted(play_tags.union(task.tags)))
+
+
+def block_tasks(block):
+    for task in block.block:
+        if isinstance(task, Block):
+            for block_task in block_tasks(task):
+                yield block_task
+        elif task.action != 'meta':
+            yield task
+
+
+def task_name(task):
+    if task.name:
+        return task.get_name()
+
+    return task.action
+
+
+@contextlib.contextmanager
+def overridden_roles_path(roles_path):
+    # roles are looked up via the configured roles path at load time, which
+    # the listing subprocess used to receive through ANSIBLE_ROLES_PATH
+    original_roles_path = ansible.constants.DEFAULT_ROLES_PATH
+    ansible.constants.DEFAULT_ROLES_PATH = roles_path
+
+    try:
+        yield
+    finally:
+        ansible.constants.DEFAULT_ROLES_PATH = original_roles_path
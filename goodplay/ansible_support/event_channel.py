@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+
+import json
+import socket
+import struct
+
+# events are sent by goodplay's callback plugin as utf-8 encoded json, each
+# prefixed by its length as 4 byte unsigned integer in network byte order
+event_header = struct.Struct('!I')
+
+
+class EventChannel(object):
+    # receiving end of the unix domain socket goodplay's callback plugin sends
+    # events through, keeping them apart from Ansible's ordinary output
+    def __init__(self, socket_path):
+        self.socket_path = socket_path
+        self.connection = None
+
+        if self.socket_path.check():
+            self.socket_path.remove()
+
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(self.socket_path.strpath)
+        self.listener.listen(1)
+
+    def receive_events(self, wait_readable):
+        # yields events until the sender closes its connection or exits
+        # without having connected at all, wait_readable blocks until the
+        # given socket is readable and returns False when the sender exited
+        if self.connection is None:
+            self.connection = self.accept(wait_readable)
+
+        while self.connection is not None:
+            event = self.receive_event(wait_readable)
+
+            if event is None:
+                return
+
+            yield event
+
+    def accept(self, wait_readable):
+        if wait_readable(self.listener):
+            return self.listener.accept()[0]
+
+    def receive_event(self, wait_readable):
+        header = self.receive_exactly(event_header.size, wait_readable)
+
+        if header is None:
+            return None
+
+        payload = self.receive_exactly(event_header.unpack(header)[0], wait_readable)
+
+        if payload is None:
+            return None
+
+        return json.loads(payload.decode('utf-8'))
+
+    def receive_exactly(self, size, wait_readable):
+        # None when the connection got closed before receiving size bytes
+        chunks = []
+
+        while size > 0:
+            chunk = self.connection.recv(size) if wait_readable(self.connection) else b''
+
+            if not chunk:
+                return None
+
+            chunks.append(chunk)
+            size -= len(chunk)
+
+        return b''.join(chunks)
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+        self.listener.close()
+
+        if self.socket_path.check():
+            self.socket_path.remove()
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+
+import io
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+
+import ansible.constants
+from ansible.cli.playbook import PlaybookCLI
+from ansible.config.manager import ConfigManager
+from ansible.executor.task_queue_manager import TaskQueueManager
+from ansible.module_utils.six.moves import queue
+from ansible.plugins.loader import callback_loader, connection_loader, module_loader
+import py.path
+
+from .runner import PlaybookRunner
+from ..utils.subprocess import signal_process_group, split_command
+
+log = logging.getLogger(__name__)
+
+this_path = py.path.local(__file__)
+callback_plugin_path = this_path.dirpath('callback_plugin')
+connection_plugin_path = this_path.dirpath('connection_plugin')
+
+
+def process_context(start_method):
+    # python 2 always forks
+    if hasattr(multiprocessing, 'get_context'):
+        return multiprocessing.get_context(start_method)
+
+    return multiprocessing
+
+
+def forkserver_context():
+    # the forkserver is started along with the first run and kept for the
+    # whole session, runs are forked from it with all of its preloads
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload(['goodplay.ansible_support.forkserver'])
+
+    return context
+
+
+class ForkPlaybookRunner(PlaybookRunner):
+    # runs ansible-playbook within a child forked from the pytest process, or
+    # a forkserver, where Ansible is imported already, while goodplay's
+    # callback is attached directly and hands events over through a queue as
+    # python objects instead of sending them as json
+    max_queued_events = 1024
+    poll_interval = 0.1
+    terminate_timeout = 10
+
+    def __init__(self, ctx, use_forkserver=False):
+        super(ForkPlaybookRunner, self).__init__(ctx)
+
+        self.use_forkserver = use_forkserver
+        self.event_queue = None
+        self.output_reader = None
+        self.is_finished = False
+
+    def run_env(self):
+        env = super(ForkPlaybookRunner, self).run_env()
+
+        # the callback is neither loaded by Ansible nor sends events through
+        # the event channel
+        del env['ANSIBLE_CALLBACK_WHITELIST']
+        del env['GOODPLAY_EVENT_SOCKET']
+
+        return env
+
+    def run_async(self):
+        self.prepare_run()
+
+        argv = split_command(self.command, *self.command_args())
+        log.info('fork process: %s', ' '.join(argv))
+
+        context = self.run_context()
+        self.event_queue = context.Queue(self.max_queued_events)
+        output, child_output = context.Pipe(duplex=False)
+
+        self.process = context.Process(
+            target=run_playbook, args=(argv, self.run_env(), child_output, self.event_queue))
+        self.process.start()
+        child_output.close()
+
+        self.output_reader = threading.Thread(target=spool_output, args=(output, self.output))
+        self.output_reader.daemon = True
+        self.output_reader.start()
+
+    def run_context(self):
+        if self.use_forkserver:
+            return forkserver_context()
+
+        if threading.active_count() > 1 and hasattr(multiprocessing, 'get_context'):
+            # a lock held by another thread while forking, e.g. one of
+            # logging's, is never released within the child, which deadlocks
+            log.warning('forking run from forkserver instead of pytest process, '
+                        'as other threads are running')
+            return forkserver_context()
+
+        return process_context('fork')
+
+    def wait(self):
+        self.wait_for_event()
+        self.process.join()
+        self.output_reader.join()
+
+        self.check_all_test_tasks_skipped()
+
+    def terminate(self):
+        signal_process_group(self.process.pid, signal.SIGTERM)
+        self.process.join(self.terminate_timeout)
+
+        if self.process.is_alive():
+            log.warning('run did not exit within %d seconds after SIGTERM ... killing it',
+                        self.terminate_timeout)
+            signal_process_group(self.process.pid, signal.SIGKILL)
+            self.process.join()
+
+        self.output_reader.join()
+
+    def receive_events(self):
+        while not self.is_finished:
+            event = self.next_event()
+
+            if event is None:
+                self.is_finished = True
+            else:
+                # events are only received once consumed, thus output of a
+                # test task may be partly spooled with the one before
+                self.output.add_event(event)
+                yield event
+
+    def next_event(self):
+        # None once the child is done, even when it died without saying so
+        while True:
+            try:
+                return self.event_queue.get(timeout=self.poll_interval)
+            except queue.Empty:
+                if not self.process.is_alive():
+                    return self.last_event()
+
+    def last_event(self):
+        try:
+            return self.event_queue.get_nowait()
+        except queue.Empty:
+            return None
+
+
+def spool_output(output, output_spool):
+    # the pipe's connection is read as plain file
+    with io.open(output.fileno(), 'rb', closefd=False) as output_file:
+        for line in output_file:
+            output_spool.add(line.decode('utf-8', 'replace').rstrip('\n'))
+
+    output.close()
+
+
+class QueueEventSender(object):
+    def __init__(self, event_queue):
+        self.event_queue = event_queue
+
+    def send(self, event):
+        self.event_queue.put(event)
+
+
+def run_playbook(argv, env, output, event_queue):
+    # runs within the forked child, which leads its own process group, thus
+    # it can be terminated along with Ansible's workers
+    try:
+        os.setsid()
+        redirect_output(output)
+        os.environ.update(env)
+        reload_ansible_constants()
+        connection_loader.add_directory(connection_plugin_path.strpath)
+        attach_callback(event_queue)
+
+        cli = PlaybookCLI(argv)
+        cli.parse()
+        sys.exit(cli.run())
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        event_queue.put(None)
+
+
+def redirect_output(output):
+    os.dup2(output.fileno(), 1)
+    os.dup2(output.fileno(), 2)
+    output.close()
+
+    sys.stdin = open(os.devnull)
+    sys.stdout = open_output_stream(1)
+    sys.stderr = open_output_stream(2)
+
+
+def open_output_stream(fd):
+    if sys.version_info[0] == 2:  # pragma: no cover
+        return os.fdopen(fd, 'w', 1)
+
+    return io.open(fd, 'w', buffering=1, encoding='utf-8', errors='replace', closefd=False)
+
+
+def reload_ansible_constants():
+    # constants are determined once Ansible is imported, thus settings
+    # configured by the environment of the run are applied again
+    ansible.constants.config = ConfigManager()
+
+    for setting in ansible.constants.config.data.get_settings():
+        if setting.origin != 'default':
+            ansible.constants.set_constant(setting.name, setting.value)
+
+
+def attach_callback(event_queue):
+    callback_loader.add_directory(callback_plugin_path.strpath)
+    callback = callback_loader.get('goodplay')
+    callback.event_sender = QueueEventSender(event_queue)
+
+    load_callbacks = TaskQueueManager.load_callbacks
+
+    def load_callbacks_with_goodplay(tqm):
+        are_callbacks_loaded = tqm._callbacks_loaded
+        load_callbacks(tqm)
+
+        if not are_callbacks_loaded:
+            tqm._callback_plugins.append(callback)
+
+    TaskQueueManager.load_callbacks = load_callbacks_with_goodplay
+
+
+def preload():
+    # loads goodplay's plugins and fills the module loader's caches
+    callback_loader.add_directory(callback_plugin_path.strpath)
+    callback_loader.get('goodplay', class_only=True)
+    connection_loader.add_directory(connection_plugin_path.strpath)
+    connection_loader.get('goodplaydocker', class_only=True)
+    module_loader.find_plugin('ping')
@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+
+# imported by the forkserver of --executor=forkserver, thus every run forked
+# from it starts with Ansible, goodplay's plugins and the module loader's
+# caches being loaded
+
+from .fork_runner import preload
+
+preload()
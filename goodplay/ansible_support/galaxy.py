@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+
+import contextlib
+from distutils.version import LooseVersion
+import logging
+import shutil
+import threading
+
+import ansible.constants
+from ansible.errors import AnsibleError
+from ansible.galaxy import Galaxy
+import ansible.galaxy.api
+import ansible.galaxy.role
+from ansible.galaxy.role import GalaxyRole
+import ansible.playbook.role.requirement
+from ansible.module_utils.urls import open_url
+from ansible.playbook.role.requirement import RoleRequirement
+import py.path
+import yaml
+
+log = logging.getLogger(__name__)
+
+galaxy_modules = (ansible.galaxy.api, ansible.galaxy.role, ansible.playbook.role.requirement)
+
+
+class GalaxyOptions(object):
+    # options ansible-galaxy's command-line would provide when installing
+    def __init__(self, roles_path):
+        self.roles_path = [roles_path.strpath]
+        self.api_server = ansible.constants.GALAXY_SERVER
+        self.ignore_certs = ansible.constants.GALAXY_IGNORE_CERTS
+        self.keep_scm_meta = False
+        self.role_type = 'default'
+
+
+class RoleInstallFailure(object):
+    def __init__(self, name, src, version, reason):
+        self.name = name
+        self.src = src
+        self.version = version
+        self.reason = reason
+
+    def __str__(self):
+        version = ' ({0})'.format(self.version) if self.version else ''
+
+        return '{0}{1} from {2}: {3}'.format(self.name, version, self.src, self.reason)
+
+
+class RoleInstallError(Exception):
+    def __init__(self, failures):
+        super(RoleInstallError, self).__init__(
+            'failed to install roles: ' + '; '.join(str(failure) for failure in failures))
+        self.failures = failures
+
+
+def install_roles(requirements, roles_path, ignore_errors=False, pin_dependency=None):
+    # installs requirements and their dependencies within the current process
+    # using Ansible's galaxy library, just like ansible-galaxy install --force
+    # would, and raises RoleInstallError listing the roles failed to install;
+    # returns the dependencies installed as pinned by pin_dependency
+    installation = GalaxyInstallation(roles_path, pin_dependency)
+    failures = installation.install(expand_includes(requirements))
+
+    if failures and not ignore_errors:
+        raise RoleInstallError(failures)
+
+    for failure in failures:
+        log.info('failed to install %s ... ignoring', failure)
+
+    return installation.dependencies
+
+
+def latest_release(role_name):
+    # version galaxy installs of a role requested without version, None when
+    # the role has no releases, as its branches move
+    api = ansible.galaxy.api.GalaxyAPI(Galaxy(GalaxyOptions(py.path.local())))
+
+    with galaxy_display_route.routed_to_log():
+        try:
+            role_data = api.lookup_role_by_name(role_name, notify=False)
+            releases = role_data and api.fetch_role_related('versions', role_data['id'])
+        except AnsibleError as e:
+            log.info('unable to resolve latest release of %s: %s', role_name, e)
+            return None
+
+    return latest_version(release['name'] for release in releases or [])
+
+
+def latest_version(versions):
+    try:
+        return str(max(LooseVersion(version) for version in versions))
+    except (TypeError, ValueError):
+        # versions of incompatible formats or none at all
+        return None
+
+
+def download_archive(url, archive_path):
+    response = open_url(url, validate_certs=not ansible.constants.GALAXY_IGNORE_CERTS)
+
+    try:
+        with archive_path.open('wb') as stream:
+            shutil.copyfileobj(response, stream)
+    finally:
+        response.close()
+
+
+def expand_includes(requirements):
+    for requirement in requirements:
+        if isinstance(requirement, dict) and 'include' in requirement:
+            for included_requirement in load_included_requirements(requirement['include']):
+                yield included_requirement
+        else:
+            yield requirement
+
+
+def load_included_requirements(include_path):
+    with open(include_path) as stream:
+        return yaml.safe_load(stream) or []
+
+
+class LoggingDisplay(object):
+    # forwards messages of Ansible's galaxy library to goodplay's log instead
+    # of writing them to stdout
+    def display(self, msg, *args, **kwargs):
+        log.info(msg)
+
+    def warning(self, msg, *args, **kwargs):
+        log.warning(msg)
+
+    def error(self, msg, *args, **kwargs):
+        log.error(msg)
+
+    def __getattr__(self, name):
+        # verbose, debug and deprecation messages
+        return lambda msg, *args, **kwargs: log.debug(msg)
+
+
+class GalaxyDisplayRoute(object):
+    # routes messages of Ansible's galaxy library to goodplay's log only while
+    # installing, as installations may run concurrently within threads, the
+    # original displays are restored once the last of them finished
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active_count = 0
+        self.original_displays = []
+
+    @contextlib.contextmanager
+    def routed_to_log(self):
+        with self.lock:
+            if self.active_count == 0:
+                self.route()
+            self.active_count += 1
+
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.active_count -= 1
+                if self.active_count == 0:
+                    self.restore()
+
+    def route(self):
+        logging_display = LoggingDisplay()
+        self.original_displays = [module.display for module in galaxy_modules]
+
+        for module in galaxy_modules:
+            module.display = logging_display
+
+    def restore(self):
+        for module, original_display in zip(galaxy_modules, self.original_displays):
+            module.display = original_display
+
+
+galaxy_display_route = GalaxyDisplayRoute()
+
+
+class GalaxyInstallation(object):
+    def __init__(self, roles_path, pin_dependency=None):
+        self.galaxy = Galaxy(GalaxyOptions(roles_path))
+        self.pin_dependency = pin_dependency or (lambda dependency: dependency)
+
+        self.pending_roles = []
+        self.dependencies = []
+        self.failures = []
+
+    def install(self, requirements):
+        with galaxy_display_route.routed_to_log():
+            self.pending_roles.extend(
+                self.galaxy_role(requirement) for requirement in requirements)
+
+            # dependencies of installed roles are appended while iterating
+            for role in self.pending_roles:
+                if self.install_role(role):
+                    self.add_dependencies(role)
+
+        return self.failures
+
+    def galaxy_role(self, requirement):
+        if isinstance(requirement, dict):
+            requirement = dict(requirement)
+
+        return GalaxyRole(self.galaxy, **RoleRequirement.role_yaml_parse(requirement))
+
+    def install_role(self, role):
+        log.info('installing role %s from %s', role.name, role.src)
+
+        if role.install_info is not None:
+            role.remove()
+
+        try:
+            is_installed = role.install()
+        except AnsibleError as e:
+            is_installed = False
+            self.add_failure(role, str(e))
+        else:
+            if not is_installed:
+                self.add_failure(role, 'installation failed')
+
+        return is_installed
+
+    def add_failure(self, role, reason):
+        self.failures.append(RoleInstallFailure(role.name, role.src, role.version, reason))
+
+    def add_dependencies(self, role):
+        for dependency in (role.metadata or {}).get('dependencies') or []:
+            dependency = self.pin_dependency(dependency)
+            dependency_role = self.galaxy_role(dependency)
+
+            if self.is_pending_installation(dependency_role):
+                log.info('adding dependency %s of role %s', dependency_role.name, role.name)
+                self.pending_roles.append(dependency_role)
+                self.dependencies.append(dependency)
+
+    def is_pending_installation(self, role):
+        return is_installable(role) and role.install_info is None and \
+            role not in self.pending_roles
+
+
+def is_installable(role):
+    # roles neither qualified by namespace nor from scm cannot be found on
+    # galaxy, thus they are expected to be available locally
+    return '.' in role.name or '.' in role.src or role.scm is not None
@@ -18,20 +18,23 @@ class Inventory(object):
     def __init__(self, inventory_path):
         self.inventory_path = inventory_path
         self.inventory = None
+        self.loader = DataLoader()
         self.inventory = self.build_inventory()
+        self.variable_manager = self.build_variable_manager()
 
     def build_inventory(self):
         self.clear_caches()
 
-        loader = DataLoader()
-        inventory = InventoryManager(
-            loader=loader, sources=self.inventory_path.strpath)
+        return InventoryManager(
+            loader=self.loader, sources=self.inventory_path.strpath)
+
+    def build_variable_manager(self):
         variable_manager = VariableManager(
-            loader=loader, inventory=inventory)
+            loader=self.loader, inventory=self.inventory)
         variable_manager.extra_vars = load_extra_vars(
-            loader=loader, options=EmptyOptions())
+            loader=self.loader, options=EmptyOptions())
 
-        return inventory
+        return variable_manager
 
     def clear_caches(self):
         if self.inventory is not None:
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+
+import hashlib
+import logging
+import os
+
+import py.path
+import yaml
+
+from .role_store import file_digest, parse_requirement, serialize
+
+log = logging.getLogger(__name__)
+
+lockfile_header = (
+    '# generated by goodplay, records the versions requirements have been\n'
+    '# resolved to, delete it for resolving them again\n')
+
+
+def is_lockfile(path):
+    # lockfiles are written by goodplay itself, thus they are no inputs of
+    # test playbooks, e.g. for caching task listings or selecting changes
+    return path.basename.endswith('.yml.lock')
+
+
+def requirements_digest(requirements):
+    return hashlib.sha1(serialize(requirements).encode('utf-8')).hexdigest()
+
+
+class Lockfile(object):
+    # resolved requirements recorded beside the file declaring them, e.g.
+    # requirements.yml.lock beside requirements.yml
+    def __init__(self, declaring_path):
+        self.path = declaring_path.new(basename=declaring_path.basename + '.lock')
+
+    def load(self, requirements):
+        # locked (key, resolved version, pinned dependencies) per requirement,
+        # None unless the lockfile is current
+        content = self.read()
+
+        if content is None or not self.is_current(content, requirements):
+            return None
+
+        return [(role['key'], role['resolved_version'], role.get('dependencies') or [])
+                for role in content['roles']]
+
+    def read(self):
+        if not self.path.check(file=True):
+            return None
+
+        try:
+            return yaml.safe_load(self.path.read()) or {}
+        except (EnvironmentError, yaml.YAMLError):
+            return None
+
+    def is_current(self, content, requirements):
+        locked_roles = content.get('roles') or []
+
+        if content.get('requirements_digest') != requirements_digest(requirements) or \
+                len(locked_roles) != len(requirements):
+            log.info('lockfile %s is outdated', self.path)
+            return False
+
+        if not are_local_archives_unchanged(locked_roles):
+            log.info('lockfile %s refers to changed local archives', self.path)
+            return False
+
+        return True
+
+    def write(self, requirements, resolutions):
+        locked_roles = [
+            locked_role(requirement, *resolution)
+            for requirement, resolution in zip(requirements, resolutions)]
+        content = dict(requirements_digest=requirements_digest(requirements), roles=locked_roles)
+
+        log.info('writing lockfile %s', self.path)
+        self.path.write(lockfile_header + yaml.safe_dump(content, default_flow_style=False))
+
+
+def locked_role(requirement, key, resolved_version, dependencies=()):
+    # dependencies are those installed along with the role, pinned to the
+    # versions they have been resolved to
+    parsed = parse_requirement(requirement)
+
+    return dict(
+        name=parsed['name'], src=parsed['src'], scm=parsed.get('scm'),
+        version=parsed.get('version') or None, resolved_version=resolved_version, key=key,
+        dependencies=list(dependencies))
+
+
+def are_local_archives_unchanged(locked_roles):
+    return all(is_local_archive_unchanged(role) for role in locked_roles)
+
+
+def is_local_archive_unchanged(role):
+    # local archives are resolved to their checksum, which is cheap to verify,
+    # while the checksum of remote archives is verified when installing them
+    if not os.path.isfile(role['src']):
+        return True
+
+    return file_digest(py.path.local(role['src'])) == role['resolved_version']
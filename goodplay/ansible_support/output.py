@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+
+import collections
+import gzip
+import logging
+import threading
+import zlib
+
+log = logging.getLogger(__name__)
+
+gzip_wbits = 16 + zlib.MAX_WBITS
+
+
+class OutputSpool(object):
+    # streams the output of a run into a gzip compressed spool file, which
+    # consists of one gzip member per section between test task events, thus
+    # the output of a test task is only read back from its own members once
+    # it failed, lines and events are added by the threads receiving them
+    read_size = 65536
+
+    def __init__(self, path, max_report_lines=1000, log_lines=False):
+        self.path = path
+        self.max_report_lines = max_report_lines
+        self.log_lines = log_lines
+        self.lock = threading.Lock()
+
+        self.spool_file = None
+        self.member = None
+        self.offset = 0
+        self.test_task_offsets = {}
+        self.test_task_start_offset = 0
+
+    def add(self, line):
+        with self.lock:
+            self.open_member().write((line + '\n').encode('utf-8'))
+
+        if self.log_lines:
+            log.info(line)
+
+    def open_member(self):
+        if self.spool_file is None:
+            self.spool_file = self.path.open('wb')
+
+        if self.member is None:
+            self.member = gzip.GzipFile(fileobj=self.spool_file, mode='wb')
+
+        return self.member
+
+    def close_member(self):
+        # returns the offset the next member starts at, while all output
+        # before it is readable from the spool file
+        if self.member is not None:
+            self.member.close()
+            self.member = None
+            self.spool_file.flush()
+            self.offset = self.spool_file.tell()
+
+        return self.offset
+
+    def add_event(self, event):
+        if event['event_name'] == 'test-task-start':
+            with self.lock:
+                self.test_task_start_offset = self.close_member()
+                self.test_task_offsets[event['data']['name']] = (self.test_task_start_offset, None)
+        elif event['event_name'] == 'test-task-end':
+            with self.lock:
+                start_offset, _ = self.test_task_offsets.get(event['data']['name'], (0, None))
+                self.test_task_offsets[event['data']['name']] = (start_offset, self.close_member())
+
+    def test_task_lines(self, test_task_name):
+        with self.lock:
+            start_offset, end_offset = self.test_task_offsets.get(test_task_name, (0, 0))
+
+            if end_offset is None:
+                end_offset = self.close_member()
+
+        return self.read_lines(start_offset, end_offset)
+
+    def recent_lines(self):
+        # output since the last test task started
+        with self.lock:
+            start_offset, end_offset = self.test_task_start_offset, self.close_member()
+
+        return self.read_lines(start_offset, end_offset)
+
+    def read_lines(self, start_offset, end_offset):
+        # only the most recent lines are reported
+        if start_offset == end_offset:
+            return []
+
+        with self.path.open('rb') as spool_file:
+            spool_file.seek(start_offset)
+            chunks = decompress_members(
+                read_chunks(spool_file, end_offset - start_offset, self.read_size))
+
+            return list(collections.deque(split_lines(chunks), maxlen=self.max_report_lines))
+
+    def close(self):
+        with self.lock:
+            self.close_member()
+
+            if self.spool_file is not None:
+                self.spool_file.close()
+
+
+def read_chunks(fileobj, size, read_size):
+    while size > 0:
+        chunk = fileobj.read(min(size, read_size))
+
+        if not chunk:
+            break
+
+        size -= len(chunk)
+        yield chunk
+
+
+def decompress_members(chunks):
+    # data beyond the end of a member starts the next one
+    decompressor = zlib.decompressobj(gzip_wbits)
+
+    for chunk in chunks:
+        while chunk:
+            yield decompressor.decompress(chunk)
+            chunk = decompressor.unused_data
+
+            if chunk:
+                decompressor = zlib.decompressobj(gzip_wbits)
+
+
+def split_lines(chunks):
+    partial_line = b''
+
+    for chunk in chunks:
+        lines = (partial_line + chunk).split(b'\n')
+        partial_line = lines.pop()
+
+        for line in lines:
+            yield line.decode('utf-8', 'replace')
+
+    if partial_line:
+        yield partial_line.decode('utf-8', 'replace')
@@ -4,83 +4,169 @@
 from __future__ import (absolute_import, division, print_function)
 
 import collections
+import hashlib
+import json
 import logging
 import os
-import re
 
 import ansible.constants
+from ansible.playbook.role.requirement import RoleRequirement
 from cached_property import cached_property
-import yaml
 
+from . import galaxy, role_store as role_store_support
+from .discovery import Task, TaskDiscovery
+from .lockfile import Lockfile
+from .role_mirror import RoleMirrorError
 from .runner import PlaybookRunner
-from ..utils.subprocess import run
 
 log = logging.getLogger(__name__)
 
 
 class Playbook(object):
-    tagged_tasks_re = re.compile(r'''
-        (?:^\ {6})        # 6 spaces at the beginning of line
-        (?P<name>.*?)     # group: task name
-        (?:\t)            # 1 tab delimiter
-        TAGS:\ \[         # task tags prefix
-        (?P<tags>.+?)     # group: task tags
-        \]$               # task tags suffix at the end of line
-        ''', re.VERBOSE)
-
     def __init__(self, ctx):
         self.ctx = ctx
 
-        self.install_all_dependencies()
+        self.dependencies_installed = False
 
     def install_all_dependencies(self):
-        self.install_role_dependencies()
-        self.install_soft_dependencies()
+        if self.dependencies_installed:
+            return
+
+        installed_marker_path = self.ctx.installed_roles_path.join('.goodplay-installed')
+
+        if installed_marker_path.check(file=True):
+            log.info('dependencies already installed in %s', self.ctx.installed_roles_path)
+        else:
+            self.install_role_dependencies()
+            self.install_soft_dependencies()
+            installed_marker_path.ensure()
+
+        self.dependencies_installed = True
+
+    def dependencies_digest(self):
+        serialized_dependencies = json.dumps(
+            [self.role_dependencies(), self.soft_dependencies(), self.ctx.use_local_roles],
+            sort_keys=True, default=str)
+
+        return hashlib.sha1(serialized_dependencies.encode('utf-8')).hexdigest()
 
     def install_role_dependencies(self):
         if not self.ctx.is_role_playbook:
             return
 
         role_meta_path = self.ctx.role_path.join('meta', 'main.yml')
-        role_meta_content = yaml.safe_load(role_meta_path.read())
-        role_dependencies = role_meta_content.get('dependencies', [])
+        role_dependencies = self.role_dependencies()
 
         if role_dependencies:
             log.info('role dependencies found in %s ... installing', role_meta_path)
-            requirements_path = self.ctx.installed_roles_path.join('requirements.yml')
-            requirements_path.write(yaml.dump(role_dependencies))
-
-            self.install_roles_from_requirements_file(requirements_path)
+            self.install_requirements(role_dependencies, role_meta_path)
         else:
             log.info('role dependencies not found in %s ... nothing to install',
                      role_meta_path)
 
     def install_soft_dependencies(self):
-        requirements_path = self.ctx.playbook_path.dirpath('requirements.yml')
+        requirements_path = self.soft_dependencies_path()
 
-        if requirements_path.check(file=True):
+        if self.ctx.session.fs_index.isfile(requirements_path):
             log.info('soft dependencies found in %s ... installing', requirements_path)
-            self.install_roles_from_requirements_file(requirements_path)
+            self.install_requirements(self.soft_dependencies(), requirements_path)
         else:
             log.info('soft dependencies file not found at %s ... nothing to install',
                      requirements_path)
 
-    def install_roles_from_requirements_file(self, requirements_file):
-        ansible_galaxy_cmd = \
-            'ansible-galaxy install -vvvv --force --role-file {0} --roles-path {1}'
+    def install_requirements(self, requirements, declaring_path):
+        role_store = self.ctx.session.role_store
+        installer = role_store or self.ctx.session.role_mirror
 
-        if self.ctx.use_local_roles:
-            ansible_galaxy_cmd += ' --ignore-errors'
+        # requirements including other requirements files are installed as a whole
+        if installer is None or role_store_support.has_includes(requirements):
+            self.install_without_store(requirements)
+        elif role_store is not None:
+            self.install_into_store(role_store, requirements, declaring_path)
+        else:
+            installer.install(
+                requirements, self.ctx.installed_roles_path, self.ctx.use_local_roles)
 
-        process = run(ansible_galaxy_cmd, requirements_file, self.ctx.installed_roles_path)
+    def install_into_store(self, role_store, requirements, declaring_path):
+        lockfile = self.lockfile(declaring_path)
+        is_locked = lockfile is not None and self.apply_lockfile(lockfile, requirements)
 
-        for line in process.stdout:
-            log.info(line[:-1])
+        role_store.install(requirements, self.ctx.installed_roles_path, self.ctx.use_local_roles)
 
-        if process.returncode != 0:
-            raise Exception(process.stderr.readlines())  # pragma: no cover
+        if lockfile is not None and not is_locked:
+            lockfile.write(requirements, [
+                role_store.locked_resolution(requirement) for requirement in requirements])
 
-    def env(self):
+    def lockfile(self, declaring_path):
+        if not self.ctx.config.getoption('no_lockfiles'):
+            return Lockfile(declaring_path)
+
+    def apply_lockfile(self, lockfile, requirements):
+        locked_resolutions = lockfile.load(requirements)
+
+        if locked_resolutions is None:
+            return False
+
+        for requirement, locked_resolution in zip(requirements, locked_resolutions):
+            self.ctx.session.role_store.lock(requirement, *locked_resolution)
+
+        return True
+
+    def apply_lockfiles(self):
+        # resolutions recorded in current lockfiles are used by the role store
+        for requirements, declaring_path in self.store_requirement_declarations():
+            lockfile = self.lockfile(declaring_path)
+
+            if lockfile is not None:
+                self.apply_lockfile(lockfile, requirements)
+
+    def install_without_store(self, requirements):
+        if self.ctx.session.role_mirror is not None:
+            raise RoleMirrorError(
+                'requirements including other requirements files cannot be installed '
+                'from a role mirror')
+
+        galaxy.install_roles(requirements, self.ctx.installed_roles_path, self.ctx.use_local_roles)
+
+    def store_requirements(self):
+        # requirements installed via the role store
+        return [requirement
+                for requirements, _ in self.store_requirement_declarations()
+                for requirement in requirements]
+
+    def store_requirement_declarations(self):
+        declarations = []
+
+        if self.ctx.is_role_playbook:
+            declarations.append(
+                (self.role_dependencies(), self.ctx.role_path.join('meta', 'main.yml')))
+
+        declarations.append((self.soft_dependencies(), self.soft_dependencies_path()))
+
+        return [(requirements, declaring_path) for requirements, declaring_path in declarations
+                if requirements and not role_store_support.has_includes(requirements)]
+
+    def role_dependencies(self):
+        if not self.ctx.is_role_playbook:
+            return []
+
+        role_meta_path = self.ctx.role_path.join('meta', 'main.yml')
+        role_meta_content = self.ctx.session.yaml_cache.load(role_meta_path) or {}
+
+        return role_meta_content.get('dependencies', [])
+
+    def soft_dependencies_path(self):
+        return self.ctx.playbook_path.dirpath('requirements.yml')
+
+    def soft_dependencies(self):
+        requirements_path = self.soft_dependencies_path()
+
+        if self.ctx.session.fs_index.isfile(requirements_path):
+            return self.ctx.session.yaml_cache.load(requirements_path) or []
+
+        return []
+
+    def roles_path(self, resolution_only=False):
         roles_path = []
 
         if self.ctx.role_path:
@@ -89,19 +175,71 @@ class Playbook(object):
         if self.ctx.use_local_roles:
             roles_path.extend(ansible.constants.DEFAULT_ROLES_PATH)
 
-        roles_path.append(self.ctx.installed_roles_path.strpath)
+        if resolution_only:
+            roles_path.extend(self.resolution_only_roles_path())
+        else:
+            roles_path.append(self.ctx.installed_roles_path.strpath)
+
+        return roles_path
+
+    def resolution_only_roles_path(self):
+        if self.dependencies_installed:
+            return [self.ctx.installed_roles_path.strpath]
 
+        return self.placeholder_roles_paths()
+
+    def placeholder_roles_paths(self):
+        # dependencies are resolvable without installing them by providing
+        # an empty role for each of them, which has the lowest precedence,
+        # while those in the role store already are provided as installed
+        role_names = list(requirement_role_names(
+            self.role_dependencies() + self.soft_dependencies()))
+
+        if not role_names:
+            return []
+
+        for role_name in role_names:
+            self.ctx.placeholder_roles_path.ensure(role_name, dir=True)
+
+        for roles_path in self.stored_roles_paths:
+            role_store_support.materialize(roles_path, self.ctx.placeholder_roles_path)
+
+        return [self.ctx.placeholder_roles_path.strpath]
+
+    @cached_property
+    def stored_roles_paths(self):
+        # roles paths of role store entries dependencies are installed in
+        # already, thus their tasks, defaults and vars are discovered
+        role_store = self.ctx.session.role_store
+
+        if role_store is None:
+            return []
+
+        self.apply_lockfiles()
+        stored_roles_paths = [
+            role_store.find(requirement) for requirement in self.store_requirements()]
+
+        return [roles_path for roles_path in stored_roles_paths if roles_path is not None]
+
+    def env(self):
         return dict(
-            ANSIBLE_ROLES_PATH=os.pathsep.join(roles_path),
+            ANSIBLE_ROLES_PATH=os.pathsep.join(self.roles_path()),
             ANSIBLE_RETRY_FILES_ENABLED='false',
             )
 
     def create_runner(self):
+        executor = self.ctx.config.getoption('executor')
+
+        if executor != 'subprocess':
+            from .fork_runner import ForkPlaybookRunner
+
+            return ForkPlaybookRunner(self.ctx, use_forkserver=executor == 'forkserver')
+
         return PlaybookRunner(self.ctx)
 
     @cached_property
     def test_tasks(self):
-        test_tasks = [task for task in self.tasks() if 'test' in task.tags]
+        test_tasks = [task for task in self.cached_tasks() if 'test' in task.tags]
         self.ensure_unique_task_names(test_tasks)
 
         return test_tasks
@@ -117,26 +255,33 @@ class Playbook(object):
                 "Playbook '{0}' contains tests with non-unique name '{1}'"
                 .format(self.ctx.playbook_path.strpath, non_unique_task_names[0]))
 
-    def tasks(self):
-        process = run(
-            'ansible-playbook --list-tasks --list-tags -i {0} {1}',
-            self.ctx.inventory_path, self.ctx.playbook_path,
-            env=self.env())
+    def cached_tasks(self):
+        tasks_cache = self.ctx.tasks_cache
+
+        if tasks_cache is None:
+            return list(self.tasks())
+
+        cache_key = self.ctx.tasks_cache_key
+        serialized_tasks = tasks_cache.get(cache_key)
 
-        if process.returncode != 0:
-            raise Exception(process.stderr.read())
+        if serialized_tasks is None:
+            serialized_tasks = [[task.name, task.tags] for task in self.tasks()]
+            tasks_cache.set(cache_key, serialized_tasks)
+
+        return [Task(name, tags) for name, tags in serialized_tasks]
+
+    def tasks(self):
+        discovery = TaskDiscovery(self.ctx.inventory, self.roles_path(resolution_only=True))
 
-        for line in process.stdout:
-            match = self.tagged_tasks_re.match(line)
+        return discovery.tasks(self.ctx.playbook_path)
 
-            if match:
-                name = match.group('name')
-                tags = [tag.strip() for tag in match.group('tags').split(',')]
 
-                yield Task(name, tags)
+def requirement_role_names(requirements):
+    for requirement in requirements:
+        if isinstance(requirement, dict) and 'include' in requirement:
+            continue
 
+        if isinstance(requirement, dict):
+            requirement = dict(requirement)
 
-class Task(object):
-    def __init__(self, name, tags):
-        self.name = name
-        self.tags = tags
+        yield RoleRequirement.role_yaml_parse(requirement)['name']
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+
+import hashlib
+import json
+import logging
+import tarfile
+
+import py.path
+
+from . import galaxy
+from .role_store import (
+    SourceResolver, parse_requirement, resolve_requirement, serialize, source_requirement)
+from ..utils.git import GitError, mirror_repository, resolve_ref
+
+log = logging.getLogger(__name__)
+
+
+class RoleMirrorError(Exception):
+    pass
+
+
+class FetchResolver(SourceResolver):
+    # resolves requirements from their sources when fetching them, except git
+    # versions resolved from the mirror updated before; the versions of
+    # galaxy roles and remote archives are recorded, thus installs resolve
+    # them the same way without accessing the network
+    def __init__(self, mirror):
+        self.mirror = mirror
+
+    def resolve_ref(self, src, ref):
+        return self.mirror.resolve_mirrored_ref(src, ref)
+
+    def resolve_remote_archive(self, parsed):
+        return self.mirror.record_version(
+            parsed, super(FetchResolver, self).resolve_remote_archive(parsed))
+
+    def latest_release(self, parsed):
+        return self.mirror.record_version(
+            parsed, super(FetchResolver, self).latest_release(parsed))
+
+
+class MirrorResolver(FetchResolver):
+    # resolves requirements without accessing the network, using the
+    # versions recorded when fetching them
+    def resolve_remote_archive(self, parsed):
+        return self.mirror.recorded_version(parsed)
+
+    def latest_release(self, parsed):
+        return self.mirror.recorded_version(parsed)
+
+
+class RoleMirror(object):
+    # local mirror of role sources, holding bare mirrors of git repositories
+    # and an archive per requirement containing the requirement installed
+    # together with its dependencies, thus installs do not access the network
+    def __init__(self, mirror_path):
+        self.mirror_path = mirror_path
+
+    def git_mirror_path(self, src):
+        return self.mirror_path.join('git', hashlib.sha1(src.encode('utf-8')).hexdigest())
+
+    def resolve_mirrored_ref(self, src, ref):
+        return resolve_ref(self.git_mirror_path(src).strpath, ref)
+
+    def resolve_requirement(self, requirement):
+        return resolve_requirement(requirement, MirrorResolver(self))
+
+    def version_path(self, parsed):
+        version_key = json.dumps([parsed['name'], parsed['src']])
+
+        return self.mirror_path.join(
+            'versions', hashlib.sha1(version_key.encode('utf-8')).hexdigest())
+
+    def record_version(self, parsed, resolved_version):
+        version_path = self.version_path(parsed)
+
+        if resolved_version is not None:
+            version_path.write(resolved_version, ensure=True)
+        elif version_path.check(file=True):
+            version_path.remove()
+
+        return resolved_version
+
+    def recorded_version(self, parsed):
+        version_path = self.version_path(parsed)
+
+        if version_path.check(file=True):
+            return version_path.read()
+
+    def archive_path(self, requirement, key):
+        # requirements not resolving to a version are keyed by themselves
+        archive_key = key or hashlib.sha1(serialize(requirement).encode('utf-8')).hexdigest()
+
+        return self.mirror_path.join('archives', archive_key + '.tar.gz')
+
+    def install(self, requirements, roles_path, ignore_errors=False):
+        for requirement in requirements:
+            self.install_requirement(requirement, roles_path, ignore_errors)
+
+    def install_requirement(self, requirement, roles_path, ignore_errors=False, key=None):
+        try:
+            self.extract(requirement, roles_path, key)
+        except RoleMirrorError as e:
+            if not ignore_errors:
+                raise
+            log.info('%s ... ignoring', e)
+
+    def extract(self, requirement, roles_path, key=None):
+        archive_path = self.archive_path(
+            requirement, key or self.resolve_requirement(requirement)[0])
+
+        if not archive_path.check(file=True):
+            raise RoleMirrorError(
+                'requirement {0} not found in role mirror {1}, '
+                'run goodplay deps fetch for mirroring it'.format(requirement, self.mirror_path))
+
+        log.info('installing %s from %s', requirement, archive_path)
+
+        with tarfile.open(archive_path.strpath, 'r:gz') as archive:
+            # later roles replace earlier ones with the same name, just like
+            # installing them with ansible-galaxy's --force would
+            for role_name in archive_role_names(archive):
+                if roles_path.join(role_name).check():
+                    roles_path.join(role_name).remove()
+            archive.extractall(roles_path.strpath)
+
+    def update_git_mirror(self, src):
+        log.info('mirroring git repository %s', src)
+        mirror_repository(src, self.git_mirror_path(src))
+
+    def fetch(self, requirement):
+        # returns whether the requirement has been fetched, False when it
+        # already is mirrored; requirements are resolved anew, thus fetched
+        # again once their branch moved, a newer release got published or a
+        # remote archive changed, while those not resolving to a version are
+        # fetched every time
+        key, resolved_version = resolve_requirement(requirement, FetchResolver(self))
+        archive_path = self.archive_path(requirement, key)
+
+        if key is not None and archive_path.check(file=True):
+            return False
+
+        archive_path.dirpath().ensure(dir=True)
+        temp_path = py.path.local.mkdtemp(rootdir=archive_path.dirpath())
+
+        try:
+            self.fetch_into(requirement, resolved_version, temp_path)
+            temp_path.join('archive.tar.gz').rename(archive_path)
+        finally:
+            temp_path.remove(ignore_errors=True)
+
+        return True
+
+    def fetch_into(self, requirement, resolved_version, temp_path):
+        roles_path = temp_path.ensure('roles', dir=True)
+        fetched_requirement = source_requirement(
+            requirement, resolved_version, temp_path.join('download.tar.gz'))
+
+        galaxy.install_roles([self.mirrored_requirement(fetched_requirement)], roles_path)
+
+        with tarfile.open(temp_path.join('archive.tar.gz').strpath, 'w:gz') as archive:
+            for role_path in roles_path.listdir(sort=True):
+                archive.add(role_path.strpath, arcname=role_path.basename)
+
+    def mirrored_requirement(self, requirement):
+        # git repositories are installed from their mirror
+        parsed = parse_requirement(requirement)
+
+        if parsed.get('scm') != 'git':
+            return requirement
+
+        mirrored_requirement = dict(
+            name=parsed['name'], scm='git',
+            src='file://' + self.git_mirror_path(parsed['src']).strpath)
+
+        if parsed.get('version'):
+            mirrored_requirement['version'] = parsed['version']
+
+        return mirrored_requirement
+
+    def fetch_all(self, requirements, pool):
+        # git repositories are mirrored once before fetching the requirements
+        # depending on them, failures are returned per requirement
+        parsed_requirements = dict(
+            (serialize(requirement), parse_requirement(requirement))
+            for requirement in requirements)
+        git_srcs = sorted(set(
+            parsed['src'] for parsed in parsed_requirements.values()
+            if parsed.get('scm') == 'git'))
+
+        git_errors = dict(zip(git_srcs, pool.map(self.try_update_git_mirror, git_srcs)))
+
+        return pool.map(
+            lambda requirement: self.try_fetch(
+                requirement, git_errors.get(parsed_requirements[serialize(requirement)]['src'])),
+            requirements)
+
+    def try_update_git_mirror(self, src):
+        try:
+            self.update_git_mirror(src)
+        except GitError as e:
+            return str(e)
+
+    def try_fetch(self, requirement, git_error):
+        if git_error:
+            return requirement, 'failed', git_error
+
+        try:
+            return requirement, 'fetched' if self.fetch(requirement) else 'mirrored', None
+        except Exception as e:
+            return requirement, 'failed', str(e)
+
+
+def archive_role_names(archive):
+    return sorted(set(name.split('/')[0] for name in archive.getnames()))
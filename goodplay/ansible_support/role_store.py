@@ -0,0 +1,623 @@
+# -*- coding: utf-8 -*-
+
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+
+import collections
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from multiprocessing.pool import ThreadPool
+
+from ansible.playbook.role.requirement import RoleRequirement
+import py.path
+from . import galaxy
+from ..utils.git import GitError, resolve_ref
+
+log = logging.getLogger(__name__)
+
+commit_id_re = re.compile(r'^[0-9a-f]{7,40}$')
+
+
+def default_store_path():
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+
+    return py.path.local(cache_home).join('goodplay', 'roles')
+
+
+def has_includes(requirements):
+    return any(isinstance(requirement, dict) and 'include' in requirement
+               for requirement in requirements)
+
+
+def parse_requirement(requirement):
+    if isinstance(requirement, dict):
+        requirement = dict(requirement)
+
+    return RoleRequirement.role_yaml_parse(requirement)
+
+
+def resolve_requirement(requirement, resolver=None):
+    # the version a requirement currently resolves to and the key of its
+    # installation within the store, None when the requirement does not pin
+    # the content being installed
+    parsed = parse_requirement(requirement)
+    resolved_version = (resolver or SourceResolver()).resolve_version(parsed)
+
+    return resolution_key(parsed, resolved_version), resolved_version
+
+
+def resolution_key(parsed, resolved_version):
+    if resolved_version is None:
+        return None
+
+    key_parts = [parsed['name'], parsed['src'], parsed.get('scm'), resolved_version]
+
+    return hashlib.sha1(json.dumps(key_parts).encode('utf-8')).hexdigest()
+
+
+def requirement_key(requirement, resolver=None):
+    return resolve_requirement(requirement, resolver)[0]
+
+
+def requirement_source(parsed):
+    if os.path.isfile(parsed['src']):
+        return 'local_archive'
+
+    if parsed.get('scm'):
+        return 'scm'
+
+    if '://' in parsed['src']:
+        return 'remote_archive'
+
+    return 'galaxy'
+
+
+def pinned_requirement(requirement, resolved_version):
+    # scm and galaxy requirements are installed from the commit or release
+    # they have been resolved to, even when their branch moved or a newer
+    # release got published in the meantime
+    parsed = parse_requirement(requirement)
+    source = requirement_source(parsed)
+
+    if resolved_version is None or source not in ('scm', 'galaxy'):
+        return requirement
+
+    pinned = dict(name=parsed['name'], src=parsed['src'], version=resolved_version)
+
+    if source == 'scm':
+        pinned['scm'] = parsed['scm']
+
+    return pinned
+
+
+class SourceResolver(object):
+    # resolves requirements to the version installing them from their source
+    # would install right now, which is the commit of a branch, tag or the
+    # default branch, the latest release on galaxy or the content of archives
+    def resolve_version(self, parsed):
+        resolvers = dict(
+            local_archive=self.resolve_local_archive, scm=self.resolve_scm,
+            remote_archive=self.resolve_remote_archive, galaxy=self.resolve_galaxy)
+
+        return resolvers[requirement_source(parsed)](parsed)
+
+    def resolve_local_archive(self, parsed):
+        return file_digest(py.path.local(parsed['src']))
+
+    def resolve_scm(self, parsed):
+        return resolve_scm_version(
+            parsed['src'], parsed.get('version') or 'HEAD', self.resolve_ref)
+
+    def resolve_ref(self, src, ref):
+        return resolve_ref(src, ref)
+
+    def resolve_remote_archive(self, parsed):
+        return remote_archive_digest(parsed['src'])
+
+    def resolve_galaxy(self, parsed):
+        # roles without namespace are no galaxy roles, but local ones
+        if parsed.get('version') or '.' not in parsed['src']:
+            return parsed.get('version') or None
+
+        return self.latest_release(parsed)
+
+    def latest_release(self, parsed):
+        return galaxy.latest_release(parsed['src'])
+
+
+def resolve_scm_version(src, version, ref_resolver):
+    # branches and tags are resolved to the commit they currently point to
+    try:
+        commit_id = ref_resolver(src, version)
+    except GitError as e:
+        log.info('unable to resolve version %s of %s: %s', version, src, e)
+        return None
+
+    if commit_id is None and commit_id_re.match(version):
+        return version
+
+    return commit_id
+
+
+def remote_archive_digest(url):
+    # remote archives are keyed by their content just like local ones
+    temp_path = py.path.local.mkdtemp()
+
+    try:
+        return download_archive_digest(url, temp_path.join('archive.tar.gz'))
+    except Exception as e:
+        log.info('unable to download archive %s: %s', url, e)
+        return None
+    finally:
+        temp_path.remove(ignore_errors=True)
+
+
+def download_archive_digest(url, archive_path):
+    galaxy.download_archive(url, archive_path)
+
+    return file_digest(archive_path)
+
+
+def serialize(requirement):
+    return json.dumps(requirement, sort_keys=True, default=str)
+
+
+def file_digest(path):
+    digest = hashlib.sha1()
+
+    with path.open('rb') as stream:
+        for chunk in iter(lambda: stream.read(65536), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def tree_digest(root_path):
+    # digest and size of all files and symlinks below root_path
+    digest = hashlib.sha1()
+    size = 0
+
+    for dir_path, dir_names, file_names in os.walk(root_path.strpath):
+        dir_names.sort()
+
+        for file_name in sorted(file_names):
+            path = py.path.local(dir_path).join(file_name)
+            digest.update(path.relto(root_path).encode('utf-8') + b'\0')
+
+            if path.islink():
+                digest.update(path.readlink().encode('utf-8'))
+            else:
+                digest.update(file_digest(path).encode('ascii'))
+                size += path.size()
+
+    return digest.hexdigest(), size
+
+
+def read_entry_info(entry_path):
+    # None unless the entry has been installed completely
+    try:
+        return json.loads(entry_path.join('entry.json').read())
+    except (EnvironmentError, ValueError):
+        return None
+
+
+def verify_download(url, resolved_version, archive_path):
+    # reason of failing to download the archive resolved to, None on success
+    try:
+        digest = download_archive_digest(url, archive_path)
+    except Exception as e:
+        return 'download failed: {0}'.format(e)
+
+    if digest != resolved_version:
+        return 'checksum {0} differs from {1} it has been resolved to'.format(
+            digest, resolved_version)
+
+
+def source_requirement(requirement, resolved_version, archive_path):
+    # requirement installing the version resolved to, where remote archives
+    # are downloaded up front, thus are verified to have the content they
+    # have been resolved to
+    parsed = parse_requirement(requirement)
+
+    if resolved_version is None or requirement_source(parsed) != 'remote_archive':
+        return pinned_requirement(requirement, resolved_version)
+
+    failure_reason = verify_download(parsed['src'], resolved_version, archive_path)
+
+    if failure_reason is not None:
+        raise galaxy.RoleInstallError([galaxy.RoleInstallFailure(
+            parsed['name'], parsed['src'], parsed.get('version'), failure_reason)])
+
+    return dict(name=parsed['name'], src=archive_path.strpath)
+
+
+def materialize(roles_path, target_path):
+    # later roles replace earlier ones with the same name, just like
+    # installing them with ansible-galaxy's --force would
+    for role_path in roles_path.listdir(lambda path: path.check(dir=True), sort=True):
+        link_path = target_path.join(role_path.basename)
+
+        if link_path.check(link=True) or link_path.check():
+            link_path.remove()
+
+        link_path.mksymlinkto(role_path)
+
+
+class Lease(object):
+    # lock on a role store entry shared by all sessions using it, which is
+    # acquired exclusively for evicting the entry; locks are released by the
+    # operating system when sessions die
+    def __init__(self, path):
+        self.path = path
+        self.stream = None
+
+    def acquire(self, operation=fcntl.LOCK_SH):
+        self.path.dirpath().ensure(dir=True)
+
+        # lease files removed by evictions while waiting are created anew
+        while self.stream is None:
+            stream = self.path.open('a')
+
+            try:
+                fcntl.flock(stream.fileno(), operation)
+            except EnvironmentError:
+                stream.close()
+                return False
+
+            if self.path.check(file=True) and \
+                    os.fstat(stream.fileno()).st_ino == self.path.stat().ino:
+                self.stream = stream
+            else:
+                stream.close()
+
+        return True
+
+    def release(self):
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+
+
+class RoleStore(object):
+    # persistent store of installed roles, each entry holds a single
+    # requirement installed together with its dependencies, keyed by its
+    # source and resolved version, verified on first use within a session
+    # and evicted least recently used first when exceeding the budget;
+    # requirements not pinning a version are installed once per session;
+    # entries used are leased until the session releases the store, thus
+    # not evicted by concurrent sessions
+    def __init__(self, store_path, budget=None, mirror=None):
+        self.store_path = store_path
+        self.budget = budget
+        self.mirror = mirror
+
+        self.used_keys = set()
+        self.leases = {}
+        self.resolutions = {}
+        self.locked_dependencies = {}
+        self.volatile_store_path = None
+
+        # prefetching ensures requirements within threads, where the state
+        # above is guarded by state_lock and each entry by a lock of its own
+        self.state_lock = threading.Lock()
+        self.entry_locks = {}
+
+    def install(self, requirements, target_path, ignore_errors=False):
+        for requirement in requirements:
+            roles_path = self.ensure(requirement, ignore_errors)
+
+            if roles_path is not None:
+                materialize(roles_path, target_path)
+
+    def prefetch(self, requirements, workers=1, ignore_errors=False):
+        # installs the unique requirements of a session up front, failing
+        # ones are installed again and reported by the test playbooks
+        # requiring them
+        unique_requirements = collections.OrderedDict(
+            (self.unique_key(requirement), requirement) for requirement in requirements)
+        log.info('installing %d unique requirements with %d workers',
+                 len(unique_requirements), workers)
+
+        pool = ThreadPool(workers)
+
+        try:
+            pool.map(
+                lambda requirement: self.try_ensure(requirement, ignore_errors),
+                unique_requirements.values())
+        finally:
+            pool.close()
+            pool.join()
+
+    def try_ensure(self, requirement, ignore_errors):
+        try:
+            self.ensure(requirement, ignore_errors)
+        except Exception as e:
+            log.info('failed to install requirement %s up front: %s', requirement, e)
+
+    def unique_key(self, requirement):
+        return self.requirement_key(requirement) or serialize(requirement)
+
+    def requirement_key(self, requirement):
+        return self.resolution(requirement)[0]
+
+    def resolution(self, requirement):
+        # resolving versions may involve remote lookups, thus done once and
+        # outside of the lock, thus others are resolved meanwhile
+        serialized_requirement = serialize(requirement)
+
+        with self.state_lock:
+            if serialized_requirement in self.resolutions:
+                return self.resolutions[serialized_requirement]
+
+        resolution = self.resolve(requirement)
+
+        with self.state_lock:
+            return self.resolutions.setdefault(serialized_requirement, resolution)
+
+    def resolve(self, requirement):
+        if self.mirror is not None:
+            return self.mirror.resolve_requirement(requirement)
+
+        return resolve_requirement(requirement)
+
+    def find(self, requirement):
+        # roles path of the entry a requirement is installed in already, None
+        # unless installed, neither installing nor verifying it
+        key = self.requirement_key(requirement)
+
+        if key is not None and self.store_path.join(key, 'entry.json').check(file=True):
+            return self.store_path.join(key, 'roles')
+
+    def lock(self, requirement, key, resolved_version, dependencies=None):
+        # uses a resolution recorded earlier instead of resolving again, the
+        # dependencies installed along are pinned to their recorded versions
+        with self.state_lock:
+            self.resolutions.setdefault(serialize(requirement), (key, resolved_version))
+
+            if key is not None and dependencies:
+                self.locked_dependencies.setdefault(key, dependencies)
+
+    def locked_resolution(self, requirement):
+        # resolution of a requirement along with the pinned dependencies
+        # installed together with it, as recorded by lockfiles
+        key, resolved_version = self.resolution(requirement)
+        entry_info = read_entry_info(self.store_path.join(key)) if key else None
+
+        return key, resolved_version, (entry_info or {}).get('dependencies') or []
+
+    def ensure(self, requirement, ignore_errors=False):
+        key = self.requirement_key(requirement)
+
+        if key is None:
+            return self.ensure_volatile(requirement, ignore_errors)
+
+        entry_path = self.store_path.join(key)
+
+        with self.entry_lock(key):
+            if not self.is_in_use(key, entry_path) and not self.use_entry(
+                    key, requirement, entry_path, ignore_errors):
+                return None
+
+        entry_path.join('entry.json').setmtime()
+
+        return entry_path.join('roles')
+
+    def entry_lock(self, key):
+        with self.state_lock:
+            return self.entry_locks.setdefault(key, threading.Lock())
+
+    def is_in_use(self, key, entry_path):
+        # entries vanishing within a session are installed again
+        with self.state_lock:
+            is_used = key in self.used_keys
+
+        if is_used and not entry_path.join('entry.json').check(file=True):
+            log.info('role store entry %s vanished ... reinstalling', entry_path)
+            self.mark_used(key, False)
+            return False
+
+        return is_used
+
+    def mark_used(self, key, is_used):
+        with self.state_lock:
+            if is_used:
+                self.used_keys.add(key)
+            else:
+                self.used_keys.discard(key)
+
+    def use_entry(self, key, requirement, entry_path, ignore_errors):
+        # marked as used and leased up front, thus not evicted by concurrent
+        # installs, neither of this session nor of others
+        self.mark_used(key, True)
+        self.lease(key)
+        is_available = False
+
+        try:
+            is_available = self.is_intact(entry_path) or self.install_and_evict(
+                requirement, entry_path, ignore_errors)
+        finally:
+            self.mark_used(key, is_available)
+
+        return is_available
+
+    def lease(self, key):
+        with self.state_lock:
+            lease = self.leases.get(key)
+
+            if lease is None:
+                lease = self.leases[key] = Lease(self.lease_path(key))
+
+        # leases already held are kept as they are
+        lease.acquire()
+
+    def lease_path(self, key):
+        return self.store_path.join(key + '.lease')
+
+    def install_and_evict(self, requirement, entry_path, ignore_errors):
+        is_installed = self.install_entry(requirement, entry_path, ignore_errors)
+
+        if is_installed:
+            self.evict()
+
+        return is_installed
+
+    def ensure_volatile(self, requirement, ignore_errors):
+        with self.state_lock:
+            if self.volatile_store_path is None:
+                self.volatile_store_path = py.path.local.mkdtemp()
+
+        key = hashlib.sha1(serialize(requirement).encode('utf-8')).hexdigest()
+        entry_path = self.volatile_store_path.join(key)
+
+        with self.entry_lock(key):
+            if entry_path.check(dir=True) or self.install_entry(
+                    requirement, entry_path, ignore_errors):
+                return entry_path.join('roles')
+
+    def is_intact(self, entry_path):
+        if not entry_path.check(dir=True):
+            return False
+
+        entry_info = read_entry_info(entry_path)
+
+        if entry_info is not None and \
+                tree_digest(entry_path.join('roles'))[0] == entry_info.get('digest'):
+            return True
+
+        log.info('role store entry %s is corrupted or has been modified ... reinstalling',
+                 entry_path)
+        entry_path.remove(ignore_errors=True)
+        return False
+
+    def install_entry(self, requirement, entry_path, ignore_errors):
+        # installed into a temporary directory within the store, thus entries
+        # appear atomically even when sessions install them concurrently
+        entry_path.dirpath().ensure(dir=True)
+        temp_path = py.path.local.mkdtemp(rootdir=entry_path.dirpath())
+
+        try:
+            return self.install_temp_entry(requirement, temp_path, entry_path, ignore_errors)
+        finally:
+            if temp_path.check():
+                temp_path.remove(ignore_errors=True)
+
+    def install_temp_entry(self, requirement, temp_path, entry_path, ignore_errors):
+        roles_path = temp_path.ensure('roles', dir=True)
+        dependencies = self.install_roles(requirement, temp_path, ignore_errors)
+
+        # downloaded archives are not kept within entries
+        if temp_path.join('archive.tar.gz').check():
+            temp_path.join('archive.tar.gz').remove()
+
+        # requirements failing to install are ignored when asked to
+        if not roles_path.listdir():
+            return False
+
+        digest, size = tree_digest(roles_path)
+        temp_path.join('entry.json').write(json.dumps(dict(
+            requirement=requirement, digest=digest, size=size, dependencies=dependencies),
+            default=str))
+
+        try:
+            temp_path.rename(entry_path)
+        except EnvironmentError:
+            log.info('role store entry %s installed concurrently', entry_path)
+
+        return True
+
+    def install_roles(self, requirement, temp_path, ignore_errors):
+        # returns the pinned dependencies installed along with the requirement
+        key, resolved_version = self.resolution(requirement)
+        roles_path = temp_path.join('roles')
+
+        if self.mirror is not None:
+            self.mirror.install_requirement(requirement, roles_path, ignore_errors, key)
+            return []
+
+        try:
+            installed_requirement = source_requirement(
+                requirement, resolved_version, temp_path.join('archive.tar.gz'))
+        except galaxy.RoleInstallError as e:
+            if not ignore_errors:
+                raise
+            log.info('%s ... ignoring', e)
+            return []
+
+        return galaxy.install_roles(
+            [installed_requirement], roles_path, ignore_errors, self.dependency_pinner(key))
+
+    def locked_dependencies_of(self, key):
+        with self.state_lock:
+            return list(self.locked_dependencies.get(key) or [])
+
+    def dependency_pinner(self, key):
+        # dependencies are pinned to their locked versions, otherwise to the
+        # versions they currently resolve to
+        locked_dependencies = dict(
+            (parse_requirement(dependency)['name'], dependency)
+            for dependency in self.locked_dependencies_of(key))
+
+        def pin_dependency(dependency):
+            name = parse_requirement(dependency)['name']
+
+            if name in locked_dependencies:
+                return locked_dependencies[name]
+
+            return pinned_requirement(dependency, self.resolution(dependency)[1])
+
+        return pin_dependency
+
+    def entries(self):
+        for entry_path in self.store_path.listdir(lambda path: path.check(dir=True)):
+            entry_info = read_entry_info(entry_path)
+
+            if entry_info is not None:
+                yield entry_path.join('entry.json').mtime(), entry_path, entry_info['size']
+
+    def evict(self):
+        if self.budget is not None:
+            self.evict_exceeding()
+
+    def evict_exceeding(self):
+        entries = sorted(self.entries())
+        total_size = sum(size for _, _, size in entries)
+
+        for _, entry_path, size in entries:
+            if total_size <= self.budget:
+                break
+
+            if self.evict_entry(entry_path):
+                total_size -= size
+
+    def evict_entry(self, entry_path):
+        # entries leased by any session, including the current one, are kept
+        lease = Lease(self.lease_path(entry_path.basename))
+
+        if not lease.acquire(fcntl.LOCK_EX | fcntl.LOCK_NB):
+            return False
+
+        try:
+            log.info('evicting role store entry %s', entry_path)
+            entry_path.remove(ignore_errors=True)
+            lease.path.remove(ignore_errors=True)
+        finally:
+            lease.release()
+
+        return True
+
+    def release(self):
+        with self.state_lock:
+            for lease in self.leases.values():
+                lease.release()
+
+            self.leases.clear()
+            self.used_keys.clear()
+
+        if self.volatile_store_path is not None:
+            self.volatile_store_path.remove(ignore_errors=True)
+            self.volatile_store_path = None
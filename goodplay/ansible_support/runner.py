@@ -4,10 +4,14 @@
 from __future__ import (absolute_import, division, print_function)
 
 import logging
-import json
+import signal
+import threading
 
+from ansible.module_utils.six.moves import queue
 import py.path
 
+from .event_channel import EventChannel
+from .output import OutputSpool
 from ..utils.subprocess import run
 
 log = logging.getLogger(__name__)
@@ -18,11 +22,24 @@ class PlaybookRunner(object):
         self.ctx = ctx
 
         self.process = None
+        self.event_channel = None
+        self.event_pump = None
         self.skip_wait = False
+        self.is_stopped = False
         self.failures = []
         self.all_test_tasks_skipped = True
+        self.test_task_outcomes = {}
+        self.output = OutputSpool(
+            ctx.output_spool_path, self.max_report_lines,
+            log_lines=ctx.config.getoption('verbose') > 0)
 
-    def run_async(self):
+    command = 'ansible-playbook -i {0} {1}'
+    max_report_lines = 1000
+
+    def command_args(self):
+        return self.ctx.extended_inventory_path, self.ctx.playbook_path
+
+    def run_env(self):
         this_path = py.path.local(__file__)
         callback_plugin_path = this_path.dirpath('callback_plugin')
         connection_plugin_path = this_path.dirpath('connection_plugin')
@@ -33,49 +50,81 @@ class PlaybookRunner(object):
             ANSIBLE_CALLBACK_PLUGINS=callback_plugin_path.strpath,
             ANSIBLE_CALLBACK_WHITELIST='goodplay',
             ANSIBLE_CONNECTION_PLUGINS=connection_plugin_path.strpath,
+            GOODPLAY_FOOTPRINT_PATH=self.ctx.footprint_path.strpath,
+            GOODPLAY_EVENT_SOCKET=self.ctx.event_socket_path.strpath,
+            ANSIBLE_VERBOSITY=str(self.ctx.config.getoption('ansible_verbosity')),
         )
         env.update(additional_env)
 
-        self.process = run(
-            'ansible-playbook -vvv -i {0} {1}',
-            self.ctx.extended_inventory_path, self.ctx.playbook_path,
-            env=env, async_=True)
+        return env
+
+    def prepare_run(self):
+        # reset footprint recorded when running within another environment
+        self.ctx.footprint_path.write('')
 
-        # wait for subprocess to be responsive
-        self.process.wait_events()
+    def run_async(self):
+        self.prepare_run()
+        self.event_channel = EventChannel(self.ctx.event_socket_path)
+
+        # the run gets its own process group, thus it can be terminated
+        # along with Ansible's workers
+        self.process = run(self.command, *self.command_args(), env=self.run_env(), async_=True,
+                           new_session=True)
+
+        self.event_pump = EventPump(self.process, self.event_channel, self.output)
 
     def wait(self):
-        self.wait_for_event()
+        try:
+            self.wait_for_event()
+            self.event_pump.join()
+        finally:
+            self.event_channel.close()
+
+        self.check_all_test_tasks_skipped()
 
-        for line in self.process.stdout:
-            log.info(line[:-1])
+    def stop(self):
+        # terminates the run before it finished, e.g. once pytest stops
+        # running tests, while events and output are received until it exited
+        self.is_stopped = True
+        self.terminate()
 
-        self.process.wait()
+    def terminate(self):
+        self.process.signal_group(signal.SIGTERM)
 
+        try:
+            self.event_pump.join()
+        finally:
+            self.event_channel.close()
+
+    def not_run_test_tasks(self, test_tasks):
+        return [task for task in test_tasks if task.name not in self.test_task_outcomes]
+
+    def check_all_test_tasks_skipped(self):
         if self.all_test_tasks_skipped:
             self.failures.append('all test tasks have been skipped')
 
+    def footprint_paths(self):
+        return set(py.path.local(path) for path in self.ctx.footprint_path.read().splitlines())
+
     def wait_for_event(self, event_name=None, **kwargs):
         for event in self.receive_events():
-            if event['event_name'] == event_name \
-                    and set(kwargs.items()).issubset(set(event['data'].items())):
-                return event
-            elif event['event_name'] == 'error':
-                error_message = event['data']['message']
-                self.failures.append(error_message)
-                self.skip_wait = True
-                return
-            else:  # pragma: no cover
-                raise Exception('found unexpected goodplay event: {0!r}'.format(event))
+            return self.handle_event(event, event_name, kwargs)
+
+    def handle_event(self, event, event_name, kwargs):
+        # returns the event when it is the one waited for, None on errors
+        if event['event_name'] == event_name \
+                and set(kwargs.items()).issubset(set(event['data'].items())):
+            return event
+        elif event['event_name'] == 'error':
+            error_message = event['data']['message']
+            self.failures.append(error_message)
+            self.skip_wait = True
+            return
+        else:  # pragma: no cover
+            raise Exception('found unexpected goodplay event: {0!r}'.format(event))
 
     def receive_events(self):
-        event_line_prefix = 'GOODPLAY => '
-        for line in self.process.stdout:
-            log.info(line[:-1])
-
-            if line.startswith(event_line_prefix):
-                event = json.loads(line[len(event_line_prefix):])
-                yield event
+        return self.event_pump.events()
 
     def wait_for_test_task(self, task):
         if self.skip_wait:
@@ -87,10 +136,74 @@ class PlaybookRunner(object):
         if self.skip_wait:
             return
 
-        event = self.wait_for_event('test-task-end', name=task.name)
+        return self.test_task_outcome(task, self.wait_for_event('test-task-end', name=task.name))
+
+    def test_task_outcome(self, task, event):
         outcome = event['data']['outcome'] if event else 'skipped'
+        self.test_task_outcomes[task.name] = outcome
 
         if outcome != 'skipped':
             self.all_test_tasks_skipped = False
 
         return outcome
+
+
+class EventPump(object):
+    # receives events and output of a playbook run within a background
+    # thread, thus ansible-playbook never blocks on its event socket or pipes
+    # while pytest is busy elsewhere, e.g. reporting
+    def __init__(self, process, event_channel, output, max_queued_events=1024):
+        self.process = process
+        self.event_channel = event_channel
+        self.output = output
+        self.queue = queue.Queue(max_queued_events)
+        self.is_finished = False
+
+        self.thread = threading.Thread(target=self.pump)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def pump(self):
+        # the last item queued is None, preceded by the exception raised if any
+        try:
+            for event in self.event_channel.receive_events(self.wait_readable):
+                self.spool_available_output()
+                self.output.add_event(event)
+                self.queue.put(event)
+
+            self.process.wait(on_output=self.spool_available_output)
+        except Exception as e:
+            self.queue.put(e)
+        finally:
+            self.queue.put(None)
+
+    def wait_readable(self, fileobj):
+        # output is spooled as soon as it is read, thus it is never buffered
+        # in memory until the next event, e.g. during long non-test tasks
+        return self.process.wait_readable(fileobj, on_output=self.spool_available_output)
+
+    def spool_available_output(self):
+        # ordinary output is only spooled as far as it is available, events
+        # are never waited for on it
+        for stream in (self.process.stdout, self.process.stderr):
+            for line in stream.available_lines():
+                self.output.add(line.rstrip('\n'))
+
+    def events(self):
+        while not self.is_finished:
+            item = self.queue.get()
+
+            if isinstance(item, Exception):
+                raise item
+
+            if item is None:
+                self.is_finished = True
+            else:
+                yield item
+
+    def join(self):
+        # skips events not received so far
+        for _ in self.events():
+            pass
+
+        self.thread.join()
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+
+import hashlib
+import json
+import logging
+
+import ansible
+
+import goodplay
+from .lockfile import is_lockfile
+
+log = logging.getLogger(__name__)
+
+
+class TasksCache(object):
+    def __init__(self, cache_dir_path):
+        self.cache_dir_path = cache_dir_path
+
+    def get(self, key):
+        cache_path = self.cache_dir_path.join('{0}.json'.format(key))
+
+        try:
+            serialized_tasks = json.loads(cache_path.read())
+        except (EnvironmentError, ValueError):
+            return None
+
+        log.debug('task listing cache hit %s', key)
+
+        return serialized_tasks
+
+    def set(self, key, serialized_tasks):
+        cache_path = self.cache_dir_path.join('{0}.json'.format(key))
+        cache_path.write(json.dumps(serialized_tasks))
+
+
+class TreeDigests(object):
+    # digests of directory trees computed once per test session, as
+    # playbooks sharing a directory share its digest
+    def __init__(self):
+        self.digests = {}
+
+    def digest(self, root_path):
+        if root_path.strpath not in self.digests:
+            self.digests[root_path.strpath] = tree_digest(root_path)
+
+        return self.digests[root_path.strpath]
+
+
+def tasks_cache_key(playbook_path, root_paths, use_local_roles=False, tree_digests=None):
+    tree_digests = tree_digests or TreeDigests()
+
+    digest = hashlib.sha1()
+    digest_update(digest, goodplay.__version__, ansible.__version__, str(use_local_roles))
+
+    # playbooks sharing a directory share root paths, thus are distinguished
+    # by their path relative to the first root path
+    digest_update(digest, playbook_path.relto(root_paths[0]) or playbook_path.strpath)
+
+    for root_path in root_paths:
+        digest_update(digest, root_path.basename, tree_digests.digest(root_path))
+
+    return digest.hexdigest()
+
+
+def tree_digest(root_path):
+    digest = hashlib.sha1()
+
+    for path in fingerprinted_paths(root_path):
+        digest_update(digest, path.relto(root_path))
+        digest.update(path.read_binary())
+
+    return digest.hexdigest()
+
+
+def fingerprinted_paths(root_path):
+    if not root_path.check(dir=True):
+        return [root_path] if root_path.check(file=True) else []
+
+    return root_path.visit(fil=is_fingerprinted_file, rec=is_fingerprinted_dir, sort=True)
+
+
+def is_fingerprinted_dir(path):
+    return not path.basename.startswith('.')
+
+
+def is_fingerprinted_file(path):
+    return not path.basename.startswith('.') and not is_lockfile(path) and path.check(file=True)
+
+
+def digest_update(digest, *values):
+    for value in values:
+        digest.update(value.encode('utf-8'))
+        digest.update(b'\0')
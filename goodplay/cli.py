@@ -3,22 +3,44 @@
 # Make coding more python3-ish
 from __future__ import (absolute_import, division, print_function)
 
+import sys
+
 import pytest
 
 from goodplay.ansible_support import is_test_playbook_file
+from goodplay.deps import deps_command
+from goodplay.listing import list_test_playbooks
+from goodplay.session import goodplay_session
+from goodplay.watch import watch
 
 
 class CollectOnlyTestPlaybooks(object):
     def pytest_ignore_collect(self, path, config):
-        # do not ignore directories
-        if path.check(dir=True):
-            return False
+        session = goodplay_session(config)
+        is_dir = path.check(dir=True)
+
+        # pruned directories are skipped including their whole subtree
+        if session.is_pruned(path, is_dir):
+            return True
+
+        # leave remaining directories to pytest's own ignore rules
+        if is_dir:
+            return None
 
         # ignore everything else that is not a test playbook
-        return not is_test_playbook_file(path)
+        return not is_test_playbook_file(path, session.yaml_cache)
 
 
 def main():
+    if sys.argv[1:2] == ['list']:
+        raise SystemExit(list_test_playbooks(sys.argv[2:]))
+
+    if sys.argv[1:2] == ['deps']:
+        raise SystemExit(deps_command(sys.argv[2:]))
+
     additional_plugins = [CollectOnlyTestPlaybooks()]
 
+    if '--watch' in sys.argv[1:]:
+        raise SystemExit(watch(sys.argv[1:], additional_plugins))
+
     raise SystemExit(pytest.main(plugins=additional_plugins))
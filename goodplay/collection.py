@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+
+import logging
+import multiprocessing
+
+import py.path
+
+from goodplay import ansible_support
+from goodplay.ansible_support.tasks_cache import TasksCache
+from goodplay.context import GoodplayContext
+from goodplay.session import GoodplaySession, goodplay_session
+
+log = logging.getLogger(__name__)
+
+
+def prefetch_playbooks(config, workers):
+    if workers == 0:
+        workers = multiprocessing.cpu_count()
+
+    options = dict(vars(config.option))
+    tasks_cache_path = tasks_cache_path_for_config(config)
+    prefetch_args = [(path, options, tasks_cache_path) for path in candidate_paths(config)]
+
+    log.info('prefetching %d potential test playbooks using %d processes',
+             len(prefetch_args), workers)
+
+    pool = multiprocessing.Pool(
+        workers, initializer=init_worker, initargs=(goodplay_session(config).fs_index, options))
+    try:
+        prefetched_playbooks = pool.map(prefetch_playbook, prefetch_args, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+    return dict((prefetched.playbook_path, prefetched) for prefetched in prefetched_playbooks)
+
+
+def prefetched_playbook(config, playbook_path):
+    prefetched_playbooks = goodplay_session(config).prefetched_playbooks
+
+    return prefetched_playbooks.get(playbook_path) or PrefetchedPlaybook(playbook_path)
+
+
+def tasks_cache_path_for_config(config):
+    cache = getattr(config, 'cache', None)
+
+    if cache is not None:
+        return cache.makedir('goodplay-tasks')
+
+
+def candidate_paths(config):
+    session = goodplay_session(config)
+
+    for arg_path in session.arg_paths:
+        if arg_path.check(dir=True):
+            for path in session.fs_index.visit_files(arg_path, 'test_*.yml'):
+                yield path
+        elif arg_path.check(file=True):
+            yield arg_path
+
+
+worker_session = None
+
+
+def init_worker(fs_index, options):
+    # workers use the role store and role mirror configured by the options,
+    # as roles kept in the role store are part of task listings and their
+    # cache keys
+    global worker_session
+
+    worker_session = GoodplaySession()
+    worker_session.config = OptionsConfig(options, worker_session)
+    worker_session.fs_index = fs_index
+
+
+def prefetch_playbook(prefetch_args):
+    playbook_path, options, tasks_cache_path = prefetch_args
+    prefetched = PrefetchedPlaybook(playbook_path)
+
+    try:
+        prefetched.fetch(OptionsConfig(options, worker_session), tasks_cache_path)
+    except Exception:
+        # the failing step is repeated during regular collection, which
+        # reports the error on the appropriate collector
+        log.warning('prefetching %s failed ... collecting it without prefetching',
+                    playbook_path, exc_info=True)
+
+    return prefetched
+
+
+class OptionsConfig(object):
+    # stands in for the pytest config within prefetch worker processes,
+    # providing the values of all command-line options
+    def __init__(self, options, session):
+        self.options = options
+        self._goodplay_session = session
+
+    def getoption(self, name):
+        return self.options[name]
+
+
+class PrefetchedPlaybook(object):
+    def __init__(self, playbook_path):
+        self.playbook_path = playbook_path
+        self.is_test_playbook = None
+        self.ctx_values = {}
+
+    def fetch(self, config, tasks_cache_path):
+        self.is_test_playbook = ansible_support.is_test_playbook_file(
+            self.playbook_path, goodplay_session(config).yaml_cache)
+
+        if self.is_test_playbook:
+            ctx = GoodplayContext(playbook_path=self.playbook_path, config=config)
+            ctx.tasks_cache = tasks_cache_path and TasksCache(py.path.local(tasks_cache_path))
+
+            try:
+                self.fetch_ctx_values(ctx)
+            finally:
+                ctx.release()
+
+    def fetch_ctx_values(self, ctx):
+        self.ctx_values['inventory_path'] = ctx.inventory_path
+
+        if ctx.inventory_path:
+            self.ctx_values['environment_names'] = ctx.environment_names
+            self.ctx_values['test_tasks'] = ctx.test_tasks
+
+    def apply(self, ctx):
+        for name, value in self.ctx_values.items():
+            setattr(ctx, name, value)
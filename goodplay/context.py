@@ -6,10 +6,13 @@ from __future__ import (absolute_import, division, print_function)
 import hashlib
 import uuid
 
+import ansible.constants
 from cached_property import cached_property
 import py.path
 
-from goodplay import ansible_support
+from goodplay import ansible_support, depgraph, docker_support
+from goodplay.ansible_support.tasks_cache import TasksCache, tasks_cache_key
+from goodplay.session import goodplay_session
 
 
 class GoodplayContext(object):
@@ -24,11 +27,15 @@ class GoodplayContext(object):
         self._temp_dir_paths.append(temp_path)
         return temp_path
 
+    @cached_property
+    def session(self):
+        return goodplay_session(self.config)
+
     @cached_property
     def inventory_path(self):
         inventory_path = self.playbook_path.dirpath('inventory')
 
-        if inventory_path.check():
+        if self.session.fs_index.exists(inventory_path):
             return inventory_path
 
     @cached_property
@@ -42,15 +49,15 @@ class GoodplayContext(object):
 
         extended_inventory_path.join('inventory').mksymlinkto(self.inventory_path)
 
-        if self.inventory_path.check(dir=True):
+        if self.session.fs_index.isdir(self.inventory_path):
             group_vars_path = self.inventory_path.join('group_vars')
 
-            if group_vars_path.check(dir=True):
+            if self.session.fs_index.isdir(group_vars_path):
                 extended_inventory_path.join('group_vars').mksymlinkto(group_vars_path)
 
             host_vars_path = self.inventory_path.join('host_vars')
 
-            if host_vars_path.check(dir=True):
+            if self.session.fs_index.isdir(host_vars_path):
                 extended_inventory_path.join('host_vars').mksymlinkto(host_vars_path)
 
         # when inventory_path is a file, group_vars and host_vars directories
@@ -67,6 +74,15 @@ class GoodplayContext(object):
         if self.inventory_path:
             return ansible_support.Playbook(self)
 
+    @cached_property
+    def test_tasks(self):
+        return self.playbook.test_tasks
+
+    @cached_property
+    def environment_names(self):
+        return docker_support.environment_names_for_playbook_path(
+            self.playbook_path, self.session.fs_index)
+
     @cached_property
     def is_role_playbook(self):
         return bool(self.role_path)
@@ -76,7 +92,7 @@ class GoodplayContext(object):
         for ancestor_path in self.playbook_path.parts(reverse=True)[1:]:
             if ancestor_path.basename == 'tests':
                 role_path = ancestor_path.dirpath()
-                is_role_path = role_path.join('meta', 'main.yml').check(file=True)
+                is_role_path = self.session.fs_index.isfile(role_path.join('meta', 'main.yml'))
 
                 if is_role_path:
                     return role_path
@@ -92,12 +108,97 @@ class GoodplayContext(object):
 
     @cached_property
     def installed_roles_path(self):
+        # warm sessions keep installed roles across test runs, keyed by the
+        # requirements they have been installed from
+        if self.session.warm_roles_path is not None:
+            return self.session.warm_roles_path.ensure(
+                self.playbook.dependencies_digest(), dir=True)
+
+        return self._create_temp_dir_path()
+
+    @cached_property
+    def placeholder_roles_path(self):
         return self._create_temp_dir_path()
 
+    @cached_property
+    def footprint_path(self):
+        return self._create_temp_dir_path().join('footprint')
+
+    @cached_property
+    def event_socket_path(self):
+        return self._create_temp_dir_path().join('events.sock')
+
+    @cached_property
+    def output_spool_path(self):
+        return self._create_temp_dir_path().join('output.gz')
+
     @cached_property
     def use_local_roles(self):
         return self.config.getoption('use_local_roles')
 
+    @cached_property
+    def tasks_cache(self):
+        cache = getattr(self.config, 'cache', None)
+
+        if cache is not None:
+            return TasksCache(cache.makedir('goodplay-tasks'))
+
+    @cached_property
+    def input_root_paths(self):
+        root_paths = [self.role_path or self.playbook_dir_path]
+
+        if self.use_local_roles:
+            root_paths.extend(
+                py.path.local(path) for path in ansible.constants.DEFAULT_ROLES_PATH)
+
+        return root_paths
+
+    @cached_property
+    def dependency_paths(self):
+        return depgraph.PlaybookDependencies(self).resolve()
+
+    @cached_property
+    def recorded_dependency_paths(self):
+        # footprints recorded when running within each environment the last
+        # time, None when any of them is unknown
+        impact_map = self.session.impact_map
+        environment_names = self.environment_names or [None]
+        footprints = [impact_map and impact_map.footprint(self.playbook_path, environment_name)
+                      for environment_name in environment_names]
+
+        if None not in footprints:
+            base_paths = depgraph.PlaybookDependencies(self).resolve_base()
+            return base_paths.union([self.playbook_path], *footprints)
+
+    def is_affected_by(self, changed_paths):
+        impact_analysis = self.config.getoption('impact_analysis')
+
+        if impact_analysis != 'static':
+            recorded_dependency_paths = self.recorded_dependency_paths
+
+            if recorded_dependency_paths is None or depgraph.is_affected_by(
+                    recorded_dependency_paths, changed_paths):
+                return True
+
+            if impact_analysis == 'recorded':
+                return False
+
+        return depgraph.is_affected_by(self.dependency_paths, changed_paths)
+
+    @cached_property
+    def tasks_cache_key(self):
+        root_paths = list(self.input_root_paths)
+
+        # tasks of installed dependencies are discovered instead of those of
+        # their placeholders
+        if self.playbook.dependencies_installed:
+            root_paths.append(self.installed_roles_path)
+        else:
+            root_paths.extend(self.playbook.stored_roles_paths)
+
+        return tasks_cache_key(
+            self.playbook_path, root_paths, self.use_local_roles, self.session.tree_digests)
+
     def compose_project_name(self, environment_name):
         node_id = '{:x}'.format(uuid.getnode())
         project_name_parts = ':'.join((node_id, self.playbook_path.strpath, environment_name))
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+
+import ansible.constants
+from ansible.module_utils.six import string_types
+import py.path
+import yaml
+
+from goodplay import docker_support
+
+playbook_include_keys = ('include', 'import_playbook')
+play_tasks_keys = ('pre_tasks', 'tasks', 'post_tasks', 'handlers')
+block_keys = ('block', 'rescue', 'always')
+tasks_include_keys = ('include', 'include_tasks', 'import_tasks')
+role_include_keys = ('include_role', 'import_role')
+
+# directories Ansible implicitly looks up beside a playbook
+playbook_dir_names = (
+    'group_vars', 'host_vars', 'vars', 'files', 'templates', 'library', 'module_utils',
+    'action_plugins', 'callback_plugins', 'filter_plugins', 'lookup_plugins')
+
+
+def is_affected_by(dependency_paths, changed_paths):
+    return any(
+        changed_path == dependency_path or changed_path.relto(dependency_path)
+        for dependency_path in dependency_paths
+        for changed_path in changed_paths)
+
+
+class PlaybookDependencies(object):
+    # statically resolves the files and directories a test playbook depends
+    # on, references that cannot be resolved statically (e.g. templated
+    # ones) make the whole directory of the referencing file a dependency
+    def __init__(self, ctx):
+        self.ctx = ctx
+        self.yaml_cache = ctx.session.yaml_cache
+        self.fs_index = ctx.session.fs_index
+
+        self.paths = set()
+
+    def resolve(self):
+        self.resolve_base()
+
+        if self.ctx.role_path:
+            self.visit_role(self.ctx.role_path)
+
+        self.visit_playbook(self.ctx.playbook_path)
+
+        return self.paths
+
+    def resolve_base(self):
+        # dependencies besides the test playbook and files referenced by it
+        for dir_name in playbook_dir_names + ('requirements.yml',):
+            self.add_existing_path(self.ctx.playbook_dir_path.join(dir_name))
+
+        if self.ctx.inventory_path:
+            self.paths.add(self.ctx.inventory_path)
+
+        self.paths.update(docker_support.config_paths_for_playbook_path(
+            self.ctx.playbook_path, self.fs_index))
+
+        return self.paths
+
+    def add_existing_path(self, path):
+        if self.fs_index.exists(path):
+            self.paths.add(path)
+
+    def visit(self, path):
+        is_visited = path in self.paths
+        self.paths.add(path)
+
+        return not is_visited
+
+    def load(self, path):
+        try:
+            return self.yaml_cache.load(path)
+        except (EnvironmentError, yaml.YAMLError):
+            self.paths.add(path.dirpath())
+
+    def load_list(self, path):
+        content = self.load(path)
+
+        if isinstance(content, list):
+            return [item for item in content if isinstance(item, dict)]
+
+        return []
+
+    def visit_reference(self, reference, base_path, visit_func):
+        path = reference_path(reference)
+
+        if path is None:
+            self.paths.add(base_path)
+        else:
+            visit_func(base_path.join(path, abs=True))
+
+    def visit_playbook(self, playbook_path):
+        if self.visit(playbook_path):
+            for play in self.load_list(playbook_path):
+                self.visit_play(play, playbook_path.dirpath())
+
+    def visit_play(self, play, base_path):
+        for reference in present_values(play, playbook_include_keys):
+            self.visit_reference(reference, base_path, self.visit_playbook)
+
+        for role in as_list(play.get('roles')):
+            self.visit_role_reference(role, base_path)
+
+        for vars_file in flatten(as_list(play.get('vars_files'))):
+            self.visit_reference(vars_file, base_path, self.paths.add)
+
+        for key in play_tasks_keys:
+            self.visit_tasks(play.get(key), base_path)
+
+    def visit_tasks_file(self, tasks_path):
+        if self.visit(tasks_path):
+            self.visit_tasks(self.load_list(tasks_path), tasks_path.dirpath())
+
+    def visit_tasks(self, tasks, base_path):
+        for task in as_list(tasks):
+            if isinstance(task, dict):
+                self.visit_task(task, base_path)
+
+    def visit_task(self, task, base_path):
+        for key in block_keys:
+            self.visit_tasks(task.get(key), base_path)
+
+        for reference in present_values(task, tasks_include_keys):
+            self.visit_reference(reference, base_path, self.visit_tasks_file)
+
+        for role in present_values(task, role_include_keys):
+            self.visit_role_reference(role, base_path)
+
+    def visit_role_reference(self, role, base_path):
+        role_name = role_reference_name(role)
+
+        # roles referenced by source only are installed from their requirements
+        if role_name is None:
+            return
+
+        if is_templated(role_name):
+            self.paths.add(base_path)
+            return
+
+        role_path = self.find_role_path(role_name, base_path)
+
+        # roles not available locally are installed from requirements files,
+        # which already are dependencies
+        if role_path:
+            self.visit_role(role_path)
+
+    def find_role_path(self, role_name, base_path):
+        candidate_paths = [base_path.join('roles', role_name), base_path.join(role_name, abs=True)]
+        candidate_paths.extend(
+            roles_path.join(role_name) for roles_path in self.roles_search_paths())
+
+        for candidate_path in candidate_paths:
+            if self.fs_index.isdir(candidate_path):
+                return candidate_path
+
+    def roles_search_paths(self):
+        roles_search_paths = []
+
+        if self.ctx.role_path:
+            roles_search_paths.append(self.ctx.role_path.dirpath())
+
+        if self.ctx.use_local_roles:
+            roles_search_paths.extend(
+                py.path.local(path) for path in ansible.constants.DEFAULT_ROLES_PATH)
+
+        return roles_search_paths
+
+    def visit_role(self, role_path):
+        if not self.visit(role_path):
+            return
+
+        for dependency in self.role_dependencies(role_path):
+            self.visit_role_reference(dependency, role_path.dirpath())
+
+        for tasks_path in self.role_tasks_paths(role_path):
+            self.visit_tasks(self.load_list(tasks_path), tasks_path.dirpath())
+
+    def role_tasks_paths(self, role_path):
+        for dir_name in ('tasks', 'handlers'):
+            tasks_dir_path = role_path.join(dir_name)
+
+            if self.fs_index.isdir(tasks_dir_path):
+                for tasks_path in self.fs_index.listdir(tasks_dir_path, is_yaml_file):
+                    yield tasks_path
+
+    def role_dependencies(self, role_path):
+        role_meta_path = role_path.join('meta', 'main.yml')
+
+        if self.fs_index.isfile(role_meta_path):
+            role_meta_content = self.load(role_meta_path)
+
+            if isinstance(role_meta_content, dict):
+                return as_list(role_meta_content.get('dependencies'))
+
+        return []
+
+
+def reference_path(reference):
+    if isinstance(reference, dict):
+        reference = reference.get('file') or reference.get('_raw_params')
+
+    if is_non_empty_string(reference):
+        # old style includes may pass parameters, e.g. include: tasks.yml x=1
+        path = reference.split()[0]
+
+        if not is_templated(path):
+            return path
+
+
+def role_reference_name(role):
+    if isinstance(role, dict):
+        role = role.get('role') or role.get('name')
+
+    if isinstance(role, string_types):
+        return role
+
+
+def is_non_empty_string(value):
+    return isinstance(value, string_types) and bool(value.strip())
+
+
+def is_templated(value):
+    return '{{' in value or '{%' in value
+
+
+def present_values(mapping, keys):
+    return [mapping[key] for key in keys if key in mapping]
+
+
+def is_yaml_file(path):
+    return path.ext == '.yml' and path.check(file=True)
+
+
+def as_list(value):
+    return value if isinstance(value, list) else []
+
+
+def flatten(values):
+    for value in values:
+        for item in (value if isinstance(value, list) else [value]):
+            yield item
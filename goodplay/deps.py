@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+
+import argparse
+import collections
+import logging
+from multiprocessing.pool import ThreadPool
+import sys
+
+import py.path
+
+from goodplay import listing
+from goodplay.ansible_support.role_mirror import RoleMirror
+from goodplay.ansible_support.role_store import parse_requirement, serialize
+from goodplay.context import GoodplayContext
+
+log = logging.getLogger(__name__)
+
+
+def parse_args(argv):
+    # remaining arguments of commands are passed to pytest, e.g. paths or --prune
+    parser = argparse.ArgumentParser(
+        prog='goodplay deps', description='manage role dependencies of test playbooks')
+    subparsers = parser.add_subparsers(dest='command', metavar='COMMAND')
+
+    fetch_parser = subparsers.add_parser(
+        'fetch', help='fill a role mirror with the role dependencies of all test playbooks',
+        epilog='all other arguments, e.g. paths, -c, --rootdir, --prune or --use-local-roles, '
+               'are interpreted by pytest just like when running tests')
+    fetch_parser.add_argument(
+        '--role-mirror', dest='role_mirror', required=True, metavar='DIR',
+        help='role mirror directory to fill')
+    fetch_parser.add_argument(
+        '--fetch-workers', dest='fetch_workers', type=int, default=4, metavar='NUM',
+        help='number of role dependencies fetched in parallel (default: 4)')
+
+    options, pytest_args = parser.parse_known_args(argv)
+
+    if options.command is None:
+        parser.error('a command is required')
+
+    return options, pytest_args
+
+
+def deps_command(argv, stream=None):
+    options, pytest_args = parse_args(argv)
+    stream = stream or sys.stdout
+
+    return listing.run_with_config(
+        pytest_args, lambda config: fetch_dependencies(options, config, stream))
+
+
+def fetch_dependencies(options, config, stream):
+    mirror = RoleMirror(py.path.local(options.role_mirror))
+    requirements = unique_requirements(tree_requirements(config))
+
+    pool = ThreadPool(options.fetch_workers)
+
+    try:
+        results = mirror.fetch_all(requirements, pool)
+    finally:
+        pool.close()
+        pool.join()
+
+    for requirement, status, error in results:
+        write_result(stream, requirement, status, error)
+
+    return 1 if any(error for _, _, error in results) else 0
+
+
+def tree_requirements(config):
+    for prefetched in listing.test_playbooks(config):
+        ctx = GoodplayContext(playbook_path=prefetched.playbook_path, config=config)
+
+        try:
+            for requirement in ctx_requirements(ctx):
+                yield requirement
+        finally:
+            ctx.release()
+
+
+def ctx_requirements(ctx):
+    if ctx.playbook is None:
+        return []
+
+    # requirements files including other ones are not installed from mirrors
+    return ctx.playbook.store_requirements()
+
+
+def unique_requirements(requirements):
+    return list(collections.OrderedDict(
+        (serialize(requirement), requirement) for requirement in requirements).values())
+
+
+def write_result(stream, requirement, status, error):
+    parsed = parse_requirement(requirement)
+    version = '@{0}'.format(parsed['version']) if parsed.get('version') else ''
+    line = u'{0} ({1}{2}): {3}'.format(parsed['name'], parsed['src'], version, status)
+
+    stream.write(line + (u' {0}\n'.format(error) if error else u'\n'))
+    stream.flush()
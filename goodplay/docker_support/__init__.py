@@ -8,9 +8,11 @@ from compose.cli.command import get_project
 from compose.service import BuildError
 from pytest import fail
 
+from goodplay.utils.fsindex import FilesystemIndex
 
-def is_docker_compose_file(path):
-    is_file = path.check(file=True)
+
+def is_docker_compose_file(path, fs_index=None):
+    is_file = (fs_index or FilesystemIndex()).isfile(path)
     uses_docker_compose_naming = (
         path.basename.startswith('docker-compose.') and
         path.basename.endswith('.yml') and
@@ -36,22 +38,24 @@ def config_name_self_and_above(config_name, suffix=None):
     yield '.'.join(prefix + environment_parts + suffix)
 
 
-def environment_names_for_playbook_path(playbook_path):
+def environment_names_for_playbook_path(playbook_path, fs_index=None):
     return [environment_name_for_config_path(config_path)
-            for config_path in config_paths_for_playbook_path(playbook_path)]
+            for config_path in config_paths_for_playbook_path(playbook_path, fs_index)]
 
 
-def config_path_for_environment_name(playbook_path, environment_name):
-    for config_path in config_paths_for_playbook_path(playbook_path):
+def config_path_for_environment_name(playbook_path, environment_name, fs_index=None):
+    for config_path in config_paths_for_playbook_path(playbook_path, fs_index):
         if environment_name_for_config_path(config_path) == environment_name:
             return config_path
 
 
-def config_paths_for_playbook_path(playbook_path):  # noqa: R701
+def config_paths_for_playbook_path(playbook_path, fs_index=None):  # noqa: R701
     base_path = playbook_path.dirpath()
+    fs_index = fs_index or FilesystemIndex()
 
     # get relative config names sorted descending by len
-    config_names = [path.relto(base_path) for path in base_path.listdir(is_docker_compose_file)]
+    config_names = [path.relto(base_path) for path in fs_index.listdir(
+        base_path, lambda path: is_docker_compose_file(path, fs_index))]
     config_names.sort()
     config_names.sort(key=len, reverse=True)
 
@@ -102,7 +106,7 @@ class DockerRunner(object):
     @cached_property
     def project(self):
         config_path = config_path_for_environment_name(
-            self.ctx.playbook_path, self.environment_name)
+            self.ctx.playbook_path, self.environment_name, self.ctx.session.fs_index)
 
         return get_project(
             project_dir=self.ctx.playbook_dir_path.strpath,
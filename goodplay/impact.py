@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+
+import hashlib
+
+import py.path
+
+
+class ImpactMap(object):
+    # footprints of test playbook runs, i.e. the files used while running a
+    # test playbook within an environment, persisted in pytest's cache
+    def __init__(self, cache):
+        self.cache = cache
+
+    def cache_key(self, playbook_path, environment_name):
+        footprint_id = u'{0}::{1}'.format(playbook_path.strpath, environment_name or '')
+        footprint_hash = hashlib.sha1(footprint_id.encode('utf-8')).hexdigest()
+
+        return 'goodplay/footprints/{0}'.format(footprint_hash)
+
+    def record(self, playbook_path, environment_name, footprint_paths):
+        self.cache.set(self.cache_key(playbook_path, environment_name), dict(
+            playbook=playbook_path.strpath,
+            environment=environment_name,
+            paths=sorted(path.strpath for path in footprint_paths)))
+
+    def discard(self, playbook_path, environment_name):
+        self.cache.set(self.cache_key(playbook_path, environment_name), None)
+
+    def footprint(self, playbook_path, environment_name):
+        footprint = self.cache.get(self.cache_key(playbook_path, environment_name), None)
+
+        if footprint is not None:
+            return set(py.path.local(path) for path in footprint['paths'])
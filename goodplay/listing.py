@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+
+import argparse
+import json
+import logging
+import sys
+
+import pytest
+
+from goodplay import ansible_support, collection
+from goodplay.context import GoodplayContext
+from goodplay.session import goodplay_session
+
+
+def parse_args(argv):
+    # remaining arguments are passed to pytest, e.g. paths or --prune
+    parser = argparse.ArgumentParser(
+        prog='goodplay list',
+        description='list test playbooks with their environments and test tasks '
+                    'without collecting them as pytest items',
+        epilog='all other arguments, e.g. paths, -c, --rootdir, --prune, --use-local-roles '
+               'or --collect-workers, are interpreted by pytest just like when running tests')
+    parser.add_argument(
+        '--json', dest='json', action='store_true',
+        help='write one JSON object per test playbook')
+
+    return parser.parse_known_args(argv)
+
+
+def list_test_playbooks(argv, stream=None):
+    stream = stream or sys.stdout
+    options, pytest_args = parse_args(argv)
+
+    return run_with_config(pytest_args, lambda config: write_entries(stream, config, options.json))
+
+
+def run_with_config(args, func):
+    # pytest's own config determines rootdir, ini files and options, while
+    # func takes the place of collecting test items; its result is the exit
+    # status unless pytest fails before, e.g. on usage errors
+    config_plugin = ConfigPlugin(func)
+    exit_code = pytest.main(
+        list(args) + ['--collect-only', '--capture=no', '-p', 'no:terminal'],
+        plugins=[config_plugin])
+
+    return exit_code if config_plugin.exit_code is None else config_plugin.exit_code
+
+
+class ConfigPlugin(object):
+    # goodplay's plugin logs to stdout, which only receives the output of
+    # func, thus its log messages are written to stderr meanwhile
+    def __init__(self, func):
+        self.func = func
+        self.exit_code = None
+        self.stdout_handlers = []
+
+    def pytest_configure(self):
+        self.stdout_handlers = [
+            handler for handler in logging.getLogger('goodplay').handlers
+            if getattr(handler, 'stream', None) is sys.stdout]
+        set_handler_streams(self.stdout_handlers, sys.stderr)
+
+    def pytest_unconfigure(self):
+        set_handler_streams(self.stdout_handlers, sys.stdout)
+
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_collection(self, session):
+        self.exit_code = self.func(session.config)
+
+        # nothing left to collect for pytest
+        return True
+
+
+def set_handler_streams(handlers, stream):
+    for handler in handlers:
+        handler.stream = stream
+
+
+def write_entries(stream, config, as_json):
+    prefetch_playbooks(config, config.getoption('collect_workers'))
+
+    error_count = 0
+    for entry in playbook_entries(config):
+        write_entry(stream, entry, as_json)
+        error_count += 'error' in entry
+
+    return 1 if error_count else 0
+
+
+def prefetch_playbooks(config, workers):
+    # goodplay's plugin usually prefetched them already
+    if workers != 1 and not goodplay_session(config).prefetched_playbooks:
+        goodplay_session(config).prefetched_playbooks = \
+            collection.prefetch_playbooks(config, workers)
+
+
+def playbook_entries(config):
+    for prefetched in test_playbooks(config):
+        entry = playbook_entry(config, prefetched)
+
+        if entry is not None:
+            yield entry
+
+
+def test_playbooks(config):
+    session = goodplay_session(config)
+
+    for playbook_path in collection.candidate_paths(config):
+        if session.is_pruned(playbook_path, is_dir=False):
+            continue
+
+        prefetched = collection.prefetched_playbook(config, playbook_path)
+
+        if is_test_playbook(config, prefetched):
+            yield prefetched
+
+
+def playbook_entry(config, prefetched):
+    ctx = GoodplayContext(playbook_path=prefetched.playbook_path, config=config)
+    prefetched.apply(ctx)
+
+    try:
+        return ctx_entry(config, ctx)
+    except Exception as e:
+        return dict(playbook=nodeid(config, prefetched.playbook_path), error=str(e))
+    finally:
+        ctx.release()
+
+
+def is_test_playbook(config, prefetched):
+    if prefetched.is_test_playbook is None:
+        return ansible_support.is_test_playbook_file(
+            prefetched.playbook_path, goodplay_session(config).yaml_cache)
+
+    return prefetched.is_test_playbook
+
+
+def ctx_entry(config, ctx):
+    if not ctx.inventory_path:
+        return None
+
+    return dict(
+        playbook=nodeid(config, ctx.playbook_path),
+        environments=ctx.environment_names,
+        tasks=[task.name for task in ctx.test_tasks])
+
+
+def write_entry(stream, entry, as_json):
+    if as_json:
+        stream.write(json.dumps(entry, sort_keys=True) + '\n')
+    elif 'error' in entry:
+        stream.write(u'{0}: ERROR {1}\n'.format(entry['playbook'], entry['error']))
+    else:
+        for nodeid in entry_nodeids(entry):
+            stream.write(nodeid + '\n')
+
+    # consumers may process entries while remaining ones are listed
+    stream.flush()
+
+
+def entry_nodeids(entry):
+    # node ids as used by pytest for selecting tests
+    for environment_name in entry['environments'] or [None]:
+        nodeid_parts = [entry['playbook']] + ([environment_name] if environment_name else [])
+
+        for task_name in entry['tasks']:
+            yield '::'.join(nodeid_parts + [task_name])
+
+
+def nodeid(config, path):
+    return path.relto(config.rootdir) or path.strpath
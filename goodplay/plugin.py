@@ -3,14 +3,17 @@
 # Make coding more python3-ish
 from __future__ import (absolute_import, division, print_function)
 
+import collections
 import logging
 import sys
 
+from _pytest.runner import TestReport
 from cached_property import cached_property
 import pytest
 
-from goodplay import ansible_support, docker_support, junitxml
+from goodplay import ansible_support, collection, docker_support, junitxml, watch
 from goodplay.context import GoodplayContext
+from goodplay.session import GoodplaySession, goodplay_session
 
 junitxml.patch_pytest_to_strip_file_extensions()
 
@@ -18,6 +21,8 @@ junitxml.patch_pytest_to_strip_file_extensions()
 # https://urllib3.readthedocs.org/en/latest/security.html#insecureplatformwarning
 logging.captureWarnings(True)
 
+log = logging.getLogger(__name__)
+
 
 def enable_logging_goodplay_info_to_stdout():
     goodplay_stdout_handler = logging.StreamHandler(sys.stdout)
@@ -36,6 +41,110 @@ def pytest_addoption(parser):
     parser.getgroup('goodplay').addoption(
         '--use-local-roles', dest='use_local_roles', action='store_true',
         help='prefer to use local roles instead of auto-installed requirements')
+    parser.getgroup('goodplay').addoption(
+        '--collect-workers', dest='collect_workers', action='store', type=int, default=1,
+        metavar='NUM',
+        help='number of processes used for preparing test playbooks before they are '
+             'collected, 0 means one process per CPU (default: 1)')
+    parser.getgroup('goodplay').addoption(
+        '--prune', dest='prune', action='append', default=[], metavar='GLOB',
+        help='skip directories and files matching GLOB when the goodplay command looks '
+             'for test playbooks (may be given multiple times)')
+    parser.getgroup('goodplay').addoption(
+        '--changed-since', dest='changed_since', action='store', metavar='REF',
+        help='only collect test playbooks depending on files changed since git REF')
+    parser.getgroup('goodplay').addoption(
+        '--impact-analysis', dest='impact_analysis', action='store',
+        choices=('static', 'recorded', 'combined'), default='static',
+        help='how --changed-since determines the files a test playbook depends on: '
+             'statically from its references, from files used by its last run or '
+             'both (default: static)')
+    parser.getgroup('goodplay').addoption(
+        '--watch', dest='watch', action='store_true',
+        help='keep running and rerun test playbooks affected by changed files '
+             '(goodplay command only)')
+    parser.getgroup('goodplay').addoption(
+        '--role-store', dest='role_store', action='store', metavar='DIR',
+        help='directory keeping installed role dependencies across test sessions '
+             '(default: $XDG_CACHE_HOME/goodplay/roles)')
+    parser.getgroup('goodplay').addoption(
+        '--role-store-budget', dest='role_store_budget', action='store', type=int,
+        default=1024, metavar='MB',
+        help='size the role store is limited to by evicting least recently used '
+             'roles (default: 1024)')
+    parser.getgroup('goodplay').addoption(
+        '--install-workers', dest='install_workers', action='store', type=int, default=4,
+        metavar='NUM',
+        help='number of role dependencies installed in parallel before running the '
+             'first test playbook (default: 4)')
+    parser.getgroup('goodplay').addoption(
+        '--role-mirror', dest='role_mirror', action='store', metavar='DIR',
+        help='install role dependencies only from the role mirror filled by the '
+             'goodplay deps fetch command')
+    parser.getgroup('goodplay').addoption(
+        '--no-lockfiles', dest='no_lockfiles', action='store_true',
+        help='neither use nor write lockfiles recording the versions role '
+             'dependencies have been resolved to')
+    parser.getgroup('goodplay').addoption(
+        '--no-role-store', dest='no_role_store', action='store_true',
+        help='install role dependencies for each test playbook from scratch')
+    parser.getgroup('goodplay').addoption(
+        '--executor', dest='executor', action='store',
+        choices=('subprocess', 'fork', 'forkserver'), default='subprocess',
+        help='run test playbooks by starting ansible-playbook as subprocess, by forking '
+             'the pytest process or a forkserver preloading Ansible '
+             '(forkserver requires python 3.4 or later, default: subprocess)')
+    parser.getgroup('goodplay').addoption(
+        '--ansible-verbosity', dest='ansible_verbosity', action='store', type=int, default=3,
+        metavar='NUM',
+        help='verbosity ansible-playbook is run with, equivalent to the number of -v '
+             'passed to it (default: 3)')
+    parser.addini(
+        'goodplay_prune', type='linelist', default=[],
+        help='directory and file patterns skipped when the goodplay command looks for '
+             'test playbooks')
+    parser.addini(
+        'goodplay_prune_gitignored', type='bool', default=True,
+        help='skip paths ignored by git when the goodplay command looks for test playbooks')
+
+
+def pytest_configure(config):
+    config._goodplay_session = GoodplaySession(config)
+
+    # determine changed files up front, thus invalid references are reported
+    # as usage errors
+    config._goodplay_session.changed_paths
+
+    check_watch_usage(config)
+    check_executor_usage(config)
+
+
+def check_watch_usage(config):
+    is_watching = any(
+        isinstance(plugin, watch.WatchPlugin) for plugin in config.pluginmanager.get_plugins())
+
+    if config.getoption('watch') and not is_watching:
+        raise pytest.UsageError('--watch is only supported by the goodplay command')
+
+
+def check_executor_usage(config):
+    if config.getoption('executor') == 'forkserver' and sys.version_info < (3, 4):
+        raise pytest.UsageError('--executor=forkserver requires python 3.4 or later')
+
+
+def pytest_unconfigure(config):
+    goodplay_session(config).release()
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_sessionfinish(session):
+    # test playbooks still running are torn down right after, e.g. when
+    # pytest got interrupted, while their runs are stopped right away, thus
+    # test tasks not run are reported before reports are written
+    goodplay_session(session.config).is_finishing = True
+
+    for playbook in list(goodplay_session(session.config).running_playbooks):
+        playbook.stop_run()
 
 
 class GoodplayFailed(Exception):
@@ -57,6 +166,67 @@ def pytest_runtest_makereport(item, call):
 #       - GoodplayTest (pytest.Item)
 
 
+@pytest.hookimpl(tryfirst=True)
+def pytest_collection(session):
+    collect_workers = session.config.getoption('collect_workers')
+
+    if collect_workers != 1:
+        goodplay_session(session.config).prefetched_playbooks = \
+            collection.prefetch_playbooks(session.config, collect_workers)
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_ignore_collect(path, config):
+    session = goodplay_session(config)
+
+    if session.changed_paths is None or path.check(dir=True):
+        return None
+
+    if ansible_support.is_test_playbook_file(path, session.yaml_cache):
+        ctx = GoodplayContext(playbook_path=path, config=config)
+
+        try:
+            if not ctx.is_affected_by(session.changed_paths):
+                return True
+        finally:
+            ctx.release()
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_runtestloop(session):
+    # dependencies of all test playbooks about to run are installed up
+    # front, each of them once
+    role_store = goodplay_session(session.config).role_store
+
+    if role_store is None or session.config.option.collectonly:
+        return
+
+    requirements = list(session_requirements(session.items))
+
+    if requirements:
+        role_store.prefetch(
+            requirements, session.config.getoption('install_workers'),
+            session.config.getoption('use_local_roles'))
+
+
+def session_requirements(items):
+    contexts = collections.OrderedDict(
+        (id(item.ctx), item.ctx) for item in items if isinstance(item, GoodplayTest))
+
+    for ctx in contexts.values():
+        for requirement in ctx_requirements(ctx):
+            yield requirement
+
+
+def ctx_requirements(ctx):
+    # invalid requirements are reported when running the test playbook
+    try:
+        ctx.playbook.apply_lockfiles()
+        return ctx.playbook.store_requirements()
+    except Exception:
+        return []
+
+
 def pytest_collect_file(parent, path):
     return GoodplayPlaybookFile.consider_and_create(path, parent)
 
@@ -76,16 +246,22 @@ class GoodplayPlaybookFile(pytest.File):
 
     @classmethod
     def consider_and_create(cls, path, parent):
-        if ansible_support.is_test_playbook_file(path):
+        prefetched = collection.prefetched_playbook(parent.config, path)
+
+        if prefetched.is_test_playbook is False:
+            return
+
+        if prefetched.is_test_playbook or ansible_support.is_test_playbook_file(
+                path, goodplay_session(parent.config).yaml_cache):
             ctx = GoodplayContext(playbook_path=path, config=parent.config)
+            prefetched.apply(ctx)
 
             if ctx.inventory_path:
                 return GoodplayPlaybookFile(ctx, path, parent)
 
     def collect(self):
         try:
-            environment_names = \
-                docker_support.environment_names_for_playbook_path(self.ctx.playbook_path)
+            environment_names = self.ctx.environment_names
 
             if environment_names:
                 for environment_name in environment_names:
@@ -135,19 +311,80 @@ class GoodplayPlaybook(GoodplayContextSupport, pytest.Collector):
         self.playbook_runner = None
 
     def collect(self):
-        for task in self.ctx.playbook.test_tasks:
+        for task in self.ctx.test_tasks:
             yield GoodplayTest(task, self)
 
     def setup(self):
+        self.ctx.playbook.install_all_dependencies()
         self.playbook_runner = self.ctx.playbook.create_runner()
         self.playbook_runner.run_async()
+        self.ctx.session.running_playbooks.append(self)
 
     def teardown(self):
         if self.playbook_runner:
+            try:
+                self.finish_run()
+                self.record_footprint()
+
+                if self.playbook_runner.failures:
+                    raise GoodplayFailed('\n'.join(
+                        self.playbook_runner.failures + self.output_report_lines()))
+            finally:
+                self.forget_run()
+                self.playbook_runner.output.close()
+
+    def forget_run(self):
+        if self in self.ctx.session.running_playbooks:
+            self.ctx.session.running_playbooks.remove(self)
+
+    def finish_run(self):
+        if not self.is_stopping():
             self.playbook_runner.wait()
+        elif not self.playbook_runner.is_stopped:
+            self.stop_run()
+
+    def stop_run(self):
+        # pytest stops running tests, thus the remaining test tasks are not
+        # run and the environment is torn down right away
+        self.playbook_runner.stop()
+        not_run_test_tasks = self.playbook_runner.not_run_test_tasks(self.ctx.test_tasks)
+
+        if not_run_test_tasks:
+            log.info('stopped run of %s, test tasks not run: %s', self.ctx.playbook_path,
+                     ', '.join(task.name for task in not_run_test_tasks))
+            self.report_not_run(not_run_test_tasks)
+
+    def report_not_run(self, test_tasks):
+        test_task_names = set(task.name for task in test_tasks)
+
+        for item in self.session.items:
+            if item.parent is self and item.name in test_task_names:
+                item.report_not_run('run of test playbook stopped before')
+
+    def is_stopping(self):
+        return bool(self.session.shouldfail or self.session.shouldstop
+                    or self.ctx.session.is_finishing)
+
+    def output_report_lines(self):
+        output_lines = self.playbook_runner.output.recent_lines()
 
-            if self.playbook_runner.failures:
-                raise GoodplayFailed('\n'.join(self.playbook_runner.failures))
+        if not output_lines:
+            return []
+
+        return ['', 'ansible-playbook output:'] + output_lines
+
+    def record_footprint(self):
+        impact_map = self.ctx.session.impact_map
+
+        if impact_map is None:
+            return
+
+        # footprints of failed or stopped runs are incomplete, thus forgotten
+        if self.playbook_runner.failures or self.playbook_runner.is_stopped:
+            impact_map.discard(self.ctx.playbook_path, self.parent.environment_name)
+        else:
+            impact_map.record(self.ctx.playbook_path, self.parent.environment_name,
+                              self.playbook_runner.footprint_paths())
 
 
 class GoodplayTest(GoodplayContextSupport, pytest.Item):
@@ -166,10 +403,23 @@ class GoodplayTest(GoodplayContextSupport, pytest.Item):
     def setup(self):
         self.playbook_runner.wait_for_test_task(self.task)
 
+    def report_not_run(self, reason):
+        # pytest does not report tests it did not run, thus they are reported
+        # as skipped during setup, e.g. within the terminal summary and junit
+        # xml, just like pytest reports tests skipped on their own
+        longrepr = (self.fspath.strpath, None, 'Skipped: {0}'.format(reason))
+
+        self.ihook.pytest_runtest_logreport(report=TestReport(
+            self.nodeid, self.location, {}, 'skipped', longrepr, 'setup'))
+        self.ihook.pytest_runtest_logreport(report=TestReport(
+            self.nodeid, self.location, {}, 'passed', None, 'teardown'))
+
     def runtest(self):
         outcome = self.playbook_runner.wait_for_test_task_outcome(self.task)
 
         if outcome in ('skipped', None):
             pytest.skip()
         elif outcome == 'failed':
+            self.add_report_section('call', 'ansible-playbook output', '\n'.join(
+                self.playbook_runner.output.test_task_lines(self.task.name)))
             raise GoodplayFailed()
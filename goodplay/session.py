@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+
+import logging
+
+from cached_property import cached_property
+import py.path
+import pytest
+
+from goodplay.ansible_support.lockfile import is_lockfile
+from goodplay.ansible_support.role_mirror import RoleMirror
+from goodplay.ansible_support.role_store import RoleStore, default_store_path
+from goodplay.ansible_support.tasks_cache import TreeDigests
+from goodplay.impact import ImpactMap
+from goodplay.utils.fsindex import FilesystemIndex
+from goodplay.utils.git import GitError, changed_paths_since
+from goodplay.utils.gitignore import GitignoreMatcher
+from goodplay.utils.yamlcache import YamlCache
+
+log = logging.getLogger(__name__)
+
+
+class GoodplaySession(object):
+    def __init__(self, config=None):
+        self.config = config
+
+        self.yaml_cache = YamlCache()
+        self.tree_digests = TreeDigests()
+        self.prefetched_playbooks = {}
+        self.warm_roles_path = None
+        self.is_finishing = False
+        self.running_playbooks = []
+
+    @cached_property
+    def arg_paths(self):
+        if self.config is None:
+            return []
+
+        return [self.config.invocation_dir.join(arg.split('::')[0], abs=True)
+                for arg in self.config.args]
+
+    @cached_property
+    def fs_index(self):
+        root_paths = [path for path in self.arg_paths if path.check(dir=True)]
+
+        return FilesystemIndex(root_paths, self.should_recurse)
+
+    @cached_property
+    def norecursedirs(self):
+        return self.config.getini('norecursedirs')
+
+    @cached_property
+    def prune_patterns(self):
+        if self.config is None:
+            return []
+
+        return self.config.getini('goodplay_prune') + self.config.getoption('prune')
+
+    @cached_property
+    def gitignore_matcher(self):
+        if self.config is not None and self.config.getini('goodplay_prune_gitignored'):
+            return GitignoreMatcher()
+
+    @cached_property
+    def changed_paths(self):
+        changed_since = self.config and self.config.getoption('changed_since')
+
+        if not changed_since:
+            return None
+
+        changed_paths = set(
+            path for path in self.git_changed_paths(changed_since) if not is_lockfile(path))
+        log.info('%d files changed since %s', len(changed_paths), changed_since)
+
+        return changed_paths
+
+    def git_changed_paths(self, changed_since):
+        try:
+            return changed_paths_since(changed_since, self.config.invocation_dir)
+        except GitError as e:
+            raise pytest.UsageError(
+                'unable to determine files changed since {0}: {1}'.format(changed_since, e))
+
+    @cached_property
+    def impact_map(self):
+        cache = getattr(self.config, 'cache', None)
+
+        if cache is not None:
+            return ImpactMap(cache)
+
+    @cached_property
+    def role_store(self):
+        if self.config is None or self.config.getoption('no_role_store'):
+            return None
+
+        store_path = self.config.getoption('role_store')
+        budget = self.config.getoption('role_store_budget')
+
+        return RoleStore(
+            py.path.local(store_path) if store_path else default_store_path(),
+            budget * 1024 * 1024 if budget else None, self.role_mirror)
+
+    @cached_property
+    def role_mirror(self):
+        mirror_path = self.config and self.config.getoption('role_mirror')
+
+        if mirror_path:
+            return RoleMirror(py.path.local(mirror_path))
+
+    def should_recurse(self, path):
+        is_norecursedir = any(path.check(fnmatch=pattern) for pattern in self.norecursedirs)
+
+        return not is_norecursedir and not self.is_pruned(path, is_dir=True)
+
+    def is_pruned(self, path, is_dir):
+        if any(path.check(fnmatch=pattern) for pattern in self.prune_patterns):
+            return True
+
+        return bool(self.gitignore_matcher and self.gitignore_matcher.is_ignored(path, is_dir))
+
+    def release(self):
+        if 'role_store' in self.__dict__ and self.role_store is not None:
+            self.role_store.release()
+
+
+def goodplay_session(config):
+    session = getattr(config, '_goodplay_session', None)
+
+    if session is None:
+        session = GoodplaySession(config)
+
+    return session
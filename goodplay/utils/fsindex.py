@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+
+import fnmatch
+import logging
+import os
+
+import py.path
+
+log = logging.getLogger(__name__)
+
+
+class FilesystemIndex(object):
+    # answers stat and listdir lookups from a single walk over the given
+    # root paths, paths outside of the walked trees are looked up on disk
+    def __init__(self, root_paths=(), should_recurse=None):
+        self.should_recurse = should_recurse or (lambda path: True)
+        self.entries = {}
+
+        for root_path in root_paths:
+            self.add_tree(root_path)
+
+    def add_tree(self, root_path):
+        for dir_path, dir_names, file_names in os.walk(root_path.strpath):
+            self.entries[dir_path] = (frozenset(file_names), frozenset(dir_names))
+            dir_names[:] = sorted(
+                dir_name for dir_name in dir_names
+                if self.should_recurse(py.path.local(dir_path).join(dir_name)))
+
+        log.debug('indexed %d directories below %s', len(self.entries), root_path)
+
+    def entry(self, dir_path):
+        return self.entries.get(dir_path.strpath)
+
+    def isfile(self, path):
+        entry = self.entry(path.dirpath())
+
+        if entry is None:
+            return path.check(file=True)
+
+        return path.basename in entry[0]
+
+    def isdir(self, path):
+        entry = self.entry(path.dirpath())
+
+        if entry is None:
+            return path.check(dir=True)
+
+        return path.basename in entry[1]
+
+    def exists(self, path):
+        return self.isfile(path) or self.isdir(path)
+
+    def listdir(self, dir_path, fil=None):
+        entry = self.entry(dir_path)
+
+        if entry is None:
+            return dir_path.listdir(fil, sort=True)
+
+        paths = [dir_path.join(name) for name in sorted(entry[0] | entry[1])]
+
+        return list(filter(fil, paths)) if fil else paths
+
+    def visit_files(self, root_path, pattern):
+        for dir_path in sorted(self.entries):
+            if dir_path == root_path.strpath or dir_path.startswith(root_path.strpath + os.sep):
+                for file_name in sorted(fnmatch.filter(self.entries[dir_path][0], pattern)):
+                    yield py.path.local(dir_path).join(file_name)
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+
+import py.path
+
+from goodplay.utils.subprocess import run
+
+
+class GitError(Exception):
+    pass
+
+
+def changed_paths_since(ref, cwd):
+    # committed, staged, unstaged and untracked changes compared to ref
+    top_level_path = py.path.local(git_output(cwd, 'git rev-parse --show-toplevel')[0])
+
+    changed_names = git_output(
+        top_level_path, 'git -c core.quotePath=false diff --name-only --no-renames {0} --', ref)
+    untracked_names = git_output(
+        top_level_path, 'git -c core.quotePath=false ls-files --others --exclude-standard')
+
+    return set(top_level_path.join(name) for name in changed_names + untracked_names)
+
+
+def git_output(cwd, command, *args):
+    process = run(command, *args, cwd=cwd.strpath)
+    lines = [line.rstrip('\n') for line in process.stdout]
+
+    if process.returncode != 0:
+        raise GitError(''.join(process.stderr).strip())
+
+    return lines
+
+
+def resolve_ref(url, ref):
+    # commit a branch or tag of a remote repository points to, None when
+    # there is no such branch or tag
+    for line in git_output(py.path.local(), 'git ls-remote {0} {1}', url, ref):
+        return line.split()[0]
+
+
+def mirror_repository(url, mirror_path):
+    # creates or updates a bare mirror of a remote repository
+    if mirror_path.check(dir=True):
+        git_output(mirror_path, 'git remote update --prune')
+    else:
+        mirror_path.dirpath().ensure(dir=True)
+        git_output(mirror_path.dirpath(), 'git clone --mirror {0} {1}', url, mirror_path)
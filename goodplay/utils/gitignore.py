@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+
+import logging
+import time
+
+from goodplay.utils.git import GitError, git_output
+from goodplay.utils.subprocess import run
+
+log = logging.getLogger(__name__)
+
+
+class GitignoreMatcher(object):
+    # asks git which paths of the work tree a path belongs to are ignored,
+    # thus .gitignore files, .git/info/exclude and core.excludesFile are
+    # considered just like git does
+    def __init__(self):
+        self._work_trees = {}
+
+    def is_ignored(self, path, is_dir):
+        work_tree = self.work_tree(path.dirpath())
+
+        return work_tree is not None and work_tree.is_ignored(path, is_dir)
+
+    def work_tree(self, dir_path):
+        if dir_path.strpath not in self._work_trees:
+            if dir_path.join('.git').check():
+                self._work_trees[dir_path.strpath] = GitWorkTree(dir_path)
+            elif dir_path.dirpath() == dir_path:
+                self._work_trees[dir_path.strpath] = None
+            else:
+                self._work_trees[dir_path.strpath] = self.work_tree(dir_path.dirpath())
+
+        return self._work_trees[dir_path.strpath]
+
+
+class GitWorkTree(object):
+    # ignored paths are listed once, where directories ignored as a whole
+    # are listed without their content; paths modified after listing them,
+    # e.g. while watching for changes, are checked one by one
+    def __init__(self, path):
+        self.path = path
+        self.listed_at = None
+        self._ignored_names = None
+
+    def is_ignored(self, path, is_dir):
+        return self.is_listed_as_ignored(path, is_dir) or self.is_checked_as_ignored(path)
+
+    def is_listed_as_ignored(self, path, is_dir):
+        rel_path = path.relto(self.path)
+        ignored_names = self.ignored_names()
+
+        return rel_path + ('/' if is_dir else '') in ignored_names or any(
+            parent_name in ignored_names for parent_name in parent_names(rel_path))
+
+    def is_checked_as_ignored(self, path):
+        return self.is_modified_since_listing(path) and self.check_ignore(path)
+
+    def ignored_names(self):
+        if self._ignored_names is None:
+            self.listed_at = time.time()
+            self._ignored_names = set(self.list_ignored_names())
+
+        return self._ignored_names
+
+    def list_ignored_names(self):
+        try:
+            return git_output(
+                self.path, 'git -c core.quotePath=false ls-files --others --ignored '
+                           '--exclude-standard --directory')
+        except (GitError, EnvironmentError) as e:
+            log.info('unable to list paths ignored by git in %s: %s', self.path, e)
+            return []
+
+    def is_modified_since_listing(self, path):
+        return path.check() and path.mtime() >= self.listed_at
+
+    def check_ignore(self, path):
+        try:
+            return run('git check-ignore --quiet {0}', path, cwd=self.path.strpath).returncode == 0
+        except EnvironmentError:
+            return False
+
+
+def parent_names(rel_path):
+    # names of all directories containing a path relative to the work tree
+    parts = rel_path.split('/')[:-1]
+
+    return ['/'.join(parts[:index]) + '/' for index in range(1, len(parts) + 1)]
@@ -3,33 +3,187 @@
 # Make coding more python3-ish
 from __future__ import (absolute_import, division, print_function)
 
+import codecs
+import collections
 import logging
-import sarge
+import os
+import select
+import shlex
+import subprocess
+import sys
+
+from ansible.module_utils._text import to_native, to_text
 
 log = logging.getLogger(__name__)
 
 
 def run(command, *args, **kwargs):
-    command = sarge.shell_format(command, *args)
-    log.info('run process: %s', command)
+    # runs the command and waits for it to finish unless async_ is given,
+    # stdout and stderr are captured by the returned Process, env extends
+    # the current environment
+    async_ = kwargs.pop('async_', False)
+    env = dict(os.environ, **kwargs.pop('env', {}))
+    argv = split_command(command, *args)
+    log.info('run process: %s', ' '.join(argv))
+
+    process = Process(argv, env=env, **kwargs)
+
+    if not async_:
+        process.wait()
+
+    return process
+
+
+def split_command(command, *args):
+    # the command is split before formatting its parts, thus arguments are
+    # kept intact instead of quoting and parsing them again, while argv is
+    # made of native strings, i.e. bytes on python 2
+    text_args = [to_text(arg) for arg in args]
+
+    return [to_native(to_text(part).format(*text_args)) for part in shlex.split(command)]
+
+
+def new_session_kwargs():
+    # Popen arguments starting the process as leader of a new session and
+    # process group, which all of its children belong to
+    if sys.version_info[0] == 2:  # pragma: no cover
+        return dict(preexec_fn=os.setsid)
+
+    return dict(start_new_session=True)
+
+
+def signal_process_group(pid, signum):
+    # signals the process group led by pid, or only the process while it did
+    # not become leader of its group yet, processes already gone are ignored
+    try:
+        os.killpg(pid, signum)
+    except OSError:
+        try:
+            os.kill(pid, signum)
+        except OSError:
+            pass
+
+
+class Process(object):
+    # subprocess whose stdout and stderr are read into line buffers only when
+    # select reports output being available, thus waiting for output blocks
+    # instead of polling busily, the buffers are not bounded, thus output of
+    # long running processes is to be consumed while waiting via on_output
+    poll_interval = 0.1
+
+    def __init__(self, argv, new_session=False, **kwargs):
+        if new_session:
+            kwargs.update(new_session_kwargs())
+
+        self.popen = subprocess.Popen(
+            argv, stdout=subprocess.PIPE, stderr=subprocess.PIPE, **kwargs)
+        self.stdout = OutputStream(self, self.popen.stdout)
+        self.stderr = OutputStream(self, self.popen.stderr)
+
+    @property
+    def returncode(self):
+        return self.popen.returncode
+
+    def poll(self):
+        return self.popen.poll()
+
+    def open_streams(self):
+        return [stream for stream in (self.stdout, self.stderr) if not stream.closed]
+
+    def read_output(self, fileobjs=(), timeout=None):
+        # blocks until output or one of fileobjs is readable, reads the
+        # available output and returns the readable fileobjs
+        streams = self.open_streams()
+        readable = select.select(
+            list(fileobjs) + [stream.pipe for stream in streams], [], [], timeout)[0]
+
+        for stream in streams:
+            stream.read_if_readable(readable)
 
-    return sarge.run(command, stdout=Capture(), stderr=Capture(), **kwargs)
+        return [fileobj for fileobj in fileobjs if fileobj in readable]
 
+    def consume_output(self, fileobjs=(), timeout=None, on_output=None):
+        # reads output like read_output, on_output is called after each read
+        readable = self.read_output(fileobjs, timeout)
+
+        if on_output is not None:
+            on_output()
+
+        return readable
+
+    def wait_readable(self, fileobj, on_output=None):
+        # reads output while waiting for fileobj to become readable, returns
+        # False when the process exited before
+        while self.open_streams():
+            if self.consume_output([fileobj], on_output=on_output):
+                return True
+
+        while self.poll() is None:
+            if self.consume_output([fileobj], self.poll_interval, on_output):
+                return True
+
+        return bool(self.consume_output([fileobj], 0, on_output))
+
+    def wait(self, on_output=None):
+        while self.open_streams():
+            self.consume_output(on_output=on_output)
+
+        return self.popen.wait()
+
+    def signal_group(self, signum):
+        signal_process_group(self.popen.pid, signum)
+
+
+class OutputStream(object):
+    # lines read from a pipe, decoded incrementally as multi-byte characters
+    # may be split across reads
+    read_size = 65536
+
+    def __init__(self, process, pipe):
+        self.process = process
+        self.pipe = pipe
+        self.decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        self.lines = collections.deque()
+        self.partial_line = ''
+        self.closed = False
+
+    def read_if_readable(self, readable):
+        if self.pipe in readable:
+            self.read()
+
+    def read(self):
+        data = os.read(self.pipe.fileno(), self.read_size)
+        self.add_text(self.decoder.decode(data, final=not data))
+
+        if not data:
+            self.close()
+
+    def add_text(self, text):
+        lines = (self.partial_line + text).split('\n')
+        self.partial_line = lines.pop()
+        self.lines.extend(line + '\n' for line in lines)
+
+    def close(self):
+        # the last line is kept even without trailing newline
+        if self.partial_line:
+            self.lines.append(self.partial_line)
+            self.partial_line = ''
+
+        self.pipe.close()
+        self.closed = True
+
+    def available_lines(self):
+        # lines read so far, without waiting for further output
+        while self.lines:
+            yield self.lines.popleft()
 
-class Capture(sarge.Capture):
     def __iter__(self):
-        # override default Capture to read lines as long as streams are open,
-        # thus iteration is not being stopped by large pauses between lines
-        # being available
-        while self.streams_open():
-            line = self.readline()
-            if not line:
-                continue
-            yield line.decode('utf-8')
-
-        # ensure remaining buffered lines are consumed (original code)
+        # lines until the stream is closed, waiting for further output
         while True:
-            line = self.readline()
-            if not line:
-                break
-            yield line.decode('utf-8')
+            for line in self.available_lines():
+                yield line
+
+            if self.closed:
+                return
+
+            self.process.read_output()
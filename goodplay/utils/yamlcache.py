@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+
+import yaml
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:  # pragma: no cover
+    from yaml import SafeLoader
+
+
+def safe_load(stream):
+    return yaml.load(stream, Loader=SafeLoader)
+
+
+class YamlCache(object):
+    # results are cached per path and invalidated as soon as the file's
+    # modification time or size changes, thus treat them as read-only
+    def __init__(self):
+        self._cache = {}
+
+    def load(self, path):
+        return self.lookup(path, 'content', load_path)
+
+    def lookup(self, path, kind, func):
+        stat = path.stat()
+        stamp = (stat.mtime, stat.size)
+        cache_key = (kind, path.strpath)
+
+        cached = self._cache.get(cache_key)
+        if cached is None or cached[0] != stamp:
+            cached = self._cache[cache_key] = (stamp, func(path))
+
+        return cached[1]
+
+    def clear(self):
+        self._cache.clear()
+
+
+def load_path(path):
+    with path.open('rb') as stream:
+        return safe_load(stream)
+
+
+# event based helpers for inspecting the beginning of a document without
+# constructing the whole document
+
+def check_and_skip_events(loader, *event_classes):
+    for event_class in event_classes:
+        if not loader.check_event(event_class):
+            return False
+        loader.get_event()
+
+    return True
+
+
+def skip_node(loader):
+    depth = 0
+
+    while True:
+        event = loader.get_event()
+
+        if isinstance(event, (yaml.SequenceStartEvent, yaml.MappingStartEvent)):
+            depth += 1
+        elif isinstance(event, (yaml.SequenceEndEvent, yaml.MappingEndEvent)):
+            depth -= 1
+
+        if depth == 0:
+            return
+
+
+def construct_scalar(loader):
+    event = loader.get_event()
+    tag = event.tag
+
+    if tag is None or tag == '!':
+        tag = loader.resolve(yaml.ScalarNode, event.value, event.implicit)
+
+    return loader.construct_object(yaml.ScalarNode(tag, event.value, style=event.style))
+
+
+def is_truthy_node(loader):
+    if loader.check_event(yaml.ScalarEvent):
+        return bool(construct_scalar(loader))
+
+    if loader.check_event(yaml.AliasEvent):
+        loader.get_event()
+        return True
+
+    # collections are truthy when not empty
+    loader.get_event()
+    is_truthy = not loader.check_event(yaml.SequenceEndEvent, yaml.MappingEndEvent)
+    skip_node_remainder(loader)
+
+    return is_truthy
+
+
+def skip_node_remainder(loader):
+    while not loader.check_event(yaml.SequenceEndEvent, yaml.MappingEndEvent):
+        skip_node(loader)
+    loader.get_event()
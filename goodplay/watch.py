@@ -0,0 +1,342 @@
+# -*- coding: utf-8 -*-
+
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import sys
+import time
+
+import py.path
+import pytest
+
+from goodplay import depgraph
+from goodplay.ansible_support.lockfile import is_lockfile
+from goodplay.context import GoodplayContext
+from goodplay.session import goodplay_session
+from goodplay.utils.yamlcache import YamlCache
+
+log = logging.getLogger(__name__)
+
+
+# exit codes of pytest when interrupted, as pytest handles Ctrl+C during a run
+# itself instead of raising KeyboardInterrupt, and on errors not caused by
+# test playbooks, which rerunning on changes would only repeat
+EXIT_INTERRUPTED = 2
+EXIT_INTERNALERROR = 3
+EXIT_USAGEERROR = 4
+STOPPING_EXIT_CODES = (EXIT_INTERRUPTED, EXIT_INTERNALERROR, EXIT_USAGEERROR)
+
+
+def watch(args, plugins):
+    # runs pytest repeatedly within the same process, every run after the
+    # first one only collects test playbooks affected by the changed files
+    warm_state = WarmState()
+    watcher = None
+    exit_code = 0
+
+    try:
+        exit_code = warm_state.run(args, plugins, changed_paths=None)
+
+        while exit_code not in STOPPING_EXIT_CODES:
+            watcher = watcher or create_watcher(warm_state.root_paths, warm_state.should_watch)
+            watcher.add_paths(warm_state.pop_input_paths())
+            log.info('watching for changes ... press Ctrl+C to stop')
+            changed_paths = watcher.wait_for_changes()
+            log.info('%d changed paths detected ... rerunning affected test playbooks',
+                     len(changed_paths))
+            exit_code = warm_state.run(args, plugins, changed_paths)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if watcher:
+            watcher.close()
+        warm_state.release()
+
+    return exit_code
+
+
+class WarmState(object):
+    # state kept across the runs of a watch session
+    def __init__(self):
+        self.yaml_cache = YamlCache()
+        self.warm_roles_path = py.path.local.mkdtemp()
+        self.root_paths = []
+        self.input_paths = set()
+        self.new_input_paths = []
+        self.session = None
+
+    def run(self, args, plugins, changed_paths):
+        watch_plugin = WatchPlugin(self, changed_paths)
+
+        return pytest.main(list(args), plugins=list(plugins) + [watch_plugin])
+
+    def attach(self, session):
+        session.yaml_cache = self.yaml_cache
+        session.warm_roles_path = self.warm_roles_path
+
+        if self.session is None:
+            self.session = session
+            self.root_paths = sorted(set(
+                arg_path if arg_path.check(dir=True) else arg_path.dirpath()
+                for arg_path in session.arg_paths))
+
+    def add_input_paths(self, paths):
+        # inputs of test playbooks outside of the watched directories, e.g.
+        # external roles or inventories, are watched once collected
+        for path in paths:
+            if path not in self.input_paths and not is_below(path, self.root_paths) \
+                    and path.check():
+                self.input_paths.add(path)
+                self.new_input_paths.append(path)
+
+    def pop_input_paths(self):
+        new_input_paths, self.new_input_paths = self.new_input_paths, []
+
+        return new_input_paths
+
+    def should_watch(self, path, is_dir):
+        # hidden files, e.g. editor swap files, are no test playbook inputs
+        if path.basename.startswith('.') or is_lockfile(path):
+            return False
+
+        if is_dir:
+            return self.session.should_recurse(path)
+
+        return not self.session.is_pruned(path, is_dir)
+
+    def release(self):
+        self.warm_roles_path.remove(ignore_errors=True)
+
+
+def is_below(path, root_paths):
+    return any(path == root_path or path.relto(root_path) for root_path in root_paths)
+
+
+class WatchPlugin(object):
+    def __init__(self, warm_state, changed_paths):
+        self.warm_state = warm_state
+        self.changed_paths = changed_paths
+
+    @pytest.hookimpl(trylast=True)
+    def pytest_configure(self, config):
+        self.warm_state.attach(goodplay_session(config))
+
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_ignore_collect(self, path, config):
+        if self.changed_paths is None or path.check(dir=True):
+            return None
+
+        # defer the decision for affected paths to the remaining plugins
+        return None if self.is_affected(path, config) else True
+
+    def pytest_collection_finish(self, session):
+        self.warm_state.add_input_paths(
+            path for item in session.items if hasattr(item, 'ctx')
+            for path in item.ctx.dependency_paths)
+
+    def is_affected(self, path, config):
+        # new files within the role or playbook directory may be inputs not
+        # known to the impact analysis yet
+        ctx = GoodplayContext(playbook_path=path, config=config)
+
+        try:
+            return depgraph.is_affected_by(ctx.input_root_paths, self.changed_paths) \
+                or ctx.is_affected_by(self.changed_paths)
+        finally:
+            ctx.release()
+
+
+def create_watcher(root_paths, should_watch):
+    try:
+        return InotifyWatcher(root_paths, should_watch)
+    except (AttributeError, EnvironmentError):
+        log.info('inotify not available ... falling back to polling for changes')
+        return PollingWatcher(root_paths, should_watch)
+
+
+class InotifyWatcher(object):
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_Q_OVERFLOW = 0x00004000
+    IN_ISDIR = 0x40000000
+
+    watch_mask = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+    event_header = struct.Struct('iIII')
+
+    def __init__(self, root_paths, should_watch, settle_time=0.2):
+        self.root_paths = root_paths
+        self.should_watch = should_watch
+        self.settle_time = settle_time
+        self.watched_dir_paths = {}
+
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_CLOEXEC)
+
+        if self.fd < 0:
+            raise_errno()
+
+        for root_path in root_paths:
+            self.add_tree(root_path)
+
+    def add_paths(self, paths):
+        # directories are watched recursively, files by their directory
+        for path in paths:
+            if path.check(dir=True):
+                self.add_tree(path)
+            else:
+                self.add_watch(path.dirpath())
+
+    def add_tree(self, root_path):
+        for dir_path, dir_names, _ in os.walk(root_path.strpath):
+            self.add_watch(py.path.local(dir_path))
+            dir_names[:] = [
+                dir_name for dir_name in dir_names
+                if self.should_watch(py.path.local(dir_path).join(dir_name), is_dir=True)]
+
+    def add_watch(self, dir_path):
+        encoded_dir_path = dir_path.strpath.encode(sys.getfilesystemencoding())
+        watch_descriptor = self.libc.inotify_add_watch(
+            self.fd, encoded_dir_path, self.watch_mask)
+
+        if watch_descriptor < 0:
+            log.debug('failed to watch %s: %s', dir_path, os.strerror(ctypes.get_errno()))
+        else:
+            self.watched_dir_paths[watch_descriptor] = dir_path
+
+    def wait_for_changes(self, timeout=None):
+        changed_paths = set()
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+
+        # changes usually come in bursts, e.g. when saving multiple files
+        while readable:
+            changed_paths.update(self.read_changed_paths())
+            readable, _, _ = select.select([self.fd], [], [], self.settle_time)
+
+        return changed_paths
+
+    def read_changed_paths(self):
+        buf = os.read(self.fd, 65536)
+        offset = 0
+
+        while offset < len(buf):
+            watch_descriptor, mask, _, name_length = self.event_header.unpack_from(buf, offset)
+            offset += self.event_header.size
+            name = buf[offset:offset + name_length].rstrip(b'\0')
+            offset += name_length
+
+            for changed_path in self.changed_paths_for_event(watch_descriptor, mask, name):
+                yield changed_path
+
+    def changed_paths_for_event(self, watch_descriptor, mask, name):
+        if mask & self.IN_Q_OVERFLOW:
+            log.info('too many changes to track ... considering everything changed')
+            return self.root_paths
+
+        dir_path = self.watched_dir_paths.get(watch_descriptor)
+        if dir_path is None or not name:
+            return []
+
+        path = dir_path.join(name.decode(sys.getfilesystemencoding()))
+        is_dir = bool(mask & self.IN_ISDIR)
+
+        return [path] if self.watch_path(path, is_dir, mask) else []
+
+    def watch_path(self, path, is_dir, mask):
+        if not self.should_watch(path, is_dir):
+            return False
+
+        if is_dir and mask & (self.IN_CREATE | self.IN_MOVED_TO):
+            self.add_tree(path)
+
+        return True
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher(object):
+    def __init__(self, root_paths, should_watch, interval=1.0):
+        self.root_paths = list(root_paths)
+        self.should_watch = should_watch
+        self.interval = interval
+        self.file_paths = []
+
+        self.snapshot = self.take_snapshot()
+
+    def add_paths(self, paths):
+        for path in paths:
+            if path.check(dir=True):
+                self.root_paths.append(path)
+            else:
+                self.file_paths.append(path)
+
+        self.snapshot = self.take_snapshot()
+
+    def take_snapshot(self):
+        snapshot = {}
+
+        for root_path in self.root_paths:
+            for dir_path, dir_names, file_names in os.walk(root_path.strpath):
+                dir_names[:] = self.watched_dir_names(dir_path, dir_names)
+                snapshot.update(self.stat_files(dir_path, file_names))
+
+        for file_path in self.file_paths:
+            snapshot.update(self.stat_files(file_path.dirname, [file_path.basename]))
+
+        return snapshot
+
+    def watched_dir_names(self, dir_path, dir_names):
+        return [
+            dir_name for dir_name in dir_names
+            if self.should_watch(py.path.local(dir_path).join(dir_name), is_dir=True)]
+
+    def stat_files(self, dir_path, file_names):
+        for file_name in file_names:
+            path = os.path.join(dir_path, file_name)
+
+            if self.should_watch(py.path.local(path), is_dir=False):
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield path, (stat.st_mtime, stat.st_size)
+
+    def wait_for_changes(self, timeout=None):
+        deadline = float('inf') if timeout is None else time.time() + timeout
+
+        while True:
+            changed_paths = self.changed_paths()
+
+            if changed_paths or time.time() >= deadline:
+                return changed_paths
+
+            time.sleep(self.interval)
+
+    def changed_paths(self):
+        snapshot = self.take_snapshot()
+        changed_paths = set(
+            py.path.local(path) for path in set(snapshot) | set(self.snapshot)
+            if snapshot.get(path) != self.snapshot.get(path))
+        self.snapshot = snapshot
+
+        return changed_paths
+
+    def close(self):
+        pass
+
+
+def raise_errno():
+    error_number = ctypes.get_errno() or errno.EINVAL
+
+    raise OSError(error_number, os.strerror(error_number))
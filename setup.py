@@ -11,7 +11,6 @@ install_requires = [
     'docker-compose>=1.22.0',
     'py>=1.4.34',
     'pytest>=3.5.0',
-    'sarge>=0.1.5',
 ]
 
 readme_path = os.path.join(os.path.dirname(__file__), 'README.rst')
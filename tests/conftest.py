@@ -1,8 +1,33 @@
 # -*- coding: utf-8 -*-
 
+import importlib
 import os
 import sys
 
+import pytest
+
 sys.path.append(os.path.join(os.path.dirname(__file__), 'helpers'))
 
 pytest_plugins = 'pytester'
+
+
+def import_multiprocessing_modules():
+    # multiprocessing's modules are imported up front, as modules imported
+    # while running pytest inline are dropped afterwards, while
+    # multiprocessing keeps referring to the original ones
+    for module_name in ('connection', 'queues', 'synchronize',
+                        'resource_tracker', 'semaphore_tracker'):
+        try:
+            importlib.import_module('multiprocessing.' + module_name)
+        except ImportError:
+            # trackers only exist on some python versions
+            pass
+
+
+import_multiprocessing_modules()
+
+
+@pytest.fixture(autouse=True)
+def isolated_role_store(monkeypatch, tmpdir_factory):
+    # keep roles installed by tests out of the user's role store
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmpdir_factory.mktemp('xdg-cache')))
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from goodplay.ansible_support.output import OutputSpool
+
+from goodplay_helpers import smart_create
+
+runner_args_by_runner = [[], ['--executor=fork']]
+
+
+def failed_reports(result):
+    return [report for report in result.getreports('pytest_runtest_logreport')
+            if report.failed]
+
+
+def task_event(event_name, name):
+    return dict(event_name=event_name, data=dict(name=name))
+
+
+def test_output_spool_reports_most_recent_lines_only(tmpdir):
+    output = OutputSpool(tmpdir.join('output.gz'), max_report_lines=2)
+
+    for line in ('line1', 'line2', 'line3'):
+        output.add(line)
+
+    assert output.recent_lines() == ['line2', 'line3']
+
+
+def test_output_spool_reads_back_output_of_each_test_task(tmpdir):
+    output = OutputSpool(tmpdir.join('output.gz'))
+    # members are split across chunks read from the spool
+    output.read_size = 7
+
+    output.add('before')
+    output.add_event(task_event('test-task-start', 'task1'))
+    output.add('line1')
+    output.add_event(task_event('test-task-end', 'task1'))
+    output.add('after')
+    output.add_event(task_event('test-task-start', 'task2'))
+    output.add('line2')
+
+    assert output.test_task_lines('task1') == ['line1']
+    assert output.test_task_lines('task2') == ['line2']
+    assert output.recent_lines() == ['line2']
+    assert output.test_task_lines('unknown') == []
+
+
+def test_output_spool_reads_back_output_of_unfinished_test_task_after_close(tmpdir):
+    output = OutputSpool(tmpdir.join('output.gz'))
+
+    output.add_event(task_event('test-task-start', 'task1'))
+    output.add('line1')
+    assert output.test_task_lines('task1') == ['line1']
+
+    output.add('line2')
+    output.close()
+
+    assert output.test_task_lines('task1') == ['line1', 'line2']
+
+
+def test_output_spool_is_compressed(tmpdir):
+    output = OutputSpool(tmpdir.join('output.gz'))
+    line = 'ok: [127.0.0.1] => {"changed": false, "ping": "pong"}'
+
+    for _ in range(10000):
+        output.add(line)
+
+    output.close()
+
+    assert tmpdir.join('output.gz').size() < len(line) * 100
+    assert output.recent_lines()[-1] == line
+
+
+def test_output_of_passing_run_is_neither_logged_nor_reported(testdir, caplog):
+    smart_create(testdir.tmpdir, '''
+    ## inventory
+    127.0.0.1 ansible_connection=local
+
+    ## test_playbook.yml
+    - hosts: 127.0.0.1
+      gather_facts: no
+      tasks:
+        - name: task1
+          ping:
+          tags: test
+    ''')
+
+    result = testdir.inline_run('-s')
+
+    result.assertoutcome(passed=1)
+    assert not [message for message in caplog.messages if 'PLAY RECAP' in message]
+    assert not [report for report in result.getreports('pytest_runtest_logreport')
+                if 'Captured ansible-playbook output call' in dict(report.sections)]
+
+
+def test_output_of_failed_test_task_is_reported(testdir):
+    smart_create(testdir.tmpdir, '''
+    ## inventory
+    127.0.0.1 ansible_connection=local
+
+    ## test_playbook.yml
+    - hosts: 127.0.0.1
+      gather_facts: no
+      tasks:
+        - name: task1
+          ping:
+          tags: test
+        - name: task2
+          fail:
+            msg: task2 went wrong
+          tags: test
+    ''')
+
+    result = testdir.inline_run('-s')
+
+    result.assertoutcome(passed=1, failed=1)
+    report, = failed_reports(result)
+    output = dict(report.sections)['Captured ansible-playbook output call']
+    assert 'task2 went wrong' in output
+    assert 'TASK [task1]' not in output
+
+
+@pytest.mark.parametrize('runner_args', runner_args_by_runner)
+def test_output_of_errored_run_is_reported(testdir, runner_args):
+    smart_create(testdir.tmpdir, '''
+    ## inventory
+    127.0.0.1 ansible_connection=local
+
+    ## test_playbook.yml
+    - hosts: 127.0.0.1
+      gather_facts: no
+      tasks:
+        - name: task1
+          ping:
+          tags: test
+        - name: failing task
+          fail:
+            msg: run went wrong
+    ''')
+
+    result = testdir.inline_run('-s', *runner_args)
+
+    report, = failed_reports(result)
+    assert 'ansible-playbook output:' in report.longreprtext
+    assert 'run went wrong' in report.longreprtext
+    assert 'PLAY RECAP' in report.longreprtext
+
+
+@pytest.mark.parametrize('verbosity, is_connection_reported', [('0', False), ('3', True)])
+def test_ansible_verbosity_is_configurable(testdir, verbosity, is_connection_reported):
+    smart_create(testdir.tmpdir, '''
+    ## inventory
+    127.0.0.1 ansible_connection=local
+
+    ## test_playbook.yml
+    - hosts: 127.0.0.1
+      gather_facts: no
+      tasks:
+        - name: task1
+          command: /bin/false
+          tags: test
+    ''')
+
+    result = testdir.inline_run('-s', '--ansible-verbosity', verbosity)
+
+    report, = failed_reports(result)
+    output = dict(report.sections)['Captured ansible-playbook output call']
+    assert ('ESTABLISH LOCAL CONNECTION' in output) is is_connection_reported
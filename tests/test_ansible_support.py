@@ -3,6 +3,7 @@
 import pytest
 
 from goodplay import ansible_support
+from goodplay.utils.yamlcache import YamlCache
 
 
 # fixtures
@@ -33,11 +34,17 @@ def valid_test_playbook():
         '- hosts: default',
         '- include: abc',
         '- import_playbook: otherplaybook.yml',
+        '- hosts: [host1, host2]',
+        '- vars: {key: [1, 2]}\n  hosts: default',
+        '- hosts: default\n- [invalid\n',
     ],
     ids=[
         'hosts',
         'include',
         'import_playbook',
+        'hosts-list',
+        'hosts-after-vars',
+        'invalid-after-first-play',
     ]
 )
 def valid_test_playbook_content(request):
@@ -52,6 +59,9 @@ def valid_test_playbook_content(request):
         '[]',
         '- hello world',
         '- key: value',
+        '- hosts: ""',
+        '- hosts: []',
+        '- vars: {hosts: default}',
     ],
     ids=[
         'empty',
@@ -60,6 +70,9 @@ def valid_test_playbook_content(request):
         'empty-list',
         'non-dict-list',
         'non-play-dict-list',
+        'empty-hosts',
+        'empty-hosts-list',
+        'nested-hosts',
     ]
 )
 def invalid_test_playbook_content(request):
@@ -122,6 +135,19 @@ def test_is_test_playbook_file_with_invalid_content(
     assert not ansible_support.is_test_playbook_file(path)
 
 
+def test_is_test_playbook_file_result_is_cached_until_file_changes(tmpdir):
+    yaml_cache = YamlCache()
+
+    path = tmpdir.join('test_playbook.yml')
+    path.write('- key: value')
+
+    assert not ansible_support.is_test_playbook_file(path, yaml_cache)
+
+    path.write('- hosts: default')
+
+    assert ansible_support.is_test_playbook_file(path, yaml_cache)
+
+
 def test_host_vars_are_not_mixed_when_using_multiple_inventories(tmpdir):
     inventory1_path = tmpdir.join('inventory1')
     inventory1_path.write('default key=value1')
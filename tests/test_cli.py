@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 
+import json
 import subprocess
 
 from goodplay_helpers import smart_create
@@ -69,3 +70,217 @@ def test_goodplay_cli_forwards_pytest_returncode(tmpdir):
         ['goodplay'], cwd=str(tmpdir))
 
     assert goodplay_returncode == EXIT_NOTESTSCOLLECTED
+
+
+def test_goodplay_cli_skips_gitignored_directories(tmpdir):
+    subprocess.check_call(['git', 'init', '--quiet'], cwd=str(tmpdir))
+    smart_create(tmpdir, '''
+    ## .gitignore
+    generated/
+
+    ## inventory
+    127.0.0.1 ansible_connection=local
+
+    ## generated/inventory
+    127.0.0.1 ansible_connection=local
+
+    ## generated/test_playbook.yml
+    - hosts: 127.0.0.1
+      tasks:
+        - name: ignored task
+          ping:
+          tags: test
+
+    ## test_playbook.yml
+    - hosts: 127.0.0.1
+      tasks:
+        - name: task1
+          ping:
+          tags: test
+    ''')
+
+    stdout = subprocess.check_output(
+        ['goodplay', '--collect-only'], cwd=str(tmpdir))
+
+    assert b"<GoodplayTest 'task1'>" in stdout
+    assert b"ignored task" not in stdout
+
+
+def test_goodplay_cli_skips_pruned_directories(tmpdir):
+    smart_create(tmpdir, '''
+    ## vendor/inventory
+    127.0.0.1 ansible_connection=local
+
+    ## vendor/roles/inventory
+    127.0.0.1 ansible_connection=local
+
+    ## vendor/roles/test_playbook.yml
+    - hosts: 127.0.0.1
+      tasks:
+        - name: vendored task
+          ping:
+          tags: test
+
+    ## vendor/test_playbook.yml
+    - hosts: 127.0.0.1
+      tasks:
+        - name: task1
+          ping:
+          tags: test
+    ''')
+
+    stdout = subprocess.check_output(
+        ['goodplay', '--collect-only', '--prune', 'vendor/roles'], cwd=str(tmpdir))
+
+    assert b"<GoodplayTest 'task1'>" in stdout
+    assert b"vendored task" not in stdout
+
+
+def test_goodplay_list_writes_node_ids(tmpdir):
+    smart_create(tmpdir, '''
+    ## playbooks/inventory
+    127.0.0.1 ansible_connection=local
+
+    ## playbooks/test_playbook.yml
+    - hosts: 127.0.0.1
+      tasks:
+        - name: task1
+          ping:
+          tags: test
+        - name: task2
+          ping:
+          tags: test
+    ''')
+
+    stdout = subprocess.check_output(['goodplay', 'list'], cwd=str(tmpdir))
+
+    assert stdout.splitlines() == [
+        b'playbooks/test_playbook.yml::task1',
+        b'playbooks/test_playbook.yml::task2',
+    ]
+
+
+def test_goodplay_list_writes_node_ids_only_when_collecting_in_parallel(tmpdir):
+    smart_create(tmpdir, '''
+    ## inventory
+    127.0.0.1 ansible_connection=local
+
+    ## test_playbook1.yml
+    - hosts: 127.0.0.1
+      tasks:
+        - name: task1
+          ping:
+          tags: test
+
+    ## test_playbook2.yml
+    - hosts: 127.0.0.1
+      tasks:
+        - name: task2
+          ping:
+          tags: test
+    ''')
+
+    stdout = subprocess.check_output(
+        ['goodplay', 'list', '--collect-workers=2'], cwd=str(tmpdir))
+
+    assert stdout.splitlines() == [b'test_playbook1.yml::task1', b'test_playbook2.yml::task2']
+
+
+def test_goodplay_list_writes_json_line_per_playbook(tmpdir):
+    smart_create(tmpdir, '''
+    ## inventory
+    127.0.0.1 ansible_connection=local
+
+    ## docker-compose.centos.yml
+    version: "2"
+
+    ## docker-compose.ubuntu.yml
+    version: "2"
+
+    ## test_playbook.yml
+    - hosts: 127.0.0.1
+      tasks:
+        - name: task1
+          ping:
+          tags: test
+
+    ## test_other_playbook.yml
+    - hosts: 127.0.0.1
+      tasks:
+        - name: task2
+          ping:
+          tags: test
+    ''')
+
+    stdout = subprocess.check_output(['goodplay', 'list', '--json'], cwd=str(tmpdir))
+
+    assert [json.loads(line.decode('utf-8')) for line in stdout.splitlines()] == [
+        dict(playbook='test_other_playbook.yml',
+             environments=['centos', 'ubuntu'], tasks=['task2']),
+        dict(playbook='test_playbook.yml',
+             environments=['centos', 'ubuntu'], tasks=['task1']),
+    ]
+
+
+def test_goodplay_list_reads_ini_file_given_to_pytest(tmpdir):
+    smart_create(tmpdir, '''
+    ## ci.ini
+    [pytest]
+    goodplay_prune = vendor
+
+    ## inventory
+    127.0.0.1 ansible_connection=local
+
+    ## test_playbook.yml
+    - hosts: 127.0.0.1
+      tasks:
+        - name: task1
+          ping:
+          tags: test
+
+    ## vendor/inventory
+    127.0.0.1 ansible_connection=local
+
+    ## vendor/test_playbook.yml
+    - hosts: 127.0.0.1
+      tasks:
+        - name: vendored task
+          ping:
+          tags: test
+    ''')
+
+    stdout = subprocess.check_output(['goodplay', 'list', '-c', 'ci.ini'], cwd=str(tmpdir))
+
+    assert stdout.splitlines() == [b'test_playbook.yml::task1']
+
+
+def test_goodplay_list_reports_usage_errors_like_pytest(tmpdir):
+    process = subprocess.Popen(
+        ['goodplay', 'list', '--unknown-option'], cwd=str(tmpdir), stderr=subprocess.PIPE)
+    _, stderr = process.communicate()
+
+    assert process.returncode == 4
+    assert b'--unknown-option' in stderr
+
+
+def test_goodplay_list_reports_errors(tmpdir):
+    smart_create(tmpdir, '''
+    ## inventory
+    127.0.0.1 ansible_connection=local
+
+    ## test_playbook.yml
+    - hosts: 127.0.0.1
+      tasks:
+        - name: task1
+          unknownmodule:
+          tags: test
+    ''')
+
+    process = subprocess.Popen(
+        ['goodplay', 'list', '--json'], cwd=str(tmpdir), stdout=subprocess.PIPE)
+    stdout, _ = process.communicate()
+    entry = json.loads(stdout.decode('utf-8'))
+
+    assert process.returncode == 1
+    assert entry['playbook'] == 'test_playbook.yml'
+    assert 'no action detected in task' in entry['error']
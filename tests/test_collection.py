@@ -1,5 +1,11 @@
 # -*- coding: utf-8 -*-
 
+import logging
+
+from goodplay import collection
+from goodplay.ansible_support.role_store import RoleStore, default_store_path
+from goodplay.session import GoodplaySession
+
 from goodplay_helpers import smart_create
 
 
@@ -658,3 +664,444 @@ def test_ignore_test_tasks_in_always_block(testdir):
     items, result = testdir.inline_genitems()
     result.assertoutcome()
     assert len(items) == 0
+
+
+def test_play_tags_are_inherited_by_tasks(testdir):
+    smart_create(testdir.tmpdir, '''
+    ## inventory
+    127.0.0.1 ansible_connection=local
+
+    ## test_playbook.yml
+    - hosts: 127.0.0.1
+      tags: test
+      tasks:
+        - name: task1
+          ping:
+    ''')
+
+    items, result = testdir.inline_genitems()
+    result.assertoutcome()
+    assert len(items) == 1
+    assert items[0].name == 'task1'
+
+
+def test_ignore_test_tasks_tagged_never(testdir):
+    smart_create(testdir.tmpdir, '''
+    ## inventory
+    127.0.0.1 ansible_connection=local
+
+    ## test_playbook.yml
+    - hosts: 127.0.0.1
+      tasks:
+        - name: task1
+          ping:
+          tags: [test, never]
+    ''')
+
+    items, result = testdir.inline_genitems()
+    result.assertoutcome()
+    assert len(items) == 0
+
+
+def test_collect_test_tasks_from_imported_tasks_file(testdir):
+    smart_create(testdir.tmpdir, '''
+    ## inventory
+    127.0.0.1 ansible_connection=local
+
+    ## test_playbook.yml
+    - hosts: 127.0.0.1
+      tasks:
+        - import_tasks: tasks/imported.yml
+
+    ## tasks/imported.yml
+    - name: task1
+      ping:
+      tags: test
+    ''')
+
+    items, result = testdir.inline_genitems()
+    result.assertoutcome()
+    assert len(items) == 1
+    assert items[0].name == 'task1'
+
+
+def test_task_listing_is_cached_between_collections(testdir, caplog):
+    smart_create(testdir.tmpdir, '''
+    ## inventory
+    127.0.0.1 ansible_connection=local
+
+    ## test_playbook.yml
+    - hosts: 127.0.0.1
+      tasks:
+        - name: task1
+          ping:
+          tags: test
+    ''')
+
+    testdir.inline_genitems()
+    caplog.clear()
+
+    items, result = testdir.inline_genitems()
+    result.assertoutcome()
+    assert len(items) == 1
+    assert items[0].name == 'task1'
+    assert not [message for message in caplog.messages if message.startswith('discover tasks')]
+
+
+def test_task_listing_is_cached_per_playbook_within_same_directory(testdir):
+    smart_create(testdir.tmpdir, '''
+    ## inventory
+    127.0.0.1 ansible_connection=local
+
+    ## test_playbook1.yml
+    - hosts: 127.0.0.1
+      tasks:
+        - name: task1
+          ping:
+          tags: test
+
+    ## test_playbook2.yml
+    - hosts: 127.0.0.1
+      tasks:
+        - name: task2
+          ping:
+          tags: test
+    ''')
+
+    testdir.inline_genitems()
+
+    items, _ = testdir.inline_genitems()
+    assert [item.name for item in items] == ['task1', 'task2']
+
+
+def test_task_listing_cache_is_invalidated_on_playbook_change(testdir):
+    smart_create(testdir.tmpdir, '''
+    ## inventory
+    127.0.0.1 ansible_connection=local
+
+    ## test_playbook.yml
+    - hosts: 127.0.0.1
+      tasks:
+        - name: task1
+          ping:
+          tags: test
+    ''')
+
+    testdir.inline_genitems()
+
+    testdir.tmpdir.join('test_playbook.yml').write('''
+- hosts: 127.0.0.1
+  tasks:
+    - name: task2
+      ping:
+      tags: test
+''')
+
+    items, result = testdir.inline_genitems()
+    result.assertoutcome()
+    assert len(items) == 1
+    assert items[0].name == 'task2'
+
+
+def test_parallel_collection_collects_playbooks_in_deterministic_order(testdir):
+    smart_create(testdir.tmpdir, '''
+    ## dir1/inventory
+    127.0.0.1 ansible_connection=local
+
+    ## dir1/test_playbook.yml
+    - hosts: 127.0.0.1
+      tasks:
+        - name: task1
+          ping:
+          tags: test
+
+    ## dir2/inventory
+    127.0.0.1 ansible_connection=local
+
+    ## dir2/test_playbook.yml
+    - hosts: 127.0.0.1
+      tasks:
+        - name: task2
+          ping:
+          tags: test
+
+    ## dir3/test_playbook.yml
+    - hosts: 127.0.0.1
+      tasks:
+        - name: task3
+          ping:
+          tags: test
+    ''')
+
+    items, result = testdir.inline_genitems('--collect-workers=2')
+    result.assertoutcome()
+    assert [item.name for item in items] == ['task1', 'task2']
+
+
+def test_parallel_collection_uses_prefetched_test_tasks(testdir, caplog):
+    smart_create(testdir.tmpdir, '''
+    ## inventory
+    127.0.0.1 ansible_connection=local
+
+    ## test_playbook.yml
+    - hosts: 127.0.0.1
+      tasks:
+        - name: task1
+          ping:
+          tags: test
+    ''')
+
+    # without cache the test tasks are discovered by the workers only
+    items, result = testdir.inline_genitems(
+        '--collect-workers=2', '-p', 'no:cacheprovider')
+
+    assert [item.name for item in items] == ['task1']
+    assert not [message for message in caplog.messages
+                if message.startswith(('discover tasks', 'prefetching'))
+                and not message.startswith('prefetching 1 potential')]
+
+
+def prefetch_in_process(testdir, options, monkeypatch):
+    monkeypatch.setattr(collection, 'worker_session', None)
+    collection.init_worker(GoodplaySession().fs_index, options)
+
+    return collection.prefetch_playbook(
+        (testdir.tmpdir.join('test_playbook.yml'), options, None))
+
+
+def test_prefetch_worker_is_given_all_goodplay_options(testdir, monkeypatch):
+    smart_create(testdir.tmpdir, '''
+    ## inventory
+    127.0.0.1 ansible_connection=local
+
+    ## test_playbook.yml
+    - hosts: 127.0.0.1
+      tasks:
+        - name: task1
+          ping:
+          tags: test
+    ''')
+    config = testdir.parseconfig(testdir.tmpdir)
+    options = dict(vars(config.option))
+
+    prefetched = prefetch_in_process(testdir, options, monkeypatch)
+
+    assert options['role_store_budget'] == 1024
+    assert [task.name for task in prefetched.ctx_values['test_tasks']] == ['task1']
+
+
+def test_prefetch_worker_failure_is_logged_as_warning(testdir, monkeypatch, caplog):
+    smart_create(testdir.tmpdir, '''
+    ## inventory
+    127.0.0.1 ansible_connection=local
+
+    ## test_playbook.yml
+    - hosts: 127.0.0.1
+      tasks: []
+    ''')
+
+    # options lacking use_local_roles
+    prefetched = prefetch_in_process(testdir, {}, monkeypatch)
+
+    assert 'test_tasks' not in prefetched.ctx_values
+    assert [record for record in caplog.records
+            if record.levelno == logging.WARNING and record.getMessage().startswith('prefetching')]
+
+
+def test_parallel_collection_forwards_ansible_error_message(testdir):
+    smart_create(testdir.tmpdir, '''
+    ## inventory
+    127.0.0.1 ansible_connection=local
+
+    ## test_playbook.yml
+    - hosts: 127.0.0.1
+      tasks:
+        - name: task1
+          unknownmodule:
+          tags: test
+    ''')
+
+    _, result = testdir.inline_genitems('--collect-workers=2')
+    result.assertoutcome(failed=1)
+
+    assert 'ERROR! no action detected in task' \
+        in str(result.getfailures()[0].longrepr)
+
+
+def test_collection_does_not_install_dependencies(testdir, caplog):
+    smart_create(testdir.tmpdir, '''
+    ## external-role-base/role1.tar.gz
+    #### role1/meta/main.yml
+    galaxy_info:
+      author: John Doe
+    dependencies: []
+
+    #### role1/tasks/main.yml
+    - name: role1 task
+      ping:
+
+    ## local-role-base/role2/meta/main.yml
+    galaxy_info:
+      author: John Doe
+    dependencies:
+      - name: role1
+        src: external-role-base/role1.tar.gz
+
+    ## local-role-base/role2/tasks/main.yml
+    - name: role2 task
+      ping:
+
+    ## local-role-base/role2/tests/inventory
+    127.0.0.1 ansible_connection=local
+
+    ## local-role-base/role2/tests/requirements.yml
+    - name: role3
+      src: external-role-base/role3.tar.gz
+
+    ## local-role-base/role2/tests/test_playbook.yml
+    - hosts: 127.0.0.1
+      gather_facts: no
+      roles:
+        - role: role2
+        - role: role3
+
+    - hosts: 127.0.0.1
+      gather_facts: no
+      tasks:
+        - name: task1
+          ping:
+          tags: test
+    ''')
+
+    items, result = testdir.inline_genitems()
+    result.assertoutcome()
+    assert [item.name for item in items] == ['task1']
+    assert not [message for message in caplog.messages if message.startswith('installing role')]
+    assert not default_store_path().check()
+
+
+def test_collection_discovers_dependencies_kept_in_role_store(testdir):
+    smart_create(testdir.tmpdir, '''
+    ## external-role-base/role1.tar.gz
+    #### role1/meta/main.yml
+    galaxy_info:
+      author: John Doe
+    dependencies: []
+
+    #### role1/defaults/main.yml
+    role1_tasks_file: extra.yml
+
+    #### role1/tasks/main.yml
+    - name: role1 test task
+      ping:
+      tags: test
+    - import_tasks: "{{ role1_tasks_file }}"
+
+    #### role1/tasks/extra.yml
+    - name: role1 extra test task
+      ping:
+      tags: test
+
+    ## role2/meta/main.yml
+    galaxy_info:
+      author: John Doe
+    dependencies:
+      - name: role1
+        src: external-role-base/role1.tar.gz
+
+    ## role2/tasks/main.yml
+    - ping:
+
+    ## role2/tests/inventory
+    127.0.0.1 ansible_connection=local
+
+    ## role2/tests/test_playbook.yml
+    - hosts: 127.0.0.1
+      gather_facts: no
+      roles:
+        - role: role2
+      tasks:
+        - name: task1
+          ping:
+          tags: test
+    ''')
+    requirement = dict(name='role1', src='external-role-base/role1.tar.gz')
+
+    with testdir.tmpdir.as_cwd():
+        items_before_install, _ = testdir.inline_genitems()
+        RoleStore(default_store_path()).ensure(requirement)
+
+    items, result = testdir.inline_genitems()
+
+    result.assertoutcome()
+    assert [item.name for item in items_before_install] == ['task1']
+    assert [item.name for item in items] == [
+        'role1 : role1 test task', 'role1 : role1 extra test task', 'task1']
+
+
+def create_role_depending_on_stored_role(testdir):
+    smart_create(testdir.tmpdir, '''
+    ## external-role-base/role1.tar.gz
+    #### role1/meta/main.yml
+    galaxy_info:
+      author: John Doe
+    dependencies: []
+
+    #### role1/tasks/main.yml
+    - name: role1 test task
+      ping:
+      tags: test
+
+    ## role2/meta/main.yml
+    galaxy_info:
+      author: John Doe
+    dependencies:
+      - name: role1
+        src: external-role-base/role1.tar.gz
+
+    ## role2/tasks/main.yml
+    - ping:
+
+    ## role2/tests/inventory
+    127.0.0.1 ansible_connection=local
+
+    ## role2/tests/test_playbook.yml
+    - hosts: 127.0.0.1
+      gather_facts: no
+      roles:
+        - role: role2
+      tasks:
+        - name: task1
+          ping:
+          tags: test
+    ''')
+    store_path = testdir.tmpdir.join('store')
+
+    with testdir.tmpdir.as_cwd():
+        RoleStore(store_path).ensure(
+            dict(name='role1', src='external-role-base/role1.tar.gz'))
+
+    return '--role-store={0}'.format(store_path)
+
+
+def test_parallel_collection_discovers_dependencies_kept_in_role_store(testdir):
+    role_store_arg = create_role_depending_on_stored_role(testdir)
+
+    items, result = testdir.inline_genitems(
+        '--collect-workers=2', role_store_arg, '-p', 'no:cacheprovider')
+
+    result.assertoutcome()
+    assert [item.name for item in items] == ['role1 : role1 test task', 'task1']
+
+
+def test_prefetch_and_collection_agree_on_task_listing_cache_key(testdir, caplog):
+    role_store_arg = create_role_depending_on_stored_role(testdir)
+
+    testdir.inline_genitems('--collect-workers=2', role_store_arg)
+    caplog.clear()
+
+    items, result = testdir.inline_genitems(role_store_arg)
+
+    result.assertoutcome()
+    assert [item.name for item in items] == ['role1 : role1 test task', 'task1']
+    assert not [message for message in caplog.messages if message.startswith('discover tasks')]
@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+
+import subprocess
+
+from goodplay.collection import OptionsConfig
+from goodplay.context import GoodplayContext
+from goodplay.session import GoodplaySession
+from goodplay_helpers import smart_create
+
+
+def dependency_paths(playbook_path):
+    config = OptionsConfig(dict(use_local_roles=False), GoodplaySession())
+
+    return GoodplayContext(playbook_path, config).dependency_paths
+
+
+def test_includes_and_roles_are_dependencies(tmpdir):
+    smart_create(tmpdir, '''
+    ## inventory
+    127.0.0.1 ansible_connection=local
+
+    ## test_playbook.yml
+    - import_playbook: other_playbook.yml
+    - hosts: 127.0.0.1
+      roles:
+        - role1
+      tasks:
+        - block:
+            - include_tasks: tasks/included.yml
+        - include_role:
+            name: role2
+
+    ## other_playbook.yml
+    - hosts: 127.0.0.1
+      vars_files:
+        - vars.yml
+
+    ## tasks/included.yml
+    - import_tasks: nested.yml
+
+    ## tasks/nested.yml
+    - ping:
+
+    ## roles/role1/meta/main.yml
+    dependencies:
+      - role: role3
+
+    ## roles/role2/tasks/main.yml
+    - ping:
+
+    ## roles/role3/tasks/main.yml
+    - ping:
+
+    ## roles/unused/tasks/main.yml
+    - ping:
+    ''')
+
+    assert dependency_paths(tmpdir.join('test_playbook.yml')) == set([
+        tmpdir.join('inventory'),
+        tmpdir.join('test_playbook.yml'),
+        tmpdir.join('other_playbook.yml'),
+        tmpdir.join('vars.yml'),
+        tmpdir.join('tasks', 'included.yml'),
+        tmpdir.join('tasks', 'nested.yml'),
+        tmpdir.join('roles', 'role1'),
+        tmpdir.join('roles', 'role2'),
+        tmpdir.join('roles', 'role3'),
+    ])
+
+
+def test_templated_include_depends_on_whole_directory(tmpdir):
+    smart_create(tmpdir, '''
+    ## inventory
+    127.0.0.1 ansible_connection=local
+
+    ## test_playbook.yml
+    - hosts: 127.0.0.1
+      tasks:
+        - include_tasks: "{{ tasks_file }}"
+    ''')
+
+    assert tmpdir in dependency_paths(tmpdir.join('test_playbook.yml'))
+
+
+def test_role_playbook_depends_on_role_and_its_local_dependencies(tmpdir):
+    smart_create(tmpdir, '''
+    ## role1/meta/main.yml
+    dependencies:
+      - role: role2
+      - src: https://example.com/installed.tar.gz
+
+    ## role1/tests/inventory
+    127.0.0.1 ansible_connection=local
+
+    ## role1/tests/test_playbook.yml
+    - hosts: 127.0.0.1
+      roles:
+        - role: role1
+
+    ## role2/tasks/main.yml
+    - include_role:
+        name: role3
+
+    ## role3/tasks/main.yml
+    - ping:
+    ''')
+
+    paths = dependency_paths(tmpdir.join('role1', 'tests', 'test_playbook.yml'))
+
+    assert set([tmpdir.join('role1'), tmpdir.join('role2'), tmpdir.join('role3')]) <= paths
+
+
+def git(tmpdir, *args):
+    subprocess.check_call(
+        ('git', '-c', 'user.name=goodplay', '-c', 'user.email=goodplay@localhost') + args,
+        cwd=str(tmpdir))
+
+
+def test_changed_since_only_collects_affected_playbooks(testdir):
+    smart_create(testdir.tmpdir, '''
+    ## playbooks1/inventory
+    127.0.0.1 ansible_connection=local
+
+    ## playbooks1/test_playbook.yml
+    - hosts: 127.0.0.1
+      gather_facts: no
+      tasks:
+        - name: task1
+          include_tasks: tasks.yml
+          tags: test
+
+    ## playbooks1/tasks.yml
+    - ping:
+
+    ## playbooks2/inventory
+    127.0.0.1 ansible_connection=local
+
+    ## playbooks2/test_playbook.yml
+    - hosts: 127.0.0.1
+      gather_facts: no
+      tasks:
+        - name: task2
+          ping:
+          tags: test
+    ''')
+    git(testdir.tmpdir, 'init', '-q')
+    git(testdir.tmpdir, 'add', '.')
+    git(testdir.tmpdir, 'commit', '-q', '-m', 'initial')
+
+    testdir.tmpdir.join('playbooks1', 'tasks.yml').write('- ping:\n- ping:\n')
+
+    items, _ = testdir.inline_genitems('--changed-since', 'HEAD')
+
+    assert [item.name for item in items] == ['task1']
+
+
+def test_changed_since_includes_untracked_playbooks(testdir):
+    git(testdir.tmpdir, 'init', '-q')
+    git(testdir.tmpdir, 'commit', '-q', '--allow-empty', '-m', 'initial')
+    smart_create(testdir.tmpdir, '''
+    ## inventory
+    127.0.0.1 ansible_connection=local
+
+    ## test_playbook.yml
+    - hosts: 127.0.0.1
+      tasks:
+        - name: task1
+          ping:
+          tags: test
+    ''')
+
+    items, _ = testdir.inline_genitems('--changed-since', 'HEAD')
+
+    assert [item.name for item in items] == ['task1']
+
+
+def test_changed_since_unknown_ref_is_usage_error(testdir):
+    git(testdir.tmpdir, 'init', '-q')
+
+    result = testdir.runpytest('--changed-since', 'unknown-ref')
+
+    assert 'unable to determine files changed since unknown-ref' in result.stderr.str()
+
+
+def create_playbook_with_dynamic_include(testdir):
+    smart_create(testdir.tmpdir, '''
+    ## playbooks/inventory
+    127.0.0.1 ansible_connection=local
+
+    ## playbooks/test_playbook.yml
+    - hosts: 127.0.0.1
+      gather_facts: no
+      vars:
+        shared_dir: "{{ playbook_dir }}/../shared"
+      tasks:
+        - include_tasks: "{{ shared_dir }}/tasks.yml"
+        - name: task1
+          ping:
+          tags: test
+
+    ## shared/tasks.yml
+    - ping:
+
+    ## unrelated/tasks.yml
+    - ping:
+    ''')
+
+
+def test_footprint_is_recorded_when_running_test_playbook(testdir):
+    create_playbook_with_dynamic_include(testdir)
+
+    testdir.inline_run().assertoutcome(passed=1)
+    git(testdir.tmpdir, 'init', '-q')
+    git(testdir.tmpdir, 'add', 'playbooks', 'shared', 'unrelated')
+    git(testdir.tmpdir, 'commit', '-q', '-m', 'initial')
+
+    testdir.tmpdir.join('shared', 'tasks.yml').write('- ping:\n- ping:\n')
+
+    static_items, _ = testdir.inline_genitems('--changed-since', 'HEAD')
+    recorded_items, _ = testdir.inline_genitems(
+        '--changed-since', 'HEAD', '--impact-analysis', 'recorded')
+
+    assert [item.name for item in static_items] == []
+    assert [item.name for item in recorded_items] == ['task1']
+
+
+def test_recorded_impact_analysis_ignores_unused_files(testdir):
+    create_playbook_with_dynamic_include(testdir)
+
+    testdir.inline_run().assertoutcome(passed=1)
+    git(testdir.tmpdir, 'init', '-q')
+    git(testdir.tmpdir, 'add', 'playbooks', 'shared', 'unrelated')
+    git(testdir.tmpdir, 'commit', '-q', '-m', 'initial')
+
+    testdir.tmpdir.join('unrelated', 'tasks.yml').write('- ping:\n- ping:\n')
+
+    items, _ = testdir.inline_genitems(
+        '--changed-since', 'HEAD', '--impact-analysis', 'recorded')
+
+    assert items == []
+
+
+def test_recorded_impact_analysis_selects_playbooks_never_run(testdir):
+    create_playbook_with_dynamic_include(testdir)
+
+    git(testdir.tmpdir, 'init', '-q')
+    git(testdir.tmpdir, 'add', 'playbooks', 'shared', 'unrelated')
+    git(testdir.tmpdir, 'commit', '-q', '-m', 'initial')
+
+    testdir.tmpdir.join('unrelated', 'tasks.yml').write('- ping:\n- ping:\n')
+
+    items, _ = testdir.inline_genitems(
+        '--changed-since', 'HEAD', '--impact-analysis', 'recorded')
+
+    assert [item.name for item in items] == ['task1']
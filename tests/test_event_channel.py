@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+import select
+import socket
+import threading
+
+import py.path
+import pytest
+
+from goodplay.ansible_support.event_channel import EventChannel, event_header
+
+from goodplay_helpers import smart_create
+
+
+@pytest.fixture
+def socket_path():
+    # unix domain socket paths are limited in length, thus pytest's temporary
+    # directories are avoided
+    temp_path = py.path.local.mkdtemp()
+    yield temp_path.join('events.sock')
+    temp_path.remove()
+
+
+def send_raw(path, *chunks):
+    sender = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sender.connect(path.strpath)
+
+    for chunk in chunks:
+        sender.sendall(chunk)
+
+    sender.close()
+
+
+def is_readable(fileobj):
+    return bool(select.select([fileobj], [], [], 0)[0])
+
+
+def wait_readable(fileobj):
+    select.select([fileobj], [], [])
+    return True
+
+
+def framed(payload):
+    return event_header.pack(len(payload)) + payload
+
+
+def test_events_are_received_in_order_until_connection_closes(socket_path):
+    channel = EventChannel(socket_path)
+    payloads = [b'{"event_name": "a", "data": {}}', b'{"event_name": "b", "data": {"x": 1}}']
+    sender = threading.Thread(target=send_raw, args=[channel.socket_path] + [
+        framed(payload) for payload in payloads])
+
+    sender.start()
+    events = list(channel.receive_events(wait_readable))
+    sender.join()
+    channel.close()
+
+    assert events == [dict(event_name='a', data={}), dict(event_name='b', data=dict(x=1))]
+    assert not channel.socket_path.check()
+
+
+def test_event_split_across_chunks_is_reassembled(socket_path):
+    channel = EventChannel(socket_path)
+    frame = framed(b'{"event_name": "a", "data": {}}')
+
+    send_raw(channel.socket_path, frame[:2], frame[2:10], frame[10:])
+    events = list(channel.receive_events(is_readable))
+    channel.close()
+
+    assert events == [dict(event_name='a', data={})]
+
+
+def test_truncated_event_ends_receiving(socket_path):
+    channel = EventChannel(socket_path)
+
+    send_raw(channel.socket_path, framed(b'{"event_name": "a", "data": {}}')[:-1])
+    events = list(channel.receive_events(is_readable))
+    channel.close()
+
+    assert events == []
+
+
+def test_receiving_ends_when_sender_exits_without_connecting(socket_path):
+    channel = EventChannel(socket_path)
+
+    events = list(channel.receive_events(is_readable))
+    channel.close()
+
+    assert events == []
+
+
+def test_events_are_not_written_to_ansible_output(testdir, caplog):
+    smart_create(testdir.tmpdir, '''
+    ## inventory
+    127.0.0.1 ansible_connection=local
+
+    ## test_playbook.yml
+    - hosts: 127.0.0.1
+      gather_facts: no
+      tasks:
+        - name: task1
+          ping:
+          tags: test
+    ''')
+
+    result = testdir.inline_run('-s', '-v')
+
+    result.assertoutcome(passed=1)
+    assert [message for message in caplog.messages if 'PLAY RECAP' in message]
+    assert not [message for message in caplog.messages if 'GOODPLAY =>' in message]
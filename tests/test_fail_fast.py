@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+import time
+
+import pytest
+
+from goodplay_helpers import smart_create
+
+runner_args_by_runner = [[], ['--executor=fork']]
+
+test_playbook = '''
+## inventory
+127.0.0.1 ansible_connection=local
+
+## test_playbook.yml
+- hosts: 127.0.0.1
+  gather_facts: no
+  tasks:
+    - name: task1
+      command: /bin/true
+      tags: test
+    - name: task2
+      command: sleep 60
+      tags: test
+    - name: task3
+      ping:
+      tags: test
+'''
+
+
+@pytest.mark.parametrize('runner_args', runner_args_by_runner)
+def test_run_is_stopped_once_pytest_stops_after_failures(testdir, caplog, runner_args):
+    smart_create(testdir.tmpdir, test_playbook)
+    started = time.time()
+
+    result = testdir.inline_run('-s', '-x', *runner_args)
+
+    result.assertoutcome(failed=1, skipped=2)
+    assert time.time() - started < 30
+    assert [message for message in caplog.messages
+            if message.endswith('test tasks not run: task2, task3')]
+
+
+def test_run_is_stopped_once_maxfail_is_reached(testdir):
+    smart_create(testdir.tmpdir, test_playbook)
+    started = time.time()
+
+    result = testdir.inline_run('-s', '--maxfail=1')
+
+    result.assertoutcome(failed=1, skipped=2)
+    assert time.time() - started < 30
+
+
+def test_test_tasks_not_run_are_reported_as_skipped(testdir):
+    smart_create(testdir.tmpdir, test_playbook)
+    junit_xml_path = testdir.tmpdir.join('junit.xml')
+
+    result = testdir.runpytest('-x', '-rs', '--junitxml', junit_xml_path.strpath)
+
+    result.stdout.fnmatch_lines([
+        '*test_playbook.yml: run of test playbook stopped before',
+        '*1 failed, 2 skipped*',
+    ])
+    assert junit_xml_path.read().count('<skipped') == 2
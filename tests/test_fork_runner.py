@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+
+import signal
+import sys
+import threading
+import time
+
+import pytest
+
+from goodplay.ansible_support.fork_runner import ForkPlaybookRunner, process_context
+from goodplay_helpers import smart_create
+
+skip_if_no_forkserver = pytest.mark.skipif(
+    sys.version_info < (3, 4),
+    reason='forkserver requires python 3.4 or later')
+
+runner_args_by_runner = [
+    [], ['--executor=fork'],
+    pytest.param(['--executor=forkserver'], marks=skip_if_no_forkserver)]
+
+
+@pytest.mark.parametrize('runner_args', runner_args_by_runner)
+def test_test_playbook_run_by_fork_executor_like_by_subprocess_executor(testdir, runner_args):
+    smart_create(testdir.tmpdir, '''
+    ## inventory
+    127.0.0.1 ansible_connection=local
+
+    ## test_playbook.yml
+    - hosts: 127.0.0.1
+      gather_facts: no
+      tasks:
+        - name: task1
+          ping:
+          tags: test
+        - name: task2
+          command: /bin/true
+          tags: test
+        - name: task3
+          ping:
+          when: False
+          tags: test
+    ''')
+
+    result = testdir.inline_run('-s', *runner_args)
+
+    result.assertoutcome(passed=1, failed=1, skipped=1)
+
+
+@pytest.mark.parametrize('runner_args', runner_args_by_runner)
+def test_error_within_run_is_reported_by_fork_executor_like_by_subprocess_executor(
+        testdir, runner_args):
+    smart_create(testdir.tmpdir, '''
+    ## inventory
+    127.0.0.1 ansible_connection=local
+
+    ## test_playbook.yml
+    - hosts: 127.0.0.1
+      gather_facts: no
+      tasks:
+        - name: failing task
+          fail:
+        - name: task1
+          ping:
+          tags: test
+    ''')
+
+    result = testdir.inline_run('-s', *runner_args)
+
+    result.assertoutcome(skipped=1, failed=1)
+
+
+@pytest.mark.parametrize('runner_args', runner_args_by_runner)
+def test_forked_run_applies_environment_of_run(testdir, runner_args):
+    smart_create(testdir.tmpdir, '''
+    ## inventory
+    127.0.0.1 ansible_connection=local
+
+    ## test_playbook.yml
+    - hosts: 127.0.0.1
+      gather_facts: no
+      tasks:
+        - name: task1
+          fail:
+          tags: test
+    ''')
+
+    result = testdir.inline_run('-s', *runner_args)
+
+    result.assertoutcome(failed=1)
+    # goodplay disables retry files via environment
+    assert not testdir.tmpdir.join('test_playbook.retry').check()
+
+
+@skip_if_no_forkserver
+def test_forked_run_output_is_logged_when_verbose(testdir, caplog):
+    smart_create(testdir.tmpdir, '''
+    ## inventory
+    127.0.0.1 ansible_connection=local
+
+    ## test_playbook.yml
+    - hosts: 127.0.0.1
+      gather_facts: no
+      tasks:
+        - name: task1
+          ping:
+          tags: test
+    ''')
+
+    result = testdir.inline_run('-s', '-v', '--executor=forkserver')
+
+    result.assertoutcome(passed=1)
+    assert [message for message in caplog.messages if 'PLAY RECAP' in message]
+
+
+@skip_if_no_forkserver
+def test_fork_executor_forks_from_forkserver_while_other_threads_run(testdir, caplog):
+    smart_create(testdir.tmpdir, '''
+    ## inventory
+    127.0.0.1 ansible_connection=local
+
+    ## test_playbook.yml
+    - hosts: 127.0.0.1
+      gather_facts: no
+      tasks:
+        - name: task1
+          ping:
+          tags: test
+    ''')
+    stop_event = threading.Event()
+    thread = threading.Thread(target=stop_event.wait)
+    thread.start()
+
+    try:
+        result = testdir.inline_run('-s', '--executor=fork')
+    finally:
+        stop_event.set()
+        thread.join()
+
+    result.assertoutcome(passed=1)
+    assert [message for message in caplog.messages
+            if message.startswith('forking run from forkserver')]
+
+
+def ignore_sigterm_forever():
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+    while True:
+        time.sleep(1)
+
+
+def test_terminate_kills_run_ignoring_sigterm(monkeypatch):
+    monkeypatch.setattr(ForkPlaybookRunner, 'terminate_timeout', 1)
+    runner = ForkPlaybookRunner.__new__(ForkPlaybookRunner)
+    runner.process = process_context('fork').Process(target=ignore_sigterm_forever)
+    runner.process.start()
+    runner.output_reader = threading.Thread(target=lambda: None)
+    runner.output_reader.start()
+    # give the child a moment to ignore SIGTERM
+    time.sleep(0.5)
+    started = time.time()
+
+    runner.terminate()
+
+    assert runner.process.exitcode == -signal.SIGKILL
+    assert time.time() - started < 10
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+from goodplay.utils.fsindex import FilesystemIndex
+
+
+def test_isfile_answered_from_index(tmpdir):
+    tmpdir.join('dir1', 'file1').ensure()
+
+    fs_index = FilesystemIndex([tmpdir])
+
+    assert fs_index.isfile(tmpdir.join('dir1', 'file1'))
+    assert not fs_index.isfile(tmpdir.join('dir1'))
+    assert not fs_index.isfile(tmpdir.join('dir1', 'file2'))
+
+
+def test_isdir_answered_from_index(tmpdir):
+    tmpdir.join('dir1', 'file1').ensure()
+
+    fs_index = FilesystemIndex([tmpdir])
+
+    assert fs_index.isdir(tmpdir.join('dir1'))
+    assert not fs_index.isdir(tmpdir.join('dir1', 'file1'))
+    assert not fs_index.exists(tmpdir.join('dir2'))
+
+
+def test_index_is_not_updated_after_walk(tmpdir):
+    fs_index = FilesystemIndex([tmpdir])
+
+    tmpdir.join('file1').ensure()
+
+    assert not fs_index.isfile(tmpdir.join('file1'))
+
+
+def test_paths_outside_of_index_are_looked_up_on_disk(tmpdir):
+    tmpdir.join('outside', 'file1').ensure()
+    tmpdir.join('inside').ensure(dir=True)
+
+    fs_index = FilesystemIndex([tmpdir.join('inside')])
+
+    assert fs_index.isfile(tmpdir.join('outside', 'file1'))
+    assert fs_index.isdir(tmpdir.join('outside'))
+
+
+def test_paths_within_non_recursed_dirs_are_looked_up_on_disk(tmpdir):
+    tmpdir.join('skipped', 'file1').ensure()
+
+    fs_index = FilesystemIndex([tmpdir], lambda path: path.basename != 'skipped')
+
+    assert fs_index.isdir(tmpdir.join('skipped'))
+    assert fs_index.isfile(tmpdir.join('skipped', 'file1'))
+    assert list(fs_index.visit_files(tmpdir, 'file*')) == []
+
+
+def test_listdir_returns_sorted_filtered_paths(tmpdir):
+    tmpdir.join('b.yml').ensure()
+    tmpdir.join('a.yml').ensure()
+    tmpdir.join('c.txt').ensure()
+
+    fs_index = FilesystemIndex([tmpdir])
+
+    assert fs_index.listdir(tmpdir, lambda path: path.ext == '.yml') == \
+        [tmpdir.join('a.yml'), tmpdir.join('b.yml')]
+
+
+def test_visit_files_matches_pattern_below_root_path(tmpdir):
+    tmpdir.join('dir1', 'test_playbook.yml').ensure()
+    tmpdir.join('dir2', 'test_playbook.yml').ensure()
+    tmpdir.join('dir2', 'playbook.yml').ensure()
+
+    fs_index = FilesystemIndex([tmpdir])
+
+    assert list(fs_index.visit_files(tmpdir.join('dir2'), 'test_*.yml')) == \
+        [tmpdir.join('dir2', 'test_playbook.yml')]
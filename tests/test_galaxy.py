@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from goodplay.ansible_support import galaxy
+
+from goodplay_helpers import smart_create
+
+
+def test_dependencies_are_installed_as_pinned_and_returned(tmpdir):
+    dependency = create_role_archive(tmpdir, 'role1')
+    requirement = create_role_archive(
+        tmpdir, 'role2', '[{{name: role1, src: "{0}"}}]'.format(tmpdir.join('missing.tar.gz')))
+    roles_path = tmpdir.ensure('roles', dir=True)
+
+    dependencies = galaxy.install_roles(
+        [requirement], roles_path, pin_dependency=lambda requirement: dependency)
+
+    assert dependencies == [dependency]
+    assert roles_path.join('role1').check(dir=True)
+
+
+@pytest.mark.parametrize('versions, expected', [
+    (['1.2.0', '1.10.0', '1.9'], '1.10.0'),
+    ([], None),
+])
+def test_latest_version(versions, expected):
+    assert galaxy.latest_version(versions) == expected
+
+
+def create_role_archive(base_path, role_name, dependencies='[]'):
+    smart_create(base_path, '''
+    ## {0}.tar.gz
+    #### {0}/meta/main.yml
+    galaxy_info:
+      author: John Doe
+    dependencies: {1}
+
+    #### {0}/tasks/main.yml
+    - ping:
+    '''.format(role_name, dependencies))
+
+    return dict(name=role_name, src=base_path.join(role_name + '.tar.gz').strpath)
+
+
+def test_roles_are_installed_in_process_logging_galaxy_progress(tmpdir, caplog):
+    requirement = create_role_archive(tmpdir, 'role1')
+    roles_path = tmpdir.ensure('roles', dir=True)
+
+    galaxy.install_roles([requirement], roles_path)
+
+    assert roles_path.join('role1', 'tasks', 'main.yml').check(file=True)
+    assert [record.name for record in caplog.records
+            if record.getMessage() == '- role1 was installed successfully'] == \
+        ['goodplay.ansible_support.galaxy']
+
+
+def test_galaxy_display_is_restored_after_installing(tmpdir):
+    original_displays = [module.display for module in galaxy.galaxy_modules]
+
+    galaxy.install_roles([create_role_archive(tmpdir, 'role1')], tmpdir.ensure('roles', dir=True))
+
+    assert [module.display for module in galaxy.galaxy_modules] == original_displays
+
+
+def test_roles_are_reinstalled_when_already_installed(tmpdir):
+    requirement = create_role_archive(tmpdir, 'role1')
+    roles_path = tmpdir.ensure('roles', dir=True)
+    galaxy.install_roles([requirement], roles_path)
+    roles_path.join('role1', 'stale.yml').write('')
+
+    galaxy.install_roles([requirement], roles_path)
+
+    assert not roles_path.join('role1', 'stale.yml').check()
+
+
+def test_failed_role_is_reported_with_source_and_reason(tmpdir):
+    roles_path = tmpdir.ensure('roles', dir=True)
+    requirement = dict(name='role1', src=tmpdir.join('missing.tar.gz').strpath, version='1.0')
+
+    with pytest.raises(galaxy.RoleInstallError) as excinfo:
+        galaxy.install_roles([create_role_archive(tmpdir, 'role2'), requirement], roles_path)
+
+    failures = excinfo.value.failures
+    assert [(failure.name, failure.src, failure.version) for failure in failures] == \
+        [('role1', requirement['src'], '1.0')]
+    assert failures[0].reason
+    assert 'role1 (1.0) from {0}'.format(requirement['src']) in str(excinfo.value)
+    assert roles_path.join('role2').check(dir=True)
+
+
+def test_failed_role_is_ignored_when_asked_to(tmpdir):
+    roles_path = tmpdir.ensure('roles', dir=True)
+
+    galaxy.install_roles(
+        [dict(name='role1', src=tmpdir.join('missing.tar.gz').strpath)], roles_path,
+        ignore_errors=True)
+
+    assert not roles_path.listdir()
+
+
+def test_included_requirements_are_installed(tmpdir, monkeypatch):
+    requirement = create_role_archive(tmpdir, 'role1')
+    tmpdir.join('requirements.yml').write(
+        '- name: role1\n  src: {0}\n'.format(requirement['src']))
+    roles_path = tmpdir.ensure('roles', dir=True)
+    monkeypatch.chdir(tmpdir)
+
+    galaxy.install_roles([dict(include='requirements.yml')], roles_path)
+
+    assert roles_path.join('role1').check(dir=True)
+
+
+def test_dependencies_of_installed_roles_are_installed(tmpdir):
+    dependency = create_role_archive(tmpdir, 'role1')
+    requirement = create_role_archive(
+        tmpdir, 'role2', '[{{name: role1, src: "{0}"}}]'.format(dependency['src']))
+    roles_path = tmpdir.ensure('roles', dir=True)
+
+    galaxy.install_roles([requirement], roles_path)
+
+    assert roles_path.join('role1').check(dir=True)
+    assert roles_path.join('role2').check(dir=True)
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+import subprocess
+
+from goodplay.utils.gitignore import GitignoreMatcher
+
+
+def git(tmpdir, *args):
+    subprocess.check_call(('git',) + args, cwd=str(tmpdir))
+
+
+def test_paths_outside_of_git_work_tree_are_not_ignored(tmpdir):
+    tmpdir.join('.gitignore').write('build\n')
+
+    assert not GitignoreMatcher().is_ignored(tmpdir.join('build'), True)
+
+
+def test_last_matching_rule_wins(tmpdir):
+    git(tmpdir, 'init', '--quiet')
+    tmpdir.join('.gitignore').write('build*\n!build2\n')
+    tmpdir.ensure('build1', 'file')
+    tmpdir.ensure('build2', 'file')
+
+    matcher = GitignoreMatcher()
+
+    assert matcher.is_ignored(tmpdir.join('build1'), True)
+    assert matcher.is_ignored(tmpdir.join('build1', 'file'), False)
+    assert not matcher.is_ignored(tmpdir.join('build2'), True)
+
+
+def test_deeper_gitignore_files_take_precedence(tmpdir):
+    git(tmpdir, 'init', '--quiet')
+    tmpdir.join('.gitignore').write('build\n')
+    tmpdir.join('sub', '.gitignore').write('!build\n', ensure=True)
+    tmpdir.ensure('other', 'build', 'file')
+    tmpdir.ensure('sub', 'build', 'file')
+
+    matcher = GitignoreMatcher()
+
+    assert matcher.is_ignored(tmpdir.join('other', 'build'), True)
+    assert not matcher.is_ignored(tmpdir.join('sub', 'build'), True)
+
+
+def test_gitignore_files_above_work_tree_are_not_considered(tmpdir):
+    tmpdir.join('.gitignore').write('build\n')
+    git(tmpdir.ensure('repo', dir=True), 'init', '--quiet')
+    tmpdir.ensure('repo', 'build', 'file')
+
+    assert not GitignoreMatcher().is_ignored(tmpdir.join('repo', 'build'), True)
+
+
+def test_excludes_of_repository_and_user_are_considered(tmpdir):
+    git(tmpdir, 'init', '--quiet')
+    tmpdir.join('.git', 'info', 'exclude').write('build\n', ensure=True)
+    tmpdir.join('excludes').write('*.retry\n')
+    git(tmpdir, 'config', 'core.excludesFile', tmpdir.join('excludes').strpath)
+    tmpdir.ensure('build', 'file')
+    tmpdir.ensure('site.retry')
+
+    matcher = GitignoreMatcher()
+
+    assert matcher.is_ignored(tmpdir.join('build'), True)
+    assert matcher.is_ignored(tmpdir.join('site.retry'), False)
+
+
+def test_tracked_files_are_not_ignored(tmpdir):
+    git(tmpdir, 'init', '--quiet')
+    tmpdir.ensure('vendor', 'tracked.yml')
+    git(tmpdir, 'add', 'vendor/tracked.yml')
+    tmpdir.join('.gitignore').write('vendor/\n')
+    tmpdir.ensure('vendor', 'untracked.yml')
+
+    matcher = GitignoreMatcher()
+
+    assert not matcher.is_ignored(tmpdir.join('vendor'), True)
+    assert not matcher.is_ignored(tmpdir.join('vendor', 'tracked.yml'), False)
+    assert matcher.is_ignored(tmpdir.join('vendor', 'untracked.yml'), False)
+
+
+def test_paths_created_after_listing_are_checked_by_git(tmpdir):
+    git(tmpdir, 'init', '--quiet')
+    tmpdir.join('.gitignore').write('*.retry\n')
+
+    matcher = GitignoreMatcher()
+
+    assert not matcher.is_ignored(tmpdir.join('site.yml'), False)
+
+    tmpdir.ensure('site.retry')
+    tmpdir.ensure('site.yml')
+
+    assert matcher.is_ignored(tmpdir.join('site.retry'), False)
+    assert not matcher.is_ignored(tmpdir.join('site.yml'), False)
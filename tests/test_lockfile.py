@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+
+import subprocess
+
+import yaml
+
+from goodplay.ansible_support.lockfile import Lockfile
+from goodplay.ansible_support.role_store import file_digest
+
+from goodplay_helpers import smart_create
+
+
+def git(tmpdir, *args):
+    subprocess.check_call(
+        ('git', '-c', 'user.name=goodplay', '-c', 'user.email=goodplay@localhost') + args,
+        cwd=str(tmpdir))
+
+
+def commit_role_repository(repository_path, marker_name, dependencies='[]'):
+    smart_create(repository_path, '''
+    ## meta/main.yml
+    galaxy_info:
+      author: John Doe
+    dependencies: {1}
+
+    ## tasks/main.yml
+    - file:
+        path: "{{{{ playbook_dir }}}}/.{0}.run"
+        state: touch
+    '''.format(marker_name, dependencies))
+
+    if not repository_path.join('.git').check():
+        git(repository_path, 'init', '-q')
+        git(repository_path, 'symbolic-ref', 'HEAD', 'refs/heads/master')
+
+    git(repository_path, 'add', '.')
+    git(repository_path, 'commit', '-q', '-m', marker_name)
+
+
+def create_role_depending_on_repository(testdir, version='master', marker_name='first'):
+    repository_path = testdir.tmpdir.join('role1-repo')
+    commit_role_repository(repository_path, 'first')
+
+    smart_create(testdir.tmpdir, '''
+    ## role2/meta/main.yml
+    galaxy_info:
+      author: John Doe
+    dependencies:
+      - name: role1
+        src: git+file://{repository}
+        {version}
+
+    ## role2/tasks/main.yml
+    - ping:
+
+    ## role2/tests/inventory
+    127.0.0.1 ansible_connection=local
+
+    ## role2/tests/test_playbook.yml
+    - hosts: 127.0.0.1
+      gather_facts: no
+      roles:
+        - role: role2
+
+    - hosts: 127.0.0.1
+      gather_facts: no
+      tasks:
+        - name: assert first version of role1 run
+          file:
+            path: "{{ playbook_dir }}/.{marker}.run"
+            state: file
+          tags: test
+    '''.replace('{repository}', repository_path.strpath)
+       .replace('{version}', 'version: ' + version if version else '')
+       .replace('{marker}', marker_name))
+
+    return repository_path
+
+
+def test_lockfile_records_resolved_commit(testdir):
+    repository_path = create_role_depending_on_repository(testdir)
+    commit_id = subprocess.check_output(
+        ['git', 'rev-parse', 'HEAD'], cwd=str(repository_path)).decode('utf-8').strip()
+
+    result = testdir.inline_run('-s')
+    result.assertoutcome(passed=1)
+
+    lockfile_content = yaml.safe_load(
+        testdir.tmpdir.join('role2', 'meta', 'main.yml.lock').read())
+    assert [(role['name'], role['version'], role['resolved_version'])
+            for role in lockfile_content['roles']] == [('role1', 'master', commit_id)]
+
+
+def test_current_lockfile_skips_resolving_requirements(testdir):
+    repository_path = create_role_depending_on_repository(testdir)
+
+    testdir.inline_run('-s').assertoutcome(passed=1)
+    repository_path.remove()
+
+    testdir.inline_run('-s').assertoutcome(passed=1)
+    testdir.inline_run('-s', '--no-lockfiles').assertoutcome(failed=1)
+
+
+def test_locked_commit_is_installed_after_branch_moved(testdir):
+    repository_path = create_role_depending_on_repository(testdir)
+
+    testdir.inline_run('-s').assertoutcome(passed=1)
+    testdir.tmpdir.join('role2', 'tests', '.first.run').remove()
+    commit_role_repository(repository_path, 'second')
+
+    result = testdir.inline_run(
+        '-s', '--role-store', testdir.tmpdir.join('other-store').strpath)
+    result.assertoutcome(passed=1)
+
+
+def test_locked_commit_of_unversioned_requirement_is_installed_after_branch_moved(testdir):
+    repository_path = create_role_depending_on_repository(testdir, version=None)
+
+    testdir.inline_run('-s').assertoutcome(passed=1)
+    testdir.tmpdir.join('role2', 'tests', '.first.run').remove()
+    commit_role_repository(repository_path, 'second')
+
+    result = testdir.inline_run(
+        '-s', '--role-store', testdir.tmpdir.join('other-store').strpath)
+    result.assertoutcome(passed=1)
+
+
+def test_locked_commit_of_transitive_dependency_is_installed_after_branch_moved(testdir):
+    dependency_repository_path = testdir.tmpdir.join('role3-repo')
+    commit_role_repository(dependency_repository_path, 'first')
+    repository_path = create_role_depending_on_repository(testdir, marker_name='dependency')
+    commit_role_repository(repository_path, 'dependency', dependencies='''
+      - name: role3
+        src: git+file://{0}
+    '''.format(dependency_repository_path))
+
+    testdir.inline_run('-s').assertoutcome(passed=1)
+    lockfile_content = yaml.safe_load(
+        testdir.tmpdir.join('role2', 'meta', 'main.yml.lock').read())
+    testdir.tmpdir.join('role2', 'tests', '.first.run').remove()
+    commit_role_repository(dependency_repository_path, 'second')
+
+    testdir.inline_run(
+        '-s', '--role-store', testdir.tmpdir.join('other-store').strpath)
+
+    assert [dependency['name'] for dependency in lockfile_content['roles'][0]['dependencies']] \
+        == ['role3']
+    assert testdir.tmpdir.join('role2', 'tests', '.first.run').check(file=True)
+    assert not testdir.tmpdir.join('role2', 'tests', '.second.run').check()
+
+
+def test_remote_archive_is_verified_against_locked_checksum(testdir):
+    smart_create(testdir.tmpdir, '''
+    ## archives/role1.tar.gz
+    #### role1/meta/main.yml
+    galaxy_info:
+      author: John Doe
+    dependencies: []
+
+    #### role1/tasks/main.yml
+    - ping:
+
+    ## role2/meta/main.yml
+    galaxy_info:
+      author: John Doe
+    dependencies:
+      - name: role1
+        src: file://{archive}
+
+    ## role2/tasks/main.yml
+    - ping:
+
+    ## role2/tests/inventory
+    127.0.0.1 ansible_connection=local
+
+    ## role2/tests/test_playbook.yml
+    - hosts: 127.0.0.1
+      gather_facts: no
+      roles:
+        - role: role2
+      tasks:
+        - name: task1
+          ping:
+          tags: test
+    '''.replace('{archive}', testdir.tmpdir.join('archives', 'role1.tar.gz').strpath))
+    archive_path = testdir.tmpdir.join('archives', 'role1.tar.gz')
+    checksum = file_digest(archive_path)
+
+    testdir.inline_run('-s').assertoutcome(passed=1)
+    lockfile_content = yaml.safe_load(
+        testdir.tmpdir.join('role2', 'meta', 'main.yml.lock').read())
+    archive_path.write('tampered')
+
+    result = testdir.inline_run(
+        '-s', '--role-store', testdir.tmpdir.join('other-store').strpath)
+
+    assert lockfile_content['roles'][0]['resolved_version'] == checksum
+    _, _, failed = result.listoutcomes()
+    assert len(failed) == 1
+    assert 'differs from {0}'.format(checksum) in str(failed[0].longrepr)
+
+
+def test_written_lockfile_keeps_task_listing_cached(testdir, caplog):
+    create_role_depending_on_repository(testdir)
+    lockfile_path = testdir.tmpdir.join('role2', 'meta', 'main.yml.lock')
+    # dependencies installed by the first run are discovered from then on
+    testdir.inline_run('-s').assertoutcome(passed=1)
+    testdir.inline_genitems()
+    lockfile_path.remove()
+    testdir.inline_run('-s').assertoutcome(passed=1)
+    assert lockfile_path.check(file=True)
+    caplog.clear()
+
+    items, _ = testdir.inline_genitems()
+
+    assert [item.name for item in items] == ['assert first version of role1 run']
+    assert not [message for message in caplog.messages if message.startswith('discover tasks')]
+
+
+def test_written_lockfile_is_no_change_affecting_playbooks(testdir):
+    create_role_depending_on_repository(testdir)
+    # files touched by the test playbook are no changes of interest here
+    testdir.tmpdir.join('.gitignore').write('.*.run\n')
+    git(testdir.tmpdir, 'init', '-q')
+    git(testdir.tmpdir, 'add', '.gitignore', 'role2')
+    git(testdir.tmpdir, 'commit', '-q', '-m', 'initial')
+    testdir.inline_run('-s').assertoutcome(passed=1)
+
+    items, _ = testdir.inline_genitems('--changed-since', 'HEAD')
+
+    assert testdir.tmpdir.join('role2', 'meta', 'main.yml.lock').check(file=True)
+    assert items == []
+
+
+def test_lockfile_is_outdated_when_requirements_change(tmpdir):
+    requirements_path = tmpdir.join('requirements.yml')
+    lockfile = Lockfile(requirements_path)
+    lockfile.write([dict(src='role1', version='1.0')], [('key1', '1.0')])
+
+    assert lockfile.path == tmpdir.join('requirements.yml.lock')
+    assert lockfile.load([dict(src='role1', version='1.0')]) == [('key1', '1.0', [])]
+    assert lockfile.load([dict(src='role1', version='1.1')]) is None
+
+
+def test_lockfile_is_outdated_when_local_archive_changes(tmpdir):
+    archive_path = tmpdir.join('role1.tar.gz')
+    archive_path.write('first')
+    requirements = [dict(name='role1', src=archive_path.strpath)]
+    lockfile = Lockfile(tmpdir.join('requirements.yml'))
+    lockfile.write(requirements, [('key1', 'e0996a37c13d44c3b06074939d43fa3759bd32c1')])
+    is_current_before_change = lockfile.load(requirements) is not None
+
+    archive_path.write('second')
+
+    assert is_current_before_change
+    assert lockfile.load(requirements) is None
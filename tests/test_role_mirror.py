@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+
+from multiprocessing.pool import ThreadPool
+import subprocess
+
+import pytest
+
+from goodplay.ansible_support import galaxy
+from goodplay.ansible_support.role_mirror import RoleMirror, RoleMirrorError
+from goodplay.ansible_support.role_store import RoleStore
+
+from goodplay_helpers import smart_create
+
+
+def git(tmpdir, *args):
+    subprocess.check_call(
+        ('git', '-c', 'user.name=goodplay', '-c', 'user.email=goodplay@localhost') + args,
+        cwd=str(tmpdir))
+
+
+def create_role_repository(repository_path, task_name='task1'):
+    smart_create(repository_path, '''
+    ## meta/main.yml
+    galaxy_info:
+      author: John Doe
+    dependencies: []
+
+    ## tasks/main.yml
+    - name: {0}
+      file:
+        path: "{{{{ playbook_dir }}}}/.role1.run"
+        state: touch
+    '''.format(task_name))
+
+    if not repository_path.join('.git').check():
+        git(repository_path, 'init', '-q')
+        git(repository_path, 'symbolic-ref', 'HEAD', 'refs/heads/master')
+
+    git(repository_path, 'add', '.')
+    git(repository_path, 'commit', '-q', '-m', task_name)
+
+    return dict(name='role1', src='git+file://' + repository_path.strpath, version='master')
+
+
+def fetch_all(mirror, requirements):
+    pool = ThreadPool(2)
+
+    try:
+        return mirror.fetch_all(requirements, pool)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def test_fetched_git_requirement_is_installed_without_repository(tmpdir):
+    requirement = create_role_repository(tmpdir.join('role1-repo'))
+    mirror = RoleMirror(tmpdir.join('mirror'))
+
+    results = fetch_all(mirror, [requirement])
+    tmpdir.join('role1-repo').remove()
+    roles_path = tmpdir.ensure('roles', dir=True)
+    mirror.install([requirement], roles_path)
+
+    assert results == [(requirement, 'fetched', None)]
+    assert 'task1' in roles_path.join('role1', 'tasks', 'main.yml').read()
+
+
+def test_git_requirement_is_fetched_again_when_branch_moved(tmpdir):
+    requirement = create_role_repository(tmpdir.join('role1-repo'))
+    mirror = RoleMirror(tmpdir.join('mirror'))
+
+    first_results = fetch_all(mirror, [requirement])
+    second_results = fetch_all(mirror, [requirement])
+    create_role_repository(tmpdir.join('role1-repo'), task_name='task2')
+    third_results = fetch_all(mirror, [requirement])
+    roles_path = tmpdir.ensure('roles', dir=True)
+    mirror.install([requirement], roles_path)
+
+    assert [result[1] for result in first_results + second_results + third_results] == \
+        ['fetched', 'mirrored', 'fetched']
+    assert 'task2' in roles_path.join('role1', 'tasks', 'main.yml').read()
+
+
+def create_role_archive(archive_path, task_name='task1'):
+    smart_create(archive_path.dirpath(), '''
+    ## {0}
+    #### role1/meta/main.yml
+    galaxy_info:
+      author: John Doe
+    dependencies: []
+
+    #### role1/tasks/main.yml
+    - name: {1}
+      ping:
+    '''.format(archive_path.basename, task_name))
+
+    return dict(name='role1', src='file://' + archive_path.strpath)
+
+
+def test_remote_archive_is_fetched_again_when_changed(tmpdir):
+    requirement = create_role_archive(tmpdir.join('archives', 'role1.tar.gz'))
+    mirror = RoleMirror(tmpdir.join('mirror'))
+
+    first_results = fetch_all(mirror, [requirement])
+    second_results = fetch_all(mirror, [requirement])
+    create_role_archive(tmpdir.join('archives', 'role1.tar.gz'), task_name='task2')
+    third_results = fetch_all(mirror, [requirement])
+    tmpdir.join('archives').remove()
+    roles_path = tmpdir.ensure('roles', dir=True)
+    mirror.install([requirement], roles_path)
+
+    assert [result[1] for result in first_results + second_results + third_results] == \
+        ['fetched', 'mirrored', 'fetched']
+    assert 'task2' in roles_path.join('role1', 'tasks', 'main.yml').read()
+
+
+def test_unversioned_galaxy_role_is_fetched_again_when_released(tmpdir, monkeypatch):
+    def install_roles(requirements, roles_path, *args, **kwargs):
+        roles_path.join('java', 'version').write(requirements[0]['version'], ensure=True)
+        return []
+
+    monkeypatch.setattr(galaxy, 'install_roles', install_roles)
+    monkeypatch.setattr(galaxy, 'latest_release', lambda role_name: '1.0.0')
+    requirement = dict(name='java', src='geerlingguy.java')
+    mirror = RoleMirror(tmpdir.join('mirror'))
+
+    first_results = fetch_all(mirror, [requirement])
+    second_results = fetch_all(mirror, [requirement])
+    monkeypatch.setattr(galaxy, 'latest_release', lambda role_name: '1.1.0')
+    third_results = fetch_all(mirror, [requirement])
+    monkeypatch.undo()
+    roles_path = tmpdir.ensure('roles', dir=True)
+    mirror.install([requirement], roles_path)
+
+    assert [result[1] for result in first_results + second_results + third_results] == \
+        ['fetched', 'mirrored', 'fetched']
+    assert roles_path.join('java', 'version').read() == '1.1.0'
+
+
+def test_role_store_installs_from_mirror(tmpdir, monkeypatch):
+    requirement = create_role_repository(tmpdir.join('role1-repo'))
+    mirror = RoleMirror(tmpdir.join('mirror'))
+    fetch_all(mirror, [requirement])
+    tmpdir.join('role1-repo').remove()
+
+    installs = []
+    monkeypatch.setattr(galaxy, 'install_roles', lambda *args: installs.append(args))
+    roles_path = RoleStore(tmpdir.join('store'), mirror=mirror).ensure(requirement)
+
+    assert not installs
+    assert roles_path.join('role1', 'tasks', 'main.yml').check(file=True)
+
+
+def test_installing_requirement_missing_in_mirror_fails(tmpdir):
+    mirror = RoleMirror(tmpdir.join('mirror'))
+
+    with pytest.raises(RoleMirrorError) as excinfo:
+        mirror.install([dict(src='geerlingguy.java', version='1.9.0')], tmpdir)
+
+    assert 'goodplay deps fetch' in str(excinfo.value)
+
+
+def test_installing_requirement_missing_in_mirror_is_ignored_when_asked_to(tmpdir):
+    mirror = RoleMirror(tmpdir.join('mirror'))
+
+    mirror.install([dict(src='geerlingguy.java', version='1.9.0')], tmpdir, ignore_errors=True)
+
+    assert not tmpdir.listdir()
+
+
+def test_failing_git_mirror_is_reported_per_requirement(tmpdir):
+    requirement = dict(name='role1', src='git+file://' + tmpdir.join('missing').strpath)
+
+    results = fetch_all(RoleMirror(tmpdir.join('mirror')), [requirement])
+
+    assert [result[:2] for result in results] == [(requirement, 'failed')]
+    assert results[0][2]
+
+
+def test_goodplay_deps_fetch_makes_test_runs_independent_of_role_sources(tmpdir):
+    requirement = create_role_repository(tmpdir.join('role1-repo'))
+    smart_create(tmpdir, '''
+    ## role2/meta/main.yml
+    galaxy_info:
+      author: John Doe
+    dependencies:
+      - name: role1
+        src: {src}
+        version: master
+
+    ## role2/tasks/main.yml
+    - ping:
+
+    ## role2/tests/inventory
+    127.0.0.1 ansible_connection=local
+
+    ## role2/tests/test_playbook.yml
+    - hosts: 127.0.0.1
+      gather_facts: no
+      roles:
+        - role: role2
+
+    - hosts: 127.0.0.1
+      gather_facts: no
+      tasks:
+        - name: assert role1 run
+          file:
+            path: "{{ playbook_dir }}/.role1.run"
+            state: file
+          tags: test
+    '''.replace('{src}', requirement['src']))
+
+    stdout = subprocess.check_output(
+        ['goodplay', 'deps', 'fetch', '--role-mirror', 'mirror', 'role2'], cwd=str(tmpdir))
+    tmpdir.join('role1-repo').remove()
+    process = subprocess.Popen(
+        ['goodplay', '--role-mirror', 'mirror', 'role2'], cwd=str(tmpdir),
+        stdout=subprocess.PIPE)
+    process.communicate()
+
+    assert stdout.splitlines() == [
+        'role1 ({0}@master): fetched'.format(requirement['src'][4:]).encode('utf-8')]
+    assert process.returncode == 0
@@ -0,0 +1,318 @@
+# -*- coding: utf-8 -*-
+
+import time
+from multiprocessing.pool import ThreadPool
+
+from goodplay.ansible_support import Playbook, galaxy, role_store
+from goodplay.ansible_support.role_store import RoleStore, requirement_key
+
+from goodplay_helpers import smart_create
+
+
+def create_role_archive(base_path, role_name, task_name='task1'):
+    smart_create(base_path, '''
+    ## {0}.tar.gz
+    #### {0}/meta/main.yml
+    galaxy_info:
+      author: John Doe
+    dependencies: []
+
+    #### {0}/tasks/main.yml
+    - name: {1}
+      ping:
+    '''.format(role_name, task_name))
+
+    return dict(name=role_name, src=base_path.join(role_name + '.tar.gz').strpath)
+
+
+def count_galaxy_installs(monkeypatch):
+    installs = []
+    install_roles = galaxy.install_roles
+
+    def counting_install_roles(*args, **kwargs):
+        installs.append(args)
+        return install_roles(*args, **kwargs)
+
+    monkeypatch.setattr(galaxy, 'install_roles', counting_install_roles)
+
+    return installs
+
+
+def test_requirement_key_of_unversioned_galaxy_role_is_key_of_latest_release(monkeypatch):
+    monkeypatch.setattr(galaxy, 'latest_release', lambda role_name: '1.9.0')
+
+    assert requirement_key('geerlingguy.java') == \
+        requirement_key(dict(src='geerlingguy.java', version='1.9.0'))
+
+
+def test_requirement_key_of_galaxy_role_without_releases_is_none(monkeypatch):
+    monkeypatch.setattr(galaxy, 'latest_release', lambda role_name: None)
+
+    assert requirement_key('geerlingguy.java') is None
+
+
+def test_requirement_key_of_versioned_galaxy_role_depends_on_version():
+    first_key = requirement_key(dict(src='geerlingguy.java', version='1.9.0'))
+    second_key = requirement_key(dict(src='geerlingguy.java', version='1.9.1'))
+
+    assert None not in (first_key, second_key)
+    assert first_key != second_key
+
+
+def test_requirement_key_of_local_archive_depends_on_content(tmpdir):
+    requirement = create_role_archive(tmpdir, 'role1')
+    first_key = requirement_key(requirement)
+
+    create_role_archive(tmpdir, 'role1', task_name='task2')
+
+    assert first_key is not None
+    assert requirement_key(requirement) != first_key
+
+
+def test_installed_role_is_materialized_as_symlink(tmpdir):
+    requirement = create_role_archive(tmpdir.join('archives'), 'role1')
+    target_path = tmpdir.ensure('target', dir=True)
+
+    RoleStore(tmpdir.join('store')).install([requirement], target_path)
+
+    assert target_path.join('role1').check(link=True)
+    assert target_path.join('role1', 'tasks', 'main.yml').check(file=True)
+
+
+def test_stored_role_is_reused_across_sessions(tmpdir, monkeypatch):
+    installs = count_galaxy_installs(monkeypatch)
+    requirement = create_role_archive(tmpdir.join('archives'), 'role1')
+
+    for target_name in ('target1', 'target2'):
+        store = RoleStore(tmpdir.join('store'))
+        store.install([requirement], tmpdir.ensure(target_name, dir=True))
+        store.release()
+
+    assert len(installs) == 1
+    assert tmpdir.join('target2', 'role1', 'tasks', 'main.yml').check(file=True)
+
+
+def test_modified_stored_role_is_reinstalled(tmpdir, monkeypatch):
+    installs = count_galaxy_installs(monkeypatch)
+    requirement = create_role_archive(tmpdir.join('archives'), 'role1')
+
+    roles_path = RoleStore(tmpdir.join('store')).ensure(requirement)
+    roles_path.join('role1', 'tasks', 'main.yml').write('- fail:')
+    roles_path = RoleStore(tmpdir.join('store')).ensure(requirement)
+
+    assert len(installs) == 2
+    assert 'ping' in roles_path.join('role1', 'tasks', 'main.yml').read()
+
+
+def test_stored_role_with_corrupted_entry_info_is_reinstalled(tmpdir, monkeypatch):
+    installs = count_galaxy_installs(monkeypatch)
+    requirement = create_role_archive(tmpdir.join('archives'), 'role1')
+
+    roles_path = RoleStore(tmpdir.join('store')).ensure(requirement)
+    roles_path.dirpath().join('entry.json').write('{"digest": ')
+    roles_path = RoleStore(tmpdir.join('store')).ensure(requirement)
+
+    assert len(installs) == 2
+    assert roles_path.join('role1', 'tasks', 'main.yml').check(file=True)
+
+
+def test_stored_role_vanishing_within_session_is_reinstalled(tmpdir, monkeypatch):
+    installs = count_galaxy_installs(monkeypatch)
+    requirement = create_role_archive(tmpdir.join('archives'), 'role1')
+    store = RoleStore(tmpdir.join('store'))
+
+    store.ensure(requirement).dirpath().remove()
+    roles_path = store.ensure(requirement)
+
+    assert len(installs) == 2
+    assert roles_path.join('role1', 'tasks', 'main.yml').check(file=True)
+
+
+def test_least_recently_used_role_is_evicted_when_exceeding_budget(tmpdir):
+    first_requirement = create_role_archive(tmpdir.join('archives'), 'role1')
+    second_requirement = create_role_archive(tmpdir.join('archives'), 'role2')
+    first_store = RoleStore(tmpdir.join('store'), budget=1)
+
+    first_roles_path = first_store.ensure(first_requirement)
+    first_store.release()
+    second_roles_path = RoleStore(tmpdir.join('store'), budget=1).ensure(second_requirement)
+
+    assert not first_roles_path.check()
+    assert second_roles_path.join('role2').check(dir=True)
+
+
+def test_role_used_by_concurrent_session_is_not_evicted(tmpdir):
+    first_requirement = create_role_archive(tmpdir.join('archives'), 'role1')
+    second_requirement = create_role_archive(tmpdir.join('archives'), 'role2')
+    third_requirement = create_role_archive(tmpdir.join('archives'), 'role3')
+    first_store = RoleStore(tmpdir.join('store'), budget=1)
+
+    first_roles_path = first_store.ensure(first_requirement)
+    RoleStore(tmpdir.join('store'), budget=1).ensure(second_requirement)
+
+    assert first_roles_path.join('role1').check(dir=True)
+
+    first_store.release()
+    RoleStore(tmpdir.join('store'), budget=1).ensure(third_requirement)
+
+    assert not first_roles_path.check()
+
+
+def test_unversioned_role_is_installed_once_per_session_outside_store(tmpdir, monkeypatch):
+    installs = count_galaxy_installs(monkeypatch)
+    monkeypatch.setattr(role_store, 'resolve_requirement', lambda requirement: (None, None))
+    requirement = create_role_archive(tmpdir.join('archives'), 'role1')
+    store = RoleStore(tmpdir.join('store'))
+
+    first_roles_path = store.ensure(requirement)
+    second_roles_path = store.ensure(requirement)
+    store.release()
+
+    assert len(installs) == 1
+    assert first_roles_path == second_roles_path
+    assert not first_roles_path.check()
+    assert not tmpdir.join('store').check()
+
+
+def create_role_with_dependency(testdir):
+    smart_create(testdir.tmpdir, '''
+    ## external-role-base/role1.tar.gz
+    #### role1/meta/main.yml
+    galaxy_info:
+      author: John Doe
+    dependencies: []
+
+    #### role1/tasks/main.yml
+    - file:
+        path: "{{ playbook_dir }}/.role1.run"
+        state: touch
+
+    ## local-role-base/role2/meta/main.yml
+    galaxy_info:
+      author: John Doe
+    dependencies:
+      - name: role1
+        src: external-role-base/role1.tar.gz
+
+    ## local-role-base/role2/tasks/main.yml
+    - ping:
+
+    ## local-role-base/role2/tests/inventory
+    127.0.0.1 ansible_connection=local
+
+    ## local-role-base/role2/tests/test_playbook.yml
+    - hosts: 127.0.0.1
+      gather_facts: no
+      roles:
+        - role: role2
+
+    - hosts: 127.0.0.1
+      gather_facts: no
+      tasks:
+        - name: assert role1 run
+          file:
+            path: "{{ playbook_dir }}/.role1.run"
+            state: file
+          tags: test
+    ''')
+
+
+def test_role_dependencies_are_installed_from_role_store(testdir, monkeypatch):
+    installs = count_galaxy_installs(monkeypatch)
+    create_role_with_dependency(testdir)
+    store_path = testdir.tmpdir.join('store')
+
+    for _ in range(2):
+        result = testdir.inline_run('-s', '--role-store', store_path.strpath)
+        result.assertoutcome(passed=1)
+
+    assert len(installs) == 1
+    assert len(store_path.listdir(lambda path: path.check(dir=True))) == 1
+
+
+def test_role_dependencies_are_installed_without_role_store(testdir, monkeypatch):
+    installs = count_galaxy_installs(monkeypatch)
+    create_role_with_dependency(testdir)
+    store_path = testdir.tmpdir.join('store')
+
+    for _ in range(2):
+        result = testdir.inline_run('-s', '--role-store', store_path.strpath, '--no-role-store')
+        result.assertoutcome(passed=1)
+
+    assert len(installs) == 2
+    assert not store_path.check()
+
+
+def test_prefetch_installs_unique_requirements_once(tmpdir, monkeypatch):
+    installs = count_galaxy_installs(monkeypatch)
+    first_requirement = create_role_archive(tmpdir.join('archives'), 'role1')
+    second_requirement = create_role_archive(tmpdir.join('archives'), 'role2')
+    store = RoleStore(tmpdir.join('store'))
+
+    store.prefetch([first_requirement, second_requirement, dict(first_requirement)], workers=2)
+
+    assert len(installs) == 2
+    assert store.ensure(first_requirement).join('role1').check(dir=True)
+    assert len(installs) == 2
+
+
+def test_concurrently_ensured_requirement_is_installed_once(tmpdir, monkeypatch):
+    installs = count_galaxy_installs(monkeypatch)
+    install_roles = galaxy.install_roles
+
+    def slow_install_roles(*args, **kwargs):
+        time.sleep(0.2)
+        return install_roles(*args, **kwargs)
+
+    monkeypatch.setattr(galaxy, 'install_roles', slow_install_roles)
+    requirement = create_role_archive(tmpdir.join('archives'), 'role1')
+    store = RoleStore(tmpdir.join('store'))
+    pool = ThreadPool(4)
+
+    try:
+        roles_paths = pool.map(store.ensure, [requirement] * 4)
+    finally:
+        pool.close()
+
+    assert len(installs) == 1
+    assert len(set(roles_paths)) == 1
+    assert roles_paths[0].join('role1').check(dir=True)
+
+
+def test_prefetch_ignores_failing_requirements(tmpdir):
+    store = RoleStore(tmpdir.join('store'))
+
+    store.prefetch([dict(name='role1', src=tmpdir.join('missing.tar.gz').strpath)])
+
+    assert not store.used_keys
+
+
+def test_dependencies_of_all_test_playbooks_are_installed_before_running_them(
+        testdir, monkeypatch):
+    installs = count_galaxy_installs(monkeypatch)
+    create_role_with_dependency(testdir)
+    testdir.tmpdir.join('local-role-base', 'role2', 'tests', 'test_playbook.yml').copy(
+        testdir.tmpdir.join('local-role-base', 'role2', 'tests', 'test_playbook2.yml'))
+
+    install_counts = []
+    install_all_dependencies = Playbook.install_all_dependencies
+
+    def recording_install_all_dependencies(self):
+        install_counts.append(len(installs))
+        return install_all_dependencies(self)
+
+    monkeypatch.setattr(Playbook, 'install_all_dependencies', recording_install_all_dependencies)
+
+    result = testdir.inline_run('-s', '--install-workers', '2')
+    result.assertoutcome(passed=2)
+
+    assert install_counts == [1, 1]
+
+
+def test_dependencies_are_not_installed_when_collecting_only(testdir, monkeypatch):
+    installs = count_galaxy_installs(monkeypatch)
+    create_role_with_dependency(testdir)
+
+    testdir.inline_run('--collect-only')
+
+    assert not installs
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import time
+
+import py.path
+import pytest
+
+from goodplay.ansible_support.event_channel import EventChannel
+from goodplay.ansible_support.output import OutputSpool
+from goodplay.ansible_support.runner import EventPump
+from goodplay.utils.subprocess import run
+
+# writes more output than fits into a pipe's buffer before sending an event
+sender_script = '''
+import json, socket, struct, sys
+sys.stdout.write('x' * 1024 * 1024 + '\\n')
+sys.stdout.flush()
+connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+connection.connect(sys.argv[1])
+payload = json.dumps(dict(event_name='done', data={})).encode('utf-8')
+connection.sendall(struct.pack('!I', len(payload)) + payload)
+'''
+
+# writes many lines before connecting, like a long non-test task would
+chatty_sender_script = sender_script.replace(
+    "sys.stdout.write('x' * 1024 * 1024 + '\\n')",
+    "sys.stdout.write('line\\n' * 200000)")
+
+
+@pytest.fixture
+def event_channel():
+    # unix domain socket paths are limited in length, thus pytest's temporary
+    # directories are avoided
+    temp_path = py.path.local.mkdtemp()
+    channel = EventChannel(temp_path.join('events.sock'))
+    yield channel
+    channel.close()
+    temp_path.remove()
+
+
+def wait_for_exit(process, timeout=10):
+    deadline = time.time() + timeout
+
+    while process.poll() is None and time.time() < deadline:
+        time.sleep(0.1)
+
+    return process.poll()
+
+
+def test_event_pump_drains_run_while_events_are_not_consumed(event_channel, tmpdir):
+    process = run('{0} -c {1} {2}', sys.executable, sender_script, event_channel.socket_path,
+                  async_=True)
+
+    output = OutputSpool(tmpdir.join('output.gz'))
+    event_pump = EventPump(process, event_channel, output)
+    returncode = wait_for_exit(process)
+    events = list(event_pump.events())
+    event_pump.join()
+
+    assert returncode == 0
+    assert events == [dict(event_name='done', data={})]
+    assert output.recent_lines() == ['x' * 1024 * 1024]
+
+
+def test_event_pump_spools_output_before_first_event_as_it_is_read(
+        event_channel, monkeypatch, tmpdir):
+    process = run('{0} -c {1} {2}', sys.executable, chatty_sender_script,
+                  event_channel.socket_path, async_=True)
+    buffered_line_counts = []
+    spool_available_output = EventPump.spool_available_output
+
+    def counting_spool_available_output(self):
+        buffered_line_counts.append(len(self.process.stdout.lines))
+        spool_available_output(self)
+
+    monkeypatch.setattr(EventPump, 'spool_available_output', counting_spool_available_output)
+
+    output = OutputSpool(tmpdir.join('output.gz'))
+    event_pump = EventPump(process, event_channel, output)
+    events = list(event_pump.events())
+    event_pump.join()
+
+    assert events == [dict(event_name='done', data={})]
+    assert len(output.recent_lines()) == output.max_report_lines
+    assert max(buffered_line_counts) < 200000 // 10
+
+
+def test_event_pump_forwards_exceptions_to_consumer(event_channel, monkeypatch, tmpdir):
+    process = run('true', async_=True)
+
+    def failing_receive_events(wait_readable):
+        raise ValueError('broken event')
+        yield  # pragma: no cover
+
+    monkeypatch.setattr(event_channel, 'receive_events', failing_receive_events)
+    event_pump = EventPump(process, event_channel, OutputSpool(tmpdir.join('output.gz')))
+
+    with pytest.raises(ValueError):
+        list(event_pump.events())
+
+    event_pump.join()
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+import resource
+import signal
+import socket
+import time
+
+from goodplay.utils.subprocess import OutputStream, run, split_command
+
+
+def cpu_time():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def test_run_waits_for_process_and_captures_output():
+    process = run('sh -c {0}', 'echo line1; echo line2; echo error >&2; printf last')
+
+    assert process.returncode == 0
+    assert list(process.stdout) == ['line1\n', 'line2\n', 'last']
+    assert list(process.stderr) == ['error\n']
+
+
+def test_iterating_output_of_quiet_process_does_not_poll_busily():
+    process = run('sh -c {0}', 'sleep 1; echo done', async_=True)
+    cpu_time_before = cpu_time()
+
+    lines = list(process.stdout)
+
+    assert lines == ['done\n']
+    assert cpu_time() - cpu_time_before < 0.5
+
+
+def test_multi_byte_characters_split_across_reads_are_decoded(monkeypatch):
+    monkeypatch.setattr(OutputStream, 'read_size', 1)
+
+    process = run('printf {0}', u'ä€\n')
+
+    assert list(process.stdout) == [u'ä€\n']
+
+
+def test_split_command_keeps_arguments_intact():
+    argv = split_command('git -c core.quotePath=false diff {0} --', u"it's a \"ä\" path")
+
+    assert argv == ['git', '-c', 'core.quotePath=false', 'diff', u"it's a \"ä\" path", '--']
+    assert all(isinstance(arg, str) for arg in argv)
+
+
+def test_run_passes_non_ascii_arguments():
+    process = run('printf {0}', u'ä€')
+
+    assert list(process.stdout) == [u'ä€']
+
+
+def test_available_lines_does_not_wait_for_output():
+    process = run('sh -c {0}', 'echo first; sleep 5', async_=True)
+
+    process.read_output()
+    available_lines = list(process.stdout.available_lines())
+    process.popen.kill()
+    process.wait()
+
+    assert available_lines == ['first\n']
+
+
+def test_wait_readable_returns_false_when_process_exits_first():
+    process = run('sh -c {0}', 'echo output', async_=True)
+    readable_socket, writable_socket = socket.socketpair()
+
+    is_readable = process.wait_readable(readable_socket)
+    writable_socket.sendall(b'x')
+
+    assert not is_readable
+    assert process.wait_readable(readable_socket)
+    assert list(process.stdout.available_lines()) == ['output\n']
+
+
+def test_signal_group_terminates_children_of_process_started_in_new_session():
+    # the background sleep keeps stdout open until it is terminated as well
+    process = run('sh -c {0}', 'sleep 60 & echo started; wait', async_=True, new_session=True)
+    assert next(iter(process.stdout)) == 'started\n'
+    started = time.time()
+
+    process.signal_group(signal.SIGTERM)
+
+    assert process.wait() == -signal.SIGTERM
+    assert time.time() - started < 10
+
+
+def test_wait_lets_on_output_consume_output_as_it_is_read():
+    process = run('sh -c {0}', 'for i in $(seq 20000); do echo line$i; done', async_=True)
+    consumed_lines = []
+    buffered_line_counts = []
+
+    def on_output():
+        buffered_line_counts.append(len(process.stdout.lines))
+        consumed_lines.extend(process.stdout.available_lines())
+
+    process.wait(on_output=on_output)
+
+    assert len(consumed_lines) == 20000
+    assert max(buffered_line_counts) < 20000
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+
+from goodplay.ansible_support import tasks_cache
+from goodplay.ansible_support.tasks_cache import TasksCache, TreeDigests, tasks_cache_key
+from goodplay.context import GoodplayContext
+
+from goodplay_helpers import smart_create
+
+
+def test_tasks_cache_get_returns_none_when_key_unknown(tmpdir):
+    tasks_cache = TasksCache(tmpdir)
+
+    assert tasks_cache.get('unknown') is None
+
+
+def test_tasks_cache_get_returns_previously_set_tasks(tmpdir):
+    tasks_cache = TasksCache(tmpdir)
+    tasks_cache.set('key1', [['task1', ['test']]])
+
+    assert tasks_cache.get('key1') == [['task1', ['test']]]
+
+
+def test_tasks_cache_key_is_stable_for_unchanged_content(tmpdir):
+    playbook_path = tmpdir.join('test_playbook.yml')
+    playbook_path.write('- hosts: all')
+
+    assert tasks_cache_key(playbook_path, [tmpdir]) == tasks_cache_key(playbook_path, [tmpdir])
+
+
+def test_tasks_cache_key_changes_on_changed_content(tmpdir):
+    playbook_path = tmpdir.join('test_playbook.yml')
+    playbook_path.write('- hosts: all')
+    first_key = tasks_cache_key(playbook_path, [tmpdir])
+
+    playbook_path.write('- hosts: other')
+
+    assert tasks_cache_key(playbook_path, [tmpdir]) != first_key
+
+
+def test_tasks_cache_key_changes_on_changed_included_file(tmpdir):
+    smart_create(tmpdir, '''
+    ## test_playbook.yml
+    - hosts: all
+      tasks:
+        - include_tasks: tasks/included.yml
+
+    ## tasks/included.yml
+    - name: task1
+      ping:
+    ''')
+    first_key = tasks_cache_key(tmpdir.join('test_playbook.yml'), [tmpdir])
+
+    tmpdir.join('tasks', 'included.yml').write('- name: task2\n  ping:\n')
+
+    assert tasks_cache_key(tmpdir.join('test_playbook.yml'), [tmpdir]) != first_key
+
+
+def test_tasks_cache_key_ignores_hidden_files(tmpdir):
+    tmpdir.join('test_playbook.yml').write('- hosts: all')
+    first_key = tasks_cache_key(tmpdir.join('test_playbook.yml'), [tmpdir])
+
+    tmpdir.join('.role1.run').ensure()
+
+    assert tasks_cache_key(tmpdir.join('test_playbook.yml'), [tmpdir]) == first_key
+
+
+def test_tasks_cache_key_ignores_lockfiles(tmpdir):
+    tmpdir.join('test_playbook.yml').write('- hosts: all')
+    first_key = tasks_cache_key(tmpdir.join('test_playbook.yml'), [tmpdir])
+
+    tmpdir.join('meta', 'main.yml.lock').write('roles: []\n', ensure=True)
+
+    assert tasks_cache_key(tmpdir.join('test_playbook.yml'), [tmpdir]) == first_key
+
+
+def test_tasks_cache_key_incorporates_use_local_roles(tmpdir):
+    playbook_path = tmpdir.join('test_playbook.yml')
+    playbook_path.write('- hosts: all')
+
+    assert tasks_cache_key(playbook_path, [tmpdir], True) != \
+        tasks_cache_key(playbook_path, [tmpdir], False)
+
+
+def test_tasks_cache_key_differs_for_playbooks_in_same_directory(tmpdir):
+    tmpdir.join('test_playbook1.yml').write('- hosts: all\n')
+    tmpdir.join('test_playbook2.yml').write('- hosts: all\n')
+
+    assert tasks_cache_key(tmpdir.join('test_playbook1.yml'), [tmpdir]) != \
+        tasks_cache_key(tmpdir.join('test_playbook2.yml'), [tmpdir])
+
+
+def test_tree_digests_digest_each_directory_once(tmpdir, monkeypatch):
+    tmpdir.join('test_playbook1.yml').write('- hosts: all\n')
+    tmpdir.join('test_playbook2.yml').write('- hosts: all\n')
+    digested_paths = []
+
+    def tree_digest(root_path):
+        digested_paths.append(root_path)
+        return 'digest'
+
+    monkeypatch.setattr(tasks_cache, 'tree_digest', tree_digest)
+    tree_digests = TreeDigests()
+
+    for playbook_name in ('test_playbook1.yml', 'test_playbook2.yml'):
+        tasks_cache_key(tmpdir.join(playbook_name), [tmpdir], tree_digests=tree_digests)
+
+    assert digested_paths == [tmpdir]
+
+
+class OptionsConfig(object):
+    cache = None
+
+    def __init__(self, tmpdir):
+        self.invocation_dir = tmpdir
+        self.args = [tmpdir.strpath]
+
+    def getoption(self, name):
+        return dict(use_local_roles=False, role_mirror=None, no_role_store=True)[name]
+
+
+def test_tasks_cache_key_of_context_incorporates_installed_roles(tmpdir):
+    smart_create(tmpdir, '''
+    ## inventory
+    127.0.0.1 ansible_connection=local
+
+    ## test_playbook.yml
+    - hosts: all
+    ''')
+
+    ctx = GoodplayContext(tmpdir.join('test_playbook.yml'), config=OptionsConfig(tmpdir))
+    uninstalled_key = ctx.tasks_cache_key
+    ctx.installed_roles_path.join('role1', 'tasks', 'main.yml').ensure()
+
+    del ctx.tasks_cache_key
+    ctx.playbook.dependencies_installed = True
+
+    assert ctx.tasks_cache_key != uninstalled_key
+    ctx.release()
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+
+import subprocess
+
+import pytest
+
+from goodplay import watch
+from goodplay.collection import OptionsConfig
+from goodplay.session import GoodplaySession
+from goodplay_helpers import smart_create
+
+
+def should_watch(path, is_dir):
+    return not path.basename.startswith('.')
+
+
+def create_inotify_watcher(root_paths, should_watch):
+    try:
+        return watch.InotifyWatcher(root_paths, should_watch)
+    except (AttributeError, EnvironmentError):
+        pytest.skip('inotify not available')
+
+
+def create_polling_watcher(root_paths, should_watch):
+    return watch.PollingWatcher(root_paths, should_watch, interval=0.05)
+
+
+@pytest.fixture(params=[create_inotify_watcher, create_polling_watcher])
+def create_watcher(request):
+    watchers = []
+
+    def create(root_paths):
+        watchers.append(request.param(root_paths, should_watch))
+        return watchers[-1]
+
+    yield create
+
+    for watcher in watchers:
+        watcher.close()
+
+
+def test_watcher_detects_modified_file(tmpdir, create_watcher):
+    tmpdir.join('role', 'tasks', 'main.yml').write('- ping:\n', ensure=True)
+    watcher = create_watcher([tmpdir])
+
+    tmpdir.join('role', 'tasks', 'main.yml').write('- ping:\n- ping:\n')
+
+    assert watcher.wait_for_changes(timeout=5) == {tmpdir.join('role', 'tasks', 'main.yml')}
+
+
+def test_watcher_detects_files_in_new_directories(tmpdir, create_watcher):
+    watcher = create_watcher([tmpdir])
+
+    tmpdir.join('new').ensure(dir=True)
+    watcher.wait_for_changes(timeout=0.5)
+    tmpdir.join('new', 'file.yml').write('---\n')
+
+    assert tmpdir.join('new', 'file.yml') in watcher.wait_for_changes(timeout=5)
+
+
+def test_watcher_detects_changes_of_added_paths_outside_of_root_paths(tmpdir, create_watcher):
+    tmpdir.join('external', 'role', 'tasks', 'main.yml').write('- ping:\n', ensure=True)
+    tmpdir.join('external', 'inventory').write('127.0.0.1\n')
+    tmpdir.join('project').ensure(dir=True)
+    watcher = create_watcher([tmpdir.join('project')])
+    watcher.add_paths([tmpdir.join('external', 'role'), tmpdir.join('external', 'inventory')])
+
+    tmpdir.join('external', 'role', 'tasks', 'main.yml').write('- ping:\n- ping:\n')
+    tmpdir.join('external', 'inventory').write('127.0.0.2\n')
+
+    assert watcher.wait_for_changes(timeout=5) >= {
+        tmpdir.join('external', 'role', 'tasks', 'main.yml'), tmpdir.join('external', 'inventory')}
+
+
+def test_watcher_ignores_excluded_files(tmpdir, create_watcher):
+    watcher = create_watcher([tmpdir])
+
+    tmpdir.join('.main.yml.swp').write('swap')
+
+    assert watcher.wait_for_changes(timeout=0.5) == set()
+
+
+def is_affected(playbook_path, changed_paths):
+    watch_plugin = watch.WatchPlugin(None, changed_paths)
+    config = OptionsConfig(
+        dict(use_local_roles=False, impact_analysis='static'), GoodplaySession())
+
+    return watch_plugin.is_affected(playbook_path, config)
+
+
+def test_playbook_is_affected_by_changes_in_its_directory(tmpdir):
+    playbook_path = tmpdir.join('playbooks', 'test_playbook.yml').ensure()
+
+    assert is_affected(playbook_path, [tmpdir.join('playbooks', 'inventory')])
+    assert not is_affected(playbook_path, [tmpdir.join('other', 'inventory')])
+
+
+def test_role_playbook_is_affected_by_changes_in_role(tmpdir):
+    tmpdir.join('role', 'meta', 'main.yml').ensure()
+    playbook_path = tmpdir.join('role', 'tests', 'test_playbook.yml').ensure()
+
+    assert is_affected(playbook_path, [tmpdir.join('role', 'tasks', 'main.yml')])
+    assert not is_affected(playbook_path, [tmpdir.join('other_role', 'tasks', 'main.yml')])
+
+
+def test_playbook_is_affected_by_changes_in_external_role(tmpdir):
+    smart_create(tmpdir, '''
+    ## external/role1/tasks/main.yml
+    - include_tasks: {0}
+
+    ## external/tasks/included.yml
+    - ping:
+
+    ## playbooks/inventory
+    127.0.0.1 ansible_connection=local
+
+    ## playbooks/test_playbook.yml
+    - hosts: 127.0.0.1
+      roles:
+        - {1}
+    '''.format(tmpdir.join('external', 'tasks', 'included.yml'), tmpdir.join('external', 'role1')))
+    playbook_path = tmpdir.join('playbooks', 'test_playbook.yml')
+
+    assert is_affected(playbook_path, [tmpdir.join('external', 'role1', 'tasks', 'main.yml')])
+    assert is_affected(playbook_path, [tmpdir.join('external', 'tasks', 'included.yml')])
+    assert not is_affected(playbook_path, [tmpdir.join('external', 'other.yml')])
+
+
+@pytest.mark.parametrize('exit_code', [
+    watch.EXIT_INTERRUPTED,
+    watch.EXIT_INTERNALERROR,
+    watch.EXIT_USAGEERROR,
+])
+def test_watch_stops_when_run_got_interrupted_or_failed_with_error(monkeypatch, exit_code):
+    runs = []
+
+    def stopping_run(warm_state, args, plugins, changed_paths):
+        runs.append(changed_paths)
+        return exit_code
+
+    def create_watcher(root_paths, should_watch):
+        raise AssertionError('no changes are watched for once stopped')
+
+    monkeypatch.setattr(watch.WarmState, 'run', stopping_run)
+    monkeypatch.setattr(watch, 'create_watcher', create_watcher)
+
+    assert watch.watch([], []) == exit_code
+    assert runs == [None]
+
+
+def test_watch_is_only_supported_by_goodplay_command(tmpdir):
+    smart_create(tmpdir, '''
+    ## test_something.py
+    def test_something():
+        pass
+    ''')
+
+    process = subprocess.Popen(
+        ['py.test', '--watch'], cwd=str(tmpdir), stderr=subprocess.PIPE)
+    _, stderr = process.communicate()
+
+    assert process.returncode != 0
+    assert b'--watch is only supported by the goodplay command' in stderr
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+from goodplay.utils.yamlcache import YamlCache
+
+
+def test_load_returns_parsed_content(tmpdir):
+    path = tmpdir.join('file.yml')
+    path.write('key: [1, 2]')
+
+    assert YamlCache().load(path) == dict(key=[1, 2])
+
+
+def test_load_returns_cached_content_for_unchanged_file(tmpdir):
+    yaml_cache = YamlCache()
+
+    path = tmpdir.join('file.yml')
+    path.write('key: value')
+
+    first_result = yaml_cache.load(path)
+
+    assert id(yaml_cache.load(path)) == id(first_result)
+
+
+def test_load_reloads_content_when_size_changed(tmpdir):
+    yaml_cache = YamlCache()
+
+    path = tmpdir.join('file.yml')
+    path.write('key: value1')
+    yaml_cache.load(path)
+
+    path.write('key: value22')
+
+    assert yaml_cache.load(path) == dict(key='value22')
+
+
+def test_load_reloads_content_when_mtime_changed(tmpdir):
+    yaml_cache = YamlCache()
+
+    path = tmpdir.join('file.yml')
+    path.write('key: value1')
+    path.setmtime(1000000000)
+    yaml_cache.load(path)
+
+    path.write('key: value2')
+    path.setmtime(1000000001)
+
+    assert yaml_cache.load(path) == dict(key='value2')
+
+
+def test_lookup_caches_per_kind(tmpdir):
+    yaml_cache = YamlCache()
+
+    path = tmpdir.join('file.yml')
+    path.write('key: value')
+
+    assert yaml_cache.lookup(path, 'kind1', lambda path: 1) == 1
+    assert yaml_cache.lookup(path, 'kind2', lambda path: 2) == 2
+    assert yaml_cache.lookup(path, 'kind1', lambda path: 3) == 1